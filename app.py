@@ -2,8 +2,8 @@
 Math Tutor - Main Application
 A Flask application that teaches students mathematics across multiple topics.
 """
-from flask import Flask, render_template, request, jsonify, session, url_for, redirect
-import os
+from flask import Flask, render_template, request, jsonify, session, url_for, redirect, g
+import hmac
 import json
 import logging
 from functools import wraps
@@ -14,12 +14,29 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # Local imports
-from config import SESSION_KEY, STAGES
+from config import (
+    STAGES, SESSION_BACKEND, SESSION_STORE_PATH, SESSION_STORE_MAX_ENTRIES, QUESTION_TOKEN_MAX_AGE,
+    VERIFY_BATCH_MAX_ITEMS, VERIFY_BATCH_MAX_PROCESSES, VERIFY_BATCH_TOKEN, METRICS_TOKEN
+)
 from models.learning_sequence import LearningSequence
+from models.stage_graph import STAGE_GRAPH
 from models.question_generator import QuestionGenerator
 from models.verifier import Verifier
+from models.example_registry import ExampleRegistry
 from services.content_service import ContentService
-from helpers.session_helper import prepare_session_data, load_learning_sequence_from_session
+from services.deferred_feedback import get_feedback_dispatcher
+from services.feedback_cache import get_feedback_cache
+from services.conversation_memory import get_conversation_memory
+from services.attempt_log import get_attempt_log
+from helpers.session_helper import (
+    prepare_session_data, load_learning_sequence_from_session, update_student_profile_with_question
+)
+from helpers.session_store import create_session_store, ServerSideSessionInterface, CompactCookieSessionInterface
+from helpers.key_ring import get_key_ring
+from helpers.sequence_registry import SequenceRegistry
+from helpers.question_token import issue_question_token, read_question_token
+from helpers.instrumentation import InstrumentationMiddleware, registry, set_endpoint, span
+from helpers.logging_setup import configure_logging, get_stats as get_logging_stats
 from helpers.response_helper import (
     format_example_response, 
     format_practice_response, 
@@ -27,19 +44,41 @@ from helpers.response_helper import (
     format_error_response
 )
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+# Configure logging (levels come from LOG_LEVEL / LOG_LEVELS; writes happen off the request thread)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # Initialize Flask app
 app = Flask(__name__)
-app.secret_key = SESSION_KEY if 'SESSION_KEY' in globals() else os.urandom(24)
+# Sessions and question tokens are signed from the shared key ring, so they
+# survive restarts and verify on every worker; secret_key is only a fallback
+key_ring = get_key_ring()
+app.secret_key = key_ring.current()
+
+# Keep learning state server-side; the cookie only carries the signed user id
+if SESSION_BACKEND != 'cookie':
+    app.session_interface = ServerSideSessionInterface(
+        create_session_store(SESSION_BACKEND, SESSION_STORE_PATH, SESSION_STORE_MAX_ENTRIES),
+        key_ring=key_ring
+    )
+else:
+    app.session_interface = CompactCookieSessionInterface(key_ring)
+
+# Time sampled requests from before the session is opened until the body is returned
+app.wsgi_app = InstrumentationMiddleware(app.wsgi_app)
+registry.add_gauge_source('feedback_cache', lambda: get_feedback_cache().get_stats())
+registry.add_gauge_source('conversation_memory', lambda: get_conversation_memory().get_stats())
+registry.add_gauge_source('attempt_log', lambda: get_attempt_log().get_stats())
+registry.add_gauge_source('logging', get_logging_stats)
+registry.add_gauge_source('session_keys', key_ring.get_stats)
 
 # Initialize services
-learning_sequence = LearningSequence()
+sequence_registry = SequenceRegistry()
 question_generator = QuestionGenerator()
-verifier = Verifier()
+question_generator.warm_up()
+verifier = Verifier(catalog=question_generator.catalog)
 content_service = ContentService()
+example_registry = ExampleRegistry()
 
 # Error handler decorator
 def handle_errors(f):
@@ -49,16 +88,60 @@ def handle_errors(f):
         try:
             return f(*args, **kwargs)
         except Exception as e:
-            logger.error(f"Error in {f.__name__}: {e}", exc_info=True)
+            logger.error("Error in %s: %s", f.__name__, e, exc_info=True)
             return format_error_response(e)
     return decorated_function
 
 # Session setup
 @app.before_request
 def before_request():
+    set_endpoint(request.endpoint)
     if 'user_id' not in session:
         session['user_id'] = str(uuid.uuid4())
 
+def get_learning_sequence():
+    """Get the current user's LearningSequence, hydrating it from the session on first use.
+
+    Takes the user's lock for the rest of the request (released on teardown,
+    after the session is saved). The session was loaded before the lock was
+    taken, so server-side sessions re-read their learning_state once it is
+    held; cookie sessions cannot, and concurrent requests from one browser
+    still end with whichever cookie arrives last.
+    """
+    if 'sequence_entry' not in g:
+        user_id = session['user_id']
+        lock = sequence_registry.lock(user_id)
+        lock.acquire()
+        g.sequence_lock = lock
+        refresh = getattr(app.session_interface, 'refresh', None)
+        if refresh is not None:
+            refresh(session._get_current_object(), 'learning_state')
+        g.sequence_entry = sequence_registry.get(
+            user_id,
+            session.get('learning_state'),
+            lambda: load_learning_sequence_from_session(LearningSequence(), topic='rounding')
+        )
+        g.sequence_user_id = user_id
+    return g.sequence_entry.sequence
+
+@app.after_request
+def persist_learning_sequence(response):
+    """Write the user's LearningSequence back to the session if the request touched it."""
+    entry = g.get('sequence_entry')
+    if entry is not None and session.get('learning_state', {}).get('topic') == 'rounding':
+        state = prepare_session_data(entry.sequence, topic='rounding')
+        session['learning_state'] = state
+        sequence_registry.mark_synced(g.sequence_user_id, state)
+    return response
+
+@app.teardown_request
+def release_learning_sequence(exc=None):
+    """Release the per-user lock taken by get_learning_sequence."""
+    g.pop('sequence_entry', None)
+    lock = g.pop('sequence_lock', None)
+    if lock is not None:
+        lock.release()
+
 # ==========================================
 # MAIN NAVIGATION ROUTES
 # ==========================================
@@ -88,6 +171,7 @@ def fractions_home():
 @app.route('/rounding/intro')
 def rounding_intro():
     """Rounding lesson introduction page."""
+    learning_sequence = get_learning_sequence()
     # Set topic in session
     session['current_topic'] = 'rounding'
     
@@ -100,6 +184,7 @@ def rounding_intro():
 @app.route('/rounding/examples')
 def rounding_examples():
     """Rounding examples page route."""
+    learning_sequence = get_learning_sequence()
     # Ensure we're in rounding topic
     if session.get('current_topic') != 'rounding':
         return redirect(url_for('rounding_intro'))
@@ -153,6 +238,7 @@ def rounding_decimal1_practice():
 @app.route('/rounding/decimal2/examples')
 def rounding_decimal2_examples():
     """Decimal 2 Examples page route for rounding."""
+    learning_sequence = get_learning_sequence()
     if session.get('current_topic') != 'rounding':
         return redirect(url_for('rounding_intro'))
         
@@ -177,7 +263,7 @@ def rounding_decimal2_examples():
         session['learning_state'] = prepare_session_data(learning_sequence, topic='rounding')
     else:
         # If not in the right stage, update to proper stage
-        logger.info(f"Not in stage 2.1, currently in {session['learning_state']['stage']}")
+        logger.info("Not in stage 2.1, currently in %s", session['learning_state']['stage'])
         learning_sequence.current_stage = STAGES["ROUNDING_2DP"]
         learning_sequence.showing_example = True
         learning_sequence.current_example = 1
@@ -188,6 +274,7 @@ def rounding_decimal2_examples():
 @app.route('/rounding/decimal2/practice')
 def rounding_decimal2_practice():
     """Decimal 2 Practice page route for rounding."""
+    learning_sequence = get_learning_sequence()
     if session.get('current_topic') != 'rounding':
         return redirect(url_for('rounding_intro'))
         
@@ -209,6 +296,7 @@ def rounding_decimal2_practice():
 @app.route('/rounding/decimal23/practice')
 def rounding_decimal23_practice():
     """Decimal 2 and 3 Practice page route for rounding."""
+    learning_sequence = get_learning_sequence()
     if session.get('current_topic') != 'rounding':
         return redirect(url_for('rounding_intro'))
         
@@ -231,6 +319,7 @@ def rounding_decimal23_practice():
 @app.route('/rounding/stretch/examples')
 def rounding_stretch_examples():
     """Stretch Examples page route for rounding."""
+    learning_sequence = get_learning_sequence()
     if session.get('current_topic') != 'rounding':
         return redirect(url_for('rounding_intro'))
         
@@ -332,8 +421,8 @@ def rounding_next_step():
     logger.info("--- ROUNDING NEXT STEP REQUEST ---")
     
     # Load or create learning sequence from session
-    current_sequence = load_learning_sequence_from_session(learning_sequence, topic='rounding')
-    logger.debug(f"Current stage: {current_sequence.get_current_stage()}")
+    current_sequence = get_learning_sequence()
+    logger.debug("Current stage: %s", current_sequence.current_stage)
     
     # Get current stage details
     current_stage = current_sequence.get_current_stage()
@@ -347,7 +436,7 @@ def rounding_next_step():
     
     # Check if we should model an example
     should_model = current_sequence.should_model_example()
-    logger.debug(f"Should model: {should_model}")
+    logger.debug("Should model: %s", should_model)
     
     if should_model:
         return serve_rounding_example(current_sequence, stage_rules)
@@ -356,33 +445,71 @@ def rounding_next_step():
 
 def serve_rounding_example(current_sequence, stage_rules):
     """Redirect to appropriate rounding examples page."""
-    logger.info(f"Redirecting for rounding example #{current_sequence.current_example}")
+    logger.info("Redirecting for rounding example #%s", current_sequence.current_example)
     
     # Update session state
     session['learning_state'] = prepare_session_data(current_sequence, topic='rounding')
     
-    # Redirect to the appropriate examples page based on stage
-    if current_sequence.current_stage == STAGES["ROUNDING_1DP_NO_UP"]:
-        return jsonify({'redirect': url_for('rounding_examples')})
-    elif current_sequence.current_stage == STAGES["ROUNDING_2DP"]:
-        if session['learning_state']['showing_example']:
-            return jsonify({'redirect': url_for('rounding_decimal2_examples')})
-        else:
-            return jsonify({'redirect': url_for('rounding_decimal23_practice')})
-    elif current_sequence.current_stage == STAGES["STRETCH"]:
-        return jsonify({'redirect': url_for('rounding_stretch_examples')})
+    # Redirect to the stage's examples page (its page, for stages without examples)
+    return jsonify({'redirect': url_for(current_sequence.page_endpoint())})
+
+def remember_practice_question(formatted_question):
+    """Attach a signed question token; only questions outside the catalog are kept in the session."""
+    question_id = formatted_question["original_question"].get("question_id")
+    if question_id:
+        formatted_question['question_token'] = issue_question_token(
+            key_ring.secrets(),
+            question_id,
+            formatted_question['correct_letter'],
+            formatted_question['choice_order'],
+            user_id=session.get('user_id')
+        )
+        if 'current_question' in session:
+            del session['current_question']
     else:
-        return jsonify({'redirect': url_for('rounding_practice')})
+        session['current_question'] = json.dumps(formatted_question)
+
+def load_practice_question(data, learning_sequence):
+    """Return the question being answered, or None if there is no valid one.
+
+    A question is graded once: a token must be for the student's current stage
+    and not answered before, and a question kept in the session is removed.
+    """
+    token = data.get('question_token')
+    if token:
+        claims = read_question_token(key_ring.secrets(), token, user_id=session.get('user_id'),
+                                     max_age=QUESTION_TOKEN_MAX_AGE)
+        if claims is None:
+            logger.warning("Rejected invalid or expired question token")
+            return None
+        token_stage = claims['question_id'].rpartition(':')[0]
+        if token_stage != learning_sequence.current_stage:
+            logger.warning("Rejected question token for stage %s in stage %s",
+                           token_stage, learning_sequence.current_stage)
+            return None
+        question = question_generator.rebuild_multiple_choice(claims['question_id'], claims['choice_order'])
+        if question is None or question['correct_letter'] != claims['correct_letter']:
+            logger.warning("Question token does not match the question catalog")
+            return None
+        if not learning_sequence.consume_question_token(claims['question_id'], claims['issued_at']):
+            logger.warning("Rejected question token that was already answered")
+            return None
+        return question
+
+    if 'current_question' in session:
+        return json.loads(session.pop('current_question'))
+    return None
 
 def serve_rounding_practice_question(current_sequence, stage_rules):
     """Generate and serve a rounding practice question."""
     logger.info("Returning rounding practice question")
     
-    question = question_generator.generate_question(stage_rules, current_sequence)
-    formatted_question = question_generator.format_multiple_choice(question)
+    with span('question_generation'):
+        question = question_generator.generate_question(stage_rules, current_sequence)
+        formatted_question = question_generator.format_multiple_choice(question)
     
     # Store the question in session for verification later
-    session['current_question'] = json.dumps(formatted_question)
+    remember_practice_question(formatted_question)
     
     # Update session
     session['learning_state'] = prepare_session_data(current_sequence, topic='rounding')
@@ -405,40 +532,40 @@ def verify_answer():
 
 def verify_rounding_answer():
     """Verify answer for rounding topic."""
+    learning_sequence = get_learning_sequence()
     # Get the student's answer
     data = request.json
     student_answer = data.get('answer')
-    logger.info(f"Received rounding answer: {student_answer}")
+    logger.debug("Received rounding answer: %s", student_answer)
     
     # Store the current stage before any updates
     old_stage = learning_sequence.current_stage
-    old_consecutive = learning_sequence.consecutive_correct
     
-    # Retrieve the current question from session
-    if 'current_question' not in session:
+    # Rebuild the question from its signed token (or the session for non-catalog questions)
+    current_question = load_practice_question(data, learning_sequence)
+    if current_question is None:
         return jsonify({'error': 'No active question found'}), 400
-        
-    current_question = json.loads(session['current_question'])
     
     # Add the student's answer to the question dict
     current_question["student_answer"] = student_answer
     
     # Verify the answer
-    is_correct, verification_steps, misconception = verifier.verify_answer(
-        current_question,
-        student_answer
-    )
+    with span('verification'):
+        is_correct, verification_steps, misconception = verifier.verify_answer(
+            current_question,
+            student_answer
+        )
     
     # CRITICAL FIX: Ensure verification steps use the correct question data
     if verification_steps["original_number"] != current_question["original_question"]["number"]:
-        logger.error(f"MISMATCH: Verification steps use {verification_steps['original_number']} but question is {current_question['original_question']['number']}")
+        logger.error("MISMATCH: Verification steps use %s but question is %s",
+                     verification_steps["original_number"], current_question["original_question"]["number"])
         verification_steps["original_number"] = current_question["original_question"]["number"]
     
     # Update learning sequence based on the answer
-    learning_sequence.update_progress(is_correct)
+    learning_sequence.update_progress(is_correct, current_question["original_question"])
 
     # Track student profile data
-    from helpers.session_helper import update_student_profile_with_question
     student_profile = update_student_profile_with_question(
         current_question,
         {
@@ -452,13 +579,6 @@ def verify_rounding_answer():
     
     # After state
     new_stage = learning_sequence.current_stage
-    new_consecutive = learning_sequence.consecutive_correct
-    
-    # Special handling for transition to stage 2.1
-    if old_stage == STAGES["ROUNDING_1DP_BOTH"] and new_stage == STAGES["ROUNDING_2DP"]:
-        learning_sequence.showing_example = True
-        learning_sequence.current_example = 1
-    
     stage_completed = old_stage != new_stage
     showing_new_examples = stage_completed and learning_sequence.showing_example
     
@@ -477,7 +597,8 @@ def verify_rounding_answer():
     
     # Get enhanced feedback with motivational messaging
     # UPDATED: Pass session ID for AI conversation memory
-    feedback = content_service.get_feedback(
+    # The AI explanation (if any) is delivered later through /api/feedback/<ticket>
+    feedback, feedback_ticket = content_service.get_feedback_deferred(
         current_question,
         verification_steps,
         is_correct,
@@ -486,29 +607,75 @@ def verify_rounding_answer():
         session_id=session.get('user_id')  # Use user_id as session identifier
     )
     
-    # Handle special redirects
-    if old_stage == STAGES["ROUNDING_1DP_BOTH"] and new_stage == STAGES["ROUNDING_2DP"]:
-        return jsonify({
-            'is_correct': is_correct,
-            'feedback': feedback,
-            'verification_steps': verification_steps,
-            'next_stage': new_stage,
-            'stage_completed': stage_completed,
-            'showing_new_examples': True,
-            'lesson_complete': False,
-            'next_stage_redirect': url_for('rounding_decimal2_examples')
-        })
-    
-    # Normal response
-    return jsonify({
+    response = {
         'is_correct': is_correct,
         'feedback': feedback,
+        'feedback_ticket': feedback_ticket,
         'verification_steps': verification_steps,
         'next_stage': new_stage,
         'stage_completed': stage_completed,
         'showing_new_examples': showing_new_examples,
         'lesson_complete': new_stage == STAGES["COMPLETE"]
-    })
+    }
+    if showing_new_examples:
+        # The new stage opens with worked examples; send the student to them
+        response['next_stage_redirect'] = url_for(learning_sequence.page_endpoint())
+    return jsonify(response)
+
+@app.route('/api/feedback/<ticket_id>')
+@handle_errors
+def deferred_feedback(ticket_id):
+    """API endpoint to collect AI feedback queued by /api/verify-answer."""
+    result = get_feedback_dispatcher().poll(ticket_id, session.get('user_id'))
+    return jsonify(result)
+
+def trusted_client(token):
+    """Whether the client may use an internal endpoint: with ``token`` set, by bearer token, else from loopback."""
+    if token:
+        scheme, _, sent = request.headers.get('Authorization', '').partition(' ')
+        return scheme.lower() == 'bearer' and hmac.compare_digest(sent.encode(), token.encode())
+    return request.remote_addr in ('127.0.0.1', '::1')
+
+@app.route('/api/verify-batch', methods=['POST'])
+@handle_errors
+def verify_batch():
+    """API endpoint to grade many answers at once (re-grading and classroom imports).
+
+    Body: {"items": [{"question": <formatted question>, "answer": "B"}, ...], "processes": 1}
+    Results come back in the same order as the items. Session state is not touched.
+    Items are graded against the answers they carry, so only trusted clients
+    (VERIFY_BATCH_TOKEN, or loopback) may call it.
+    """
+    if not trusted_client(VERIFY_BATCH_TOKEN):
+        return jsonify({'error': 'Forbidden'}), 403
+    data = request.get_json(silent=True) or {}
+    items = data.get('items')
+    if not isinstance(items, list):
+        return jsonify({'error': 'Expected a list of items'}), 400
+    if len(items) > VERIFY_BATCH_MAX_ITEMS:
+        return jsonify({'error': f'At most {VERIFY_BATCH_MAX_ITEMS} items per batch'}), 413
+
+    pairs = [(item.get('question'), item.get('answer')) if isinstance(item, dict) else (None, None)
+             for item in items]
+    try:
+        processes = int(data.get('processes', 1))
+    except (TypeError, ValueError):
+        processes = 1
+    processes = max(1, min(processes, VERIFY_BATCH_MAX_PROCESSES))
+
+    results = []
+    with span('verification'):
+        graded = verifier.verify_batch(pairs, processes=processes)
+    for is_correct, verification_steps, misconception in graded:
+        if is_correct is None:
+            results.append(misconception)
+        else:
+            results.append({
+                'is_correct': is_correct,
+                'verification_steps': verification_steps,
+                'misconception': misconception
+            })
+    return jsonify({'results': results})
 
 @app.route('/api/next-example', methods=['POST'])
 @handle_errors
@@ -526,35 +693,10 @@ def next_example():
 
 def rounding_next_example():
     """Handle next example for rounding topic."""
+    learning_sequence = get_learning_sequence()
     logger.info("--- ROUNDING NEXT EXAMPLE CALLED ---")
     
-    # Check specific progression conditions for rounding
-    if ('learning_state' in session and
-        session['learning_state']['stage'] == STAGES["ROUNDING_1DP_NO_UP"] and
-        session['learning_state']['current_example'] == 1 and
-        session['learning_state']['showing_example'] == True):
-        learning_sequence.current_example = 2
-        learning_sequence.showing_example = True
-    elif ('learning_state' in session and
-          session['learning_state']['stage'] == STAGES["ROUNDING_1DP_NO_UP"] and
-          session['learning_state']['current_example'] == 2 and
-          session['learning_state']['showing_example'] == True):
-        learning_sequence.current_example = 3
-        learning_sequence.showing_example = False
-    elif ('learning_state' in session and
-          session['learning_state']['stage'] == STAGES["ROUNDING_2DP"] and
-          session['learning_state']['current_example'] == 1 and
-          session['learning_state']['showing_example'] == True):
-        learning_sequence.current_example = 2
-        learning_sequence.showing_example = True
-    elif ('learning_state' in session and
-          session['learning_state']['stage'] == STAGES["ROUNDING_2DP"] and
-          session['learning_state']['current_example'] == 2 and
-          session['learning_state']['showing_example'] == True):
-        learning_sequence.current_example = 3
-        learning_sequence.showing_example = False
-    else:
-        learning_sequence.next_example()
+    learning_sequence.next_example()
     
     # Update session
     session['learning_state'] = prepare_session_data(learning_sequence, topic='rounding')
@@ -581,31 +723,12 @@ def current_stage():
 def rounding_current_stage():
     """Handle current stage logic for rounding topic."""
     current_stage = session['learning_state']['stage']
-    logger.info(f"Rounding current stage check: {current_stage}")
-    
-    if current_stage == STAGES["ROUNDING_1DP_NO_UP"]:
-        if session['learning_state']['showing_example']:
-            return jsonify({'redirect': url_for('rounding_examples')})
-        else:
-            return jsonify({'redirect': url_for('rounding_practice')})
-    elif current_stage == STAGES["ROUNDING_1DP_WITH_UP"]:
-        return jsonify({'redirect': url_for('rounding_practice')})
-    elif current_stage == STAGES["ROUNDING_1DP_BOTH"]:
-        return jsonify({'redirect': url_for('rounding_practice')})
-    elif current_stage == STAGES["ROUNDING_2DP"]:
-        if session['learning_state']['showing_example']:
-            return jsonify({'redirect': url_for('rounding_decimal2_examples')})
-        else:
-            return jsonify({'redirect': url_for('rounding_decimal23_practice')})
-    elif current_stage == STAGES["STRETCH"]:
-        if session['learning_state']['showing_example']:
-            return jsonify({'redirect': url_for('rounding_stretch_examples')})
-        else:
-            return jsonify({'redirect': url_for('rounding_stretch_practice')})
-    elif current_stage == STAGES["COMPLETE"]:
-        return jsonify({'redirect': url_for('rounding_complete')})
+    logger.debug("Rounding current stage check: %s", current_stage)
     
-    return jsonify({})
+    node = STAGE_GRAPH.nodes.get(current_stage)
+    if node is None:
+        return jsonify({})
+    return jsonify({'redirect': url_for(node.page_for(session['learning_state']['showing_example']))})
 
 @app.route('/api/reset', methods=['POST'])
 @handle_errors
@@ -615,6 +738,7 @@ def reset_lesson():
     
     # Clear session including student profile
     from helpers.session_helper import reset_student_profile
+    learning_sequence = get_learning_sequence()
     session.clear()
     reset_student_profile()
     
@@ -629,7 +753,19 @@ def reset_lesson():
 # ROUNDING-SPECIFIC API ENDPOINTS
 # ==========================================
 
-# Add these updated endpoints to your app.py file
+def start_example(number):
+    """Record that the student is on worked example ``number`` of the current stage."""
+    learning_sequence = get_learning_sequence()
+    learning_sequence.current_example = number
+    if number == 1:
+        learning_sequence.showing_example = True
+    session['learning_state'] = prepare_session_data(learning_sequence, topic='rounding')
+
+def compiled_json_response(payload):
+    """Serve a precompiled JSON payload, answering 304 when the client's ETag matches."""
+    response = app.response_class(payload.body, mimetype='application/json')
+    response.set_etag(payload.etag)
+    return response.make_conditional(request)
 
 @app.route('/api/decimal1/examples/first')
 @handle_errors
@@ -637,50 +773,8 @@ def decimal1_examples_first():
     """API endpoint to get the first example data with separated content."""
     if session.get('current_topic') != 'rounding':
         return jsonify({'error': 'Wrong topic'}), 400
-        
-    # Update session state
-    learning_sequence.current_example = 1
-    learning_sequence.showing_example = True
-    session['learning_state'] = prepare_session_data(learning_sequence, topic='rounding')
-
-    # Example 1 data with separated content structure
-    example_data = {
-        "example_number": 1,
-        "question_text": "Round 12.632 to 1 decimal place",
-        "total_steps": 3,
-        "steps": [
-            {
-                "step_number": 1,
-                "image_content": {
-                    "display_text": "12.6|32",
-                    "annotation": "1st decimal place",
-                    "highlight_position": "after_6"
-                },
-                "text_content": "Identify the digit in the 1st decimal place. This is the first digit after the decimal point. We will call it the \"rounding digit\". Draw a \"cut off\" line after the rounding digit."
-            },
-            {
-                "step_number": 2,
-                "image_content": {
-                    "display_text": "12.6|32",
-                    "annotation": "Next digit is 3 (less than 5)",
-                    "highlight_position": "after_line"
-                },
-                "text_content": "Check the digit to the right of the \"cut off\" line. If this digit is less than 5 we keep our rounding digit the same."
-            },
-            {
-                "step_number": 3,
-                "image_content": {
-                    "display_text": "12.6",
-                    "annotation": "Final answer",
-                    "highlight_position": "complete"
-                },
-                "text_content": "Remove all digits after the \"cut off\" line. We have now rounded the number to 1 decimal place."
-            }
-        ],
-        "answer": "12.6"
-    }
-    
-    return jsonify(example_data)
+    start_example(1)
+    return compiled_json_response(example_registry.example('decimal1', 1).full)
 
 @app.route('/api/decimal1/examples/second')
 @handle_errors
@@ -688,85 +782,31 @@ def decimal1_examples_second():
     """API endpoint to get the second example data with separated content."""
     if session.get('current_topic') != 'rounding':
         return jsonify({'error': 'Wrong topic'}), 400
-        
-    learning_sequence.current_example = 2
-    session['learning_state'] = prepare_session_data(learning_sequence, topic='rounding')
-    
-    # Example 2 data with separated content structure
-    example_data = {
-        "example_number": 2,
-        "question_text": "Round 12.682 to 1 decimal place",
-        "total_steps": 3,
-        "steps": [
-            {
-                "step_number": 1,
-                "image_content": {
-                    "display_text": "12.6|82",
-                    "annotation": "1st decimal place",
-                    "highlight_position": "after_6"
-                },
-                "text_content": "Identify the digit in the 1st decimal place. This is the first digit after the decimal point. We will call it the \"rounding digit\". Draw a \"cut off\" line after the rounding digit."
-            },
-            {
-                "step_number": 2,
-                "image_content": {
-                    "display_text": "12.6|82",
-                    "annotation": "Next digit is 8 (5 or greater)",
-                    "highlight_position": "after_line"
-                },
-                "text_content": "Check the digit to the right of the \"cut off\" line. If this digit is 5 or bigger we need to round up. We do this by adding 1 to the rounding digit."
-            },
-            {
-                "step_number": 3,
-                "image_content": {
-                    "display_text": "12.7",
-                    "annotation": "Final answer (6 became 7)",
-                    "highlight_position": "complete"
-                },
-                "text_content": "Remove all digits after the \"cut off\" line. We have now rounded the number to 1 decimal place. Notice that the 6 has changed to a 7 as we rounded up."
-            }
-        ],
-        "answer": "12.7"
-    }
-    
-    return jsonify(example_data)
+    start_example(2)
+    return compiled_json_response(example_registry.example('decimal1', 2).full)
 
-# Add new endpoint to get individual steps
-@app.route('/api/decimal1/examples/<int:example_num>/step/<int:step_num>')
+@app.route('/api/decimal1/examples/<int:example_num>/step/<int:step_num>', defaults={'example_set': 'decimal1'})
+@app.route('/api/decimal2/examples/<int:example_num>/step/<int:step_num>', defaults={'example_set': 'decimal2'})
 @handle_errors
-def get_example_step(example_num, step_num):
-    """Get a specific step of a specific example."""
+def get_example_step(example_num, step_num, example_set):
+    """Get a specific step of a specific example. Read-only: the session is not changed."""
     if session.get('current_topic') != 'rounding':
         return jsonify({'error': 'Wrong topic'}), 400
     
-    # Get the appropriate example data
-    if example_num == 1:
-        response = decimal1_examples_first()
-        example_data = response.get_json()
-    elif example_num == 2:
-        response = decimal1_examples_second()
-        example_data = response.get_json()
-    else:
+    if example_registry.example(example_set, example_num) is None:
         return jsonify({'error': 'Invalid example number'}), 400
     
-    # Validate step number
-    if step_num < 1 or step_num > len(example_data['steps']):
+    step = example_registry.step(example_set, example_num, step_num)
+    if step is None:
         return jsonify({'error': 'Invalid step number'}), 400
     
-    # Return the specific step (array is 0-indexed)
-    step_data = example_data['steps'][step_num - 1]
-    
-    return jsonify({
-        'example_number': example_num,
-        'step': step_data,
-        'total_steps': example_data['total_steps'],
-        'question_text': example_data['question_text']
-    })
+    return compiled_json_response(step)
 
 @app.route('/api/decimal1/examples/complete', methods=['POST'])
 @handle_errors
 def decimal1_examples_complete():
     """API endpoint to mark examples as complete and move to practice."""
+    learning_sequence = get_learning_sequence()
     if session.get('current_topic') != 'rounding':
         return jsonify({'error': 'Wrong topic'}), 400
         
@@ -783,7 +823,7 @@ def decimal1_practice_question():
     if session.get('current_topic') != 'rounding':
         return jsonify({'error': 'Wrong topic'}), 400
         
-    current_sequence = load_learning_sequence_from_session(learning_sequence, topic='rounding')
+    current_sequence = get_learning_sequence()
     
     if current_sequence.get_current_stage() == STAGES["COMPLETE"]:
         return jsonify({
@@ -792,10 +832,11 @@ def decimal1_practice_question():
         })
     
     stage_rules = current_sequence.get_stage_rules()
-    question = question_generator.generate_question(stage_rules, current_sequence)
-    formatted_question = question_generator.format_multiple_choice(question)
+    with span('question_generation'):
+        question = question_generator.generate_question(stage_rules, current_sequence)
+        formatted_question = question_generator.format_multiple_choice(question)
     
-    session['current_question'] = json.dumps(formatted_question)
+    remember_practice_question(formatted_question)
     session['learning_state'] = prepare_session_data(current_sequence, topic='rounding')
     
     return jsonify({
@@ -810,31 +851,8 @@ def decimal2_examples_first():
     """API endpoint to get the first example data for decimal2."""
     if session.get('current_topic') != 'rounding':
         return jsonify({'error': 'Wrong topic'}), 400
-        
-    learning_sequence.current_example = 1
-    learning_sequence.showing_example = True
-    session['learning_state'] = prepare_session_data(learning_sequence, topic='rounding')
-    
-    example_data = {
-        'question_text': 'Round 12.632 to 2 decimal places',
-        'steps': [
-            {
-                'explanation': 'Identify the digit in the 2nd decimal place. This is the second digit after the decimal point. We will call it the "rounding digit". Draw a "cut off" line after the rounding digit.',
-                'image': '/static/images/stage2_1_step1.jpg'
-            },
-            {
-                'explanation': 'Check the digit to the right of the "cut off" line. If this digit is less than 5 we keep our rounding digit the same.',
-                'image': '/static/images/stage2_1_step2.jpg'
-            },
-            {
-                'explanation': 'Remove all digits after the "cut off" line. We have now rounded the number to 2 decimal places.',
-                'image': '/static/images/stage2_1_step3.jpg'
-            }
-        ],
-        'answer': '12.63'
-    }
-    
-    return jsonify(example_data)
+    start_example(1)
+    return compiled_json_response(example_registry.example('decimal2', 1).full)
 
 @app.route('/api/decimal2/examples/second')
 @handle_errors
@@ -842,35 +860,14 @@ def decimal2_examples_second():
     """API endpoint to get the second example data for decimal2."""
     if session.get('current_topic') != 'rounding':
         return jsonify({'error': 'Wrong topic'}), 400
-        
-    learning_sequence.current_example = 2
-    session['learning_state'] = prepare_session_data(learning_sequence, topic='rounding')
-    
-    example_data = {
-        'question_text': 'Round 12.678 to 3 decimal places',
-        'steps': [
-            {
-                'explanation': 'Identify the digit in the 3rd decimal place. This is the third digit after the decimal point. We will call it the "rounding digit". Draw a "cut off" line after the rounding digit.',
-                'image': '/static/images/stage2_2_step1.jpg'
-            },
-            {
-                'explanation': 'Check the digit to the right of the "cut off" line. If this digit is 5 or bigger we need to round up. We do this by adding 1 to the rounding digit.',
-                'image': '/static/images/stage2_2_step2.jpg'
-            },
-            {
-                'explanation': 'Remove all digits after the "cut off" line. We have now rounded the number to 3 decimal places. Notice that the 7 has changed to an 8 as we rounded up.',
-                'image': '/static/images/stage2_2_step3.jpg'
-            }
-        ],
-        'answer': '12.68'
-    }
-    
-    return jsonify(example_data)
+    start_example(2)
+    return compiled_json_response(example_registry.example('decimal2', 2).full)
 
 @app.route('/api/decimal2/examples/complete', methods=['POST'])
 @handle_errors
 def decimal2_examples_complete():
     """API endpoint to mark decimal2 examples as complete and move to practice."""
+    learning_sequence = get_learning_sequence()
     if session.get('current_topic') != 'rounding':
         return jsonify({'error': 'Wrong topic'}), 400
         
@@ -887,7 +884,7 @@ def decimal2_practice_question():
     if session.get('current_topic') != 'rounding':
         return jsonify({'error': 'Wrong topic'}), 400
         
-    current_sequence = load_learning_sequence_from_session(learning_sequence, topic='rounding')
+    current_sequence = get_learning_sequence()
     
     if current_sequence.get_current_stage() == STAGES["COMPLETE"]:
         return jsonify({
@@ -896,10 +893,11 @@ def decimal2_practice_question():
         })
     
     stage_rules = current_sequence.get_stage_rules()
-    question = question_generator.generate_question(stage_rules, current_sequence)
-    formatted_question = question_generator.format_multiple_choice(question)
+    with span('question_generation'):
+        question = question_generator.generate_question(stage_rules, current_sequence)
+        formatted_question = question_generator.format_multiple_choice(question)
     
-    session['current_question'] = json.dumps(formatted_question)
+    remember_practice_question(formatted_question)
     session['learning_state'] = prepare_session_data(current_sequence, topic='rounding')
     
     return jsonify({
@@ -915,7 +913,7 @@ def decimal23_practice_question():
     if session.get('current_topic') != 'rounding':
         return jsonify({'error': 'Wrong topic'}), 400
         
-    current_sequence = load_learning_sequence_from_session(learning_sequence, topic='rounding')
+    current_sequence = get_learning_sequence()
     
     if current_sequence.get_current_stage() == STAGES["COMPLETE"]:
         return jsonify({
@@ -924,10 +922,11 @@ def decimal23_practice_question():
         })
     
     stage_rules = current_sequence.get_stage_rules()
-    question = question_generator.generate_question(stage_rules, current_sequence)
-    formatted_question = question_generator.format_multiple_choice(question)
+    with span('question_generation'):
+        question = question_generator.generate_question(stage_rules, current_sequence)
+        formatted_question = question_generator.format_multiple_choice(question)
     
-    session['current_question'] = json.dumps(formatted_question)
+    remember_practice_question(formatted_question)
     session['learning_state'] = prepare_session_data(current_sequence, topic='rounding')
     
     return jsonify({
@@ -950,6 +949,13 @@ def debug_session():
         'user_id': session.get('user_id', 'no session')
     })
 
+@app.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint: request counts, span histograms and cache gauges."""
+    if not trusted_client(METRICS_TOKEN):
+        return app.response_class('Forbidden\n', status=403, mimetype='text/plain')
+    return app.response_class(registry.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/api/test', methods=['GET', 'POST'])
 def test_endpoint():
     """Simple test endpoint to verify Flask is working."""
@@ -1020,6 +1026,9 @@ def legacy_complete():
     """Legacy complete route - redirect to rounding."""
     return redirect(url_for('rounding_complete'))
 
+# Every stage page has to be a registered route
+STAGE_GRAPH.check_endpoints(app.view_functions)
+
 if __name__ == '__main__':
     print("Starting Math Tutor Flask app...")
     print(f"Debug mode: {app.debug}")
@@ -2,7 +2,93 @@
 import os
 
 # Session Configuration
-SESSION_KEY = os.urandom(24)
+# Signing keys: SESSION_KEYS (comma separated, oldest first, never rotated here)
+# or a key file shared by all workers on the host. A new key is added every
+# SESSION_KEY_ROTATION_SECONDS (0 disables) and the newest SESSION_KEY_MAX_KEYS
+# keys still verify. An empty SESSION_KEY_FILE gives each process its own key
+SESSION_KEYS = os.environ.get("SESSION_KEYS", "")
+SESSION_KEY_FILE = os.environ.get(
+    "SESSION_KEY_FILE",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance", "session_keys.json")
+)
+SESSION_KEY_ROTATION_SECONDS = int(os.environ.get("SESSION_KEY_ROTATION_SECONDS", str(30 * 86400)))
+SESSION_KEY_MAX_KEYS = int(os.environ.get("SESSION_KEY_MAX_KEYS", "3"))
+SESSION_KEY_CHECK_INTERVAL = float(os.environ.get("SESSION_KEY_CHECK_INTERVAL", "60"))
+
+# Server-side session store: "memory" (per-process LRU), "sqlite" (shared by
+# workers on one host), "kv" (local dbm key-value file) or "cookie" (Flask's
+# default signed-cookie sessions)
+SESSION_BACKEND = os.environ.get("SESSION_BACKEND", "memory")
+SESSION_STORE_PATH = os.environ.get(
+    "SESSION_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance", "sessions.sqlite3")
+)
+SESSION_STORE_MAX_ENTRIES = int(os.environ.get("SESSION_STORE_MAX_ENTRIES", "10000"))
+
+# AI Feedback: "async" returns template feedback immediately and delivers the
+# AI explanation through /api/feedback/<ticket>; "sync" waits for the LLM
+AI_FEEDBACK_MODE = os.environ.get("AI_FEEDBACK_MODE", "async")
+AI_FEEDBACK_WORKERS = int(os.environ.get("AI_FEEDBACK_WORKERS", "4"))
+# Jobs queued or running at once; past this the template feedback stands
+AI_FEEDBACK_MAX_PENDING = int(os.environ.get("AI_FEEDBACK_MAX_PENDING", "32"))
+# Tickets not collected within this many seconds are dropped
+AI_FEEDBACK_TICKET_TTL_SECONDS = int(os.environ.get("AI_FEEDBACK_TICKET_TTL_SECONDS", "600"))
+
+# Shared cache of verified AI feedback; set FEEDBACK_CACHE_PATH to keep it across restarts
+FEEDBACK_CACHE_MAX_ENTRIES = int(os.environ.get("FEEDBACK_CACHE_MAX_ENTRIES", "5000"))
+FEEDBACK_CACHE_TTL_SECONDS = int(os.environ.get("FEEDBACK_CACHE_TTL_SECONDS", "86400"))
+FEEDBACK_CACHE_PATH = os.environ.get("FEEDBACK_CACHE_PATH", "")
+
+# Per-session AI conversation memory; older turns beyond MAX_MESSAGES are summarized.
+# Set CONVERSATION_MEMORY_PATH to share histories between workers through SQLite
+CONVERSATION_MEMORY_MAX_SESSIONS = int(os.environ.get("CONVERSATION_MEMORY_MAX_SESSIONS", "2000"))
+CONVERSATION_MEMORY_MAX_BYTES = int(os.environ.get("CONVERSATION_MEMORY_MAX_BYTES", str(16 * 1024 * 1024)))
+CONVERSATION_MEMORY_IDLE_TTL = int(os.environ.get("CONVERSATION_MEMORY_IDLE_TTL", "3600"))
+CONVERSATION_MEMORY_MAX_MESSAGES = int(os.environ.get("CONVERSATION_MEMORY_MAX_MESSAGES", "8"))
+CONVERSATION_MEMORY_PATH = os.environ.get("CONVERSATION_MEMORY_PATH", "")
+
+# Append-only log of every answered question. Empty ATTEMPT_LOG_PATH keeps only
+# the in-memory tails; TAIL_SIZE bounds the recent attempts kept per user
+ATTEMPT_LOG_PATH = os.environ.get(
+    "ATTEMPT_LOG_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance", "attempts.sqlite3")
+)
+ATTEMPT_LOG_TAIL_SIZE = int(os.environ.get("ATTEMPT_LOG_TAIL_SIZE", "50"))
+ATTEMPT_LOG_MAX_USERS = int(os.environ.get("ATTEMPT_LOG_MAX_USERS", "10000"))
+ATTEMPT_LOG_BATCH_SIZE = int(os.environ.get("ATTEMPT_LOG_BATCH_SIZE", "256"))
+ATTEMPT_LOG_FLUSH_INTERVAL = float(os.environ.get("ATTEMPT_LOG_FLUSH_INTERVAL", "0.5"))
+
+# Question catalog built at startup: questions per stage and the fixed build seed
+QUESTION_CATALOG_SIZE = int(os.environ.get("QUESTION_CATALOG_SIZE", "2048"))
+QUESTION_CATALOG_SEED = int(os.environ.get("QUESTION_CATALOG_SEED", "20240601"))
+# LRU bound for memoized distractors/choices; large enough to hold the whole catalog
+CHOICE_CACHE_SIZE = int(os.environ.get("CHOICE_CACHE_SIZE", "16384"))
+# How long a signed question token stays valid for /api/verify-answer
+QUESTION_TOKEN_MAX_AGE = int(os.environ.get("QUESTION_TOKEN_MAX_AGE", "3600"))
+
+# /api/verify-batch limits; larger jobs belong with the Verifier.verify_batch
+# Python API, run offline
+VERIFY_BATCH_MAX_ITEMS = int(os.environ.get("VERIFY_BATCH_MAX_ITEMS", "500"))
+# Workers in the process pool shared by batch verification, and so the most
+# processes one batch can use; 1 keeps it in-process
+VERIFY_BATCH_MAX_PROCESSES = int(os.environ.get("VERIFY_BATCH_MAX_PROCESSES", "1"))
+
+# Logging: LOG_LEVEL is the root level; LOG_LEVELS overrides it per logger, e.g.
+# "services.llm_service=DEBUG,werkzeug=WARNING". Only this fraction of DEBUG
+# records is kept, and records beyond LOG_QUEUE_SIZE waiting to be written are dropped
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+LOG_LEVELS = os.environ.get("LOG_LEVELS", "")
+LOG_DEBUG_SAMPLE_RATE = float(os.environ.get("LOG_DEBUG_SAMPLE_RATE", "1.0"))
+LOG_QUEUE_SIZE = int(os.environ.get("LOG_QUEUE_SIZE", "10000"))
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+# Fraction of requests whose spans are timed for /metrics (0 turns timing off;
+# requests are still counted)
+METRICS_SAMPLE_RATE = float(os.environ.get("METRICS_SAMPLE_RATE", "1.0"))
+# Bearer token required to scrape /metrics; when unset only loopback clients may
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+# Bearer token required to call /api/verify-batch; when unset only loopback clients may
+VERIFY_BATCH_TOKEN = os.environ.get("VERIFY_BATCH_TOKEN", "")
 
 # Learning Stages
 STAGES = {
@@ -15,12 +101,60 @@ STAGES = {
     "COMPLETE": "complete"
 }
 
-# Advancement Criteria
+# Advancement Criteria: when a stage is left and where to. "correct_required"
+# counts correct answers in the stage, "consecutive_correct_required" a streak.
+# With "min_accuracy" the student only moves to "next" if their accuracy over
+# TRACKED_STAGES reaches it, and to "otherwise" if not. Stages without an entry
+# never advance on their own. Compiled and checked by models/stage_graph.py
 ADVANCEMENT_CRITERIA = {
-    "1.1": {"correct_required": 1},
-    "1.2": {"correct_required": 1},
-    "1.3": {"consecutive_correct_required": 2},
-    "stretch_1": {"questions_required": 3}
+    "1.1": {"correct_required": 1, "next": "1.2"},
+    "1.2": {"correct_required": 1, "next": "1.3"},
+    "1.3": {"consecutive_correct_required": 2, "next": "2.1"},
+    "2.1": {"consecutive_correct_required": 2, "next": "2.2"},
+    "2.2": {"correct_required": 1, "min_accuracy": 0.8, "next": "stretch", "otherwise": "complete"}
+}
+
+# Stages whose answers are counted in stage_results (and so in min_accuracy)
+TRACKED_STAGES = ("1.1", "1.2", "1.3", "2.1")
+
+# Skills tracked by the Bayesian knowledge-tracing model (models/mastery.py), and
+# the skills a stage practises. With ADVANCEMENT_MODE = "mastery" a stage is left
+# once the student's mastery of all its skills reaches MASTERY_THRESHOLD, instead
+# of by the answer counts above
+ADVANCEMENT_MODE = os.environ.get("ADVANCEMENT_MODE", "counters")
+MASTERY_THRESHOLD = float(os.environ.get("MASTERY_THRESHOLD", "0.95"))
+SKILLS = ("1dp_down", "1dp_up", "multi_digit", "2_3dp", "nines_carry")
+STAGE_SKILLS = {
+    "1.1": ("1dp_down",),
+    "1.2": ("1dp_up",),
+    "1.3": ("1dp_down", "1dp_up", "multi_digit"),
+    "2.1": ("2_3dp",),
+    "2.2": ("2_3dp", "multi_digit"),
+    "stretch": ("nines_carry",)
+}
+# Per-skill BKT parameters: prior mastery, chance of learning per attempt, and
+# the chances of a slip (wrong while mastered) and a guess (right while not)
+BKT_PARAMS = {
+    "1dp_down": {"p_init": 0.4, "p_transit": 0.2, "p_slip": 0.1, "p_guess": 0.25},
+    "1dp_up": {"p_init": 0.3, "p_transit": 0.2, "p_slip": 0.1, "p_guess": 0.25},
+    "multi_digit": {"p_init": 0.3, "p_transit": 0.15, "p_slip": 0.1, "p_guess": 0.25},
+    "2_3dp": {"p_init": 0.3, "p_transit": 0.15, "p_slip": 0.1, "p_guess": 0.25},
+    "nines_carry": {"p_init": 0.2, "p_transit": 0.15, "p_slip": 0.15, "p_guess": 0.25}
+}
+# JSON file of fitted parameters written by scripts/fit_mastery.py; skills it
+# does not cover keep the values above. Empty uses BKT_PARAMS as they are
+BKT_PARAMS_PATH = os.environ.get("BKT_PARAMS_PATH", "")
+
+# Page endpoint for each stage, and for stages with worked examples
+# (QUESTION_RULES "exampleN" entries) the page that shows them
+STAGE_PAGES = {
+    "1.1": {"examples": "rounding_examples", "page": "rounding_practice"},
+    "1.2": {"page": "rounding_practice"},
+    "1.3": {"page": "rounding_practice"},
+    "2.1": {"examples": "rounding_decimal2_examples", "page": "rounding_decimal23_practice"},
+    "2.2": {"page": "rounding_decimal23_practice"},
+    "stretch": {"examples": "rounding_stretch_examples", "page": "rounding_stretch_practice"},
+    "complete": {"page": "rounding_complete"}
 }
 
 # Question Generation Rules
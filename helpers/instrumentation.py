@@ -0,0 +1,256 @@
+"""Named timing spans aggregated into per-endpoint histograms, rendered for Prometheus.
+
+A request is sampled with probability METRICS_SAMPLE_RATE when it enters the
+WSGI middleware. Every request carries a small trace in a ContextVar so it can
+be counted under its endpoint, but only sampled traces time anything: for the
+rest (and for code running outside a request) ``span`` returns a shared no-op
+context manager and ``timed`` calls straight through, so the cost is one
+ContextVar lookup.
+
+Spans are collected on the trace and folded into the histograms once, when the
+request finishes, under the endpoint name Flask matched. Work handed to
+another thread through ``bind_trace`` keeps reporting to the same endpoint
+after the response has gone out.
+"""
+import bisect
+import contextvars
+import random
+import threading
+import time
+from functools import wraps
+
+from config import METRICS_SAMPLE_RATE
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_current_trace = contextvars.ContextVar("request_trace", default=None)
+
+
+class Histogram:
+    """Bucket counts plus sum and count, Prometheus style."""
+
+    __slots__ = ("counts", "total", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # last slot is +Inf
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+
+
+class MetricsRegistry:
+    """Process-wide span histograms and request counters."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}   # (endpoint, span) -> Histogram
+        self._requests = {}     # (endpoint, method, status) -> count
+        self._gauge_sources = {}
+
+    def observe(self, endpoint, spans):
+        """Record a list of (span name, seconds) for ``endpoint``."""
+        with self._lock:
+            for name, seconds in spans:
+                histogram = self._histograms.get((endpoint, name))
+                if histogram is None:
+                    histogram = self._histograms[(endpoint, name)] = Histogram()
+                histogram.observe(seconds)
+
+    def count_request(self, endpoint, method, status):
+        key = (endpoint, method, status)
+        with self._lock:
+            self._requests[key] = self._requests.get(key, 0) + 1
+
+    def add_gauge_source(self, component, stats_fn):
+        """Expose the numeric values of ``stats_fn()`` as tutor_<component>_<key> gauges."""
+        self._gauge_sources[component] = stats_fn
+
+    def snapshot(self):
+        """Copy of the histograms as {(endpoint, span): (counts, sum, count)}."""
+        with self._lock:
+            return {key: (list(h.counts), h.total, h.count) for key, h in self._histograms.items()}
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._requests.clear()
+
+    def render_prometheus(self):
+        """Render everything in the Prometheus text exposition format (0.0.4)."""
+        with self._lock:
+            histograms = sorted((key, list(h.counts), h.total, h.count) for key, h in self._histograms.items())
+            requests = sorted(self._requests.items())
+
+        lines = [
+            "# HELP tutor_requests_total HTTP requests handled, by endpoint, method and status.",
+            "# TYPE tutor_requests_total counter",
+        ]
+        for (endpoint, method, status), count in requests:
+            lines.append(f'tutor_requests_total{{endpoint="{endpoint}",method="{method}",status="{status}"}} {count}')
+
+        lines += [
+            "# HELP tutor_span_seconds Time spent in named spans of sampled requests.",
+            "# TYPE tutor_span_seconds histogram",
+        ]
+        for (endpoint, name), counts, total, count in histograms:
+            labels = f'endpoint="{endpoint}",span="{name}"'
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKETS, counts):
+                cumulative += bucket_count
+                lines.append(f'tutor_span_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'tutor_span_seconds_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f"tutor_span_seconds_sum{{{labels}}} {total:.6f}")
+            lines.append(f"tutor_span_seconds_count{{{labels}}} {count}")
+
+        for component, stats_fn in sorted(self._gauge_sources.items()):
+            try:
+                stats = stats_fn()
+            except Exception:
+                continue
+            for key, value in sorted(stats.items()):
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f"# TYPE tutor_{component}_{key} gauge")
+                    lines.append(f"tutor_{component}_{key} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+
+class _Trace:
+    """Endpoint label and, for sampled requests, the spans recorded so far."""
+
+    __slots__ = ("endpoint", "spans", "closed", "sampled")
+
+    def __init__(self, sampled):
+        self.endpoint = "unmatched"
+        self.spans = []
+        self.closed = False
+        self.sampled = sampled
+
+    def add(self, name, seconds):
+        if self.closed:
+            # Background work finishing after the response; record it directly
+            registry.observe(self.endpoint, ((name, seconds),))
+        else:
+            self.spans.append((name, seconds))
+
+
+class _Span:
+    __slots__ = ("trace", "name", "start")
+
+    def __init__(self, trace, name):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.trace.add(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(name):
+    """Context manager timing the enclosed block as ``name`` on the current request."""
+    trace = _current_trace.get()
+    if trace is None or not trace.sampled:
+        return _NOOP_SPAN
+    return _Span(trace, name)
+
+
+def timed(name):
+    """Decorator form of ``span``."""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            trace = _current_trace.get()
+            if trace is None or not trace.sampled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                trace.add(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def bind_trace(fn):
+    """Wrap ``fn`` to run under the current request's trace on another thread.
+
+    Only the trace is carried over, not the rest of the request's context
+    (Flask's request and app contexts), which must not outlive the request.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return fn
+
+    @wraps(fn)
+    def run(*args, **kwargs):
+        token = _current_trace.set(trace)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current_trace.reset(token)
+
+    return run
+
+
+def set_endpoint(endpoint):
+    """Label the current trace with the matched Flask endpoint."""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.endpoint = endpoint or "unmatched"
+
+
+class InstrumentationMiddleware:
+    """WSGI middleware that samples requests and times them end to end.
+
+    It wraps ``app.wsgi_app`` rather than using before_request so the session
+    load, which Flask runs before any request hook, falls inside the trace.
+    """
+
+    def __init__(self, wsgi_app, sample_rate=METRICS_SAMPLE_RATE):
+        self.wsgi_app = wsgi_app
+        self.sample_rate = sample_rate
+
+    def __call__(self, environ, start_response):
+        status_holder = []
+
+        def recording_start_response(status, headers, exc_info=None):
+            status_holder.append(status.split(" ", 1)[0])
+            return start_response(status, headers, exc_info)
+
+        trace = _Trace(bool(self.sample_rate) and random.random() < self.sample_rate)
+        token = _current_trace.set(trace)
+        start = time.perf_counter()
+        try:
+            return self.wsgi_app(environ, recording_start_response)
+        finally:
+            _current_trace.reset(token)
+            trace.closed = True
+            if trace.sampled:
+                trace.spans.append(("request", time.perf_counter() - start))
+                registry.observe(trace.endpoint, trace.spans)
+            registry.count_request(trace.endpoint, environ.get("REQUEST_METHOD", ""),
+                                   status_holder[0] if status_holder else "")
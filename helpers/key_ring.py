@@ -0,0 +1,186 @@
+"""Signing keys shared by every worker and kept across restarts.
+
+Keys come from SESSION_KEYS (comma separated, oldest first) when it is set;
+those are managed by the operator and never rotated here. Otherwise they live
+in a JSON key file that the first worker creates. Whichever worker finds the
+newest key older than the rotation period appends a new one under a file lock;
+the other workers notice the file changed on their next check. New signatures
+always use the newest key, and anything signed with one of the last
+``max_keys`` keys still verifies.
+"""
+import base64
+import json
+import os
+import secrets
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX
+    fcntl = None
+
+from config import (
+    SESSION_KEYS, SESSION_KEY_FILE, SESSION_KEY_ROTATION_SECONDS, SESSION_KEY_MAX_KEYS,
+    SESSION_KEY_CHECK_INTERVAL
+)
+
+KEY_BYTES = 32
+
+
+class KeyRing:
+    """Ordered signing secrets, oldest first; the last one signs."""
+
+    def __init__(self, path=None, env_keys="", rotation_seconds=0, max_keys=3, check_interval=60.0):
+        self.path = path
+        self.rotation_seconds = rotation_seconds
+        self.max_keys = max(1, max_keys)
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._entries = []          # [{"id", "secret" (bytes), "created"}], oldest first
+        self._secrets = ()
+        self._mtime = None
+        self._next_check = 0.0
+        self.rotations = 0
+
+        keys = [key.strip() for key in env_keys.split(",") if key.strip()]
+        if keys:
+            self.path = None
+            self.rotation_seconds = 0
+            self._set_entries([{"id": str(i), "secret": key.encode("utf-8"), "created": 0}
+                               for i, key in enumerate(keys)])
+        elif path:
+            with self._file_lock():
+                if not self._load():
+                    self._write([self._new_entry()])
+                    self._load()
+        else:
+            # No shared storage: a per-process key, as before
+            self._set_entries([self._new_entry()])
+
+    def secrets(self):
+        """All verifying secrets, oldest first; the last one is used to sign."""
+        if self.path and time.monotonic() >= self._next_check:
+            self._refresh()
+        return self._secrets
+
+    def current(self):
+        """The secret new signatures are made with."""
+        return self.secrets()[-1]
+
+    def rotate(self):
+        """Append a new key now (and drop the oldest beyond max_keys)."""
+        if not self.path:
+            with self._lock:
+                self._set_entries((self._entries + [self._new_entry()])[-self.max_keys:])
+                self.rotations += 1
+            return
+        with self._lock, self._file_lock():
+            self._load()
+            self._write((self._entries + [self._new_entry()])[-self.max_keys:])
+            self._load()
+            self.rotations += 1
+
+    def get_stats(self):
+        entries = self._entries
+        return {
+            "keys": len(entries),
+            "rotations": self.rotations,
+            "newest_key_age_seconds": round(time.time() - entries[-1]["created"]) if entries[-1]["created"] else 0
+        }
+
+    # Internals
+
+    def _refresh(self):
+        with self._lock:
+            if time.monotonic() < self._next_check:
+                return
+            self._next_check = time.monotonic() + self.check_interval
+            try:
+                changed = os.stat(self.path).st_mtime_ns != self._mtime
+            except OSError:
+                changed = True
+            due = self.rotation_seconds and time.time() - self._entries[-1]["created"] >= self.rotation_seconds
+            if not changed and not due:
+                return
+            with self._file_lock():
+                self._load()
+                # Another worker may already have rotated while we waited for the lock
+                if self.rotation_seconds and time.time() - self._entries[-1]["created"] >= self.rotation_seconds:
+                    self._write((self._entries + [self._new_entry()])[-self.max_keys:])
+                    self._load()
+                    self.rotations += 1
+
+    def _new_entry(self):
+        return {"id": secrets.token_hex(4), "secret": secrets.token_bytes(KEY_BYTES), "created": time.time()}
+
+    def _set_entries(self, entries):
+        self._entries = entries
+        self._secrets = tuple(entry["secret"] for entry in entries)
+
+    def _load(self):
+        """Read the key file; returns False if it does not exist yet."""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+                self._mtime = os.fstat(f.fileno()).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        except ValueError as e:
+            raise ValueError(f"Corrupt session key file {self.path}: {e}") from e
+        entries = [{"id": entry["id"], "secret": base64.b64decode(entry["secret"]), "created": entry["created"]}
+                   for entry in data.get("keys", [])]
+        if not entries:
+            return False
+        self._set_entries(entries)
+        return True
+
+    def _write(self, entries):
+        data = {"keys": [{"id": entry["id"], "secret": base64.b64encode(entry["secret"]).decode("ascii"),
+                          "created": entry["created"]} for entry in entries]}
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def _file_lock(self):
+        return _FileLock(f"{self.path}.lock")
+
+
+class _FileLock:
+    """Exclusive flock on a side file, so workers create and rotate the key file one at a time."""
+
+    def __init__(self, path):
+        self.path = path
+        self.fd = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self.fd is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+            os.close(self.fd)
+            self.fd = None
+        return False
+
+
+_key_ring = None
+_key_ring_lock = threading.Lock()
+
+
+def get_key_ring():
+    """Return the process-wide KeyRing configured from config.py."""
+    global _key_ring
+    if _key_ring is None:
+        with _key_ring_lock:
+            if _key_ring is None:
+                _key_ring = KeyRing(SESSION_KEY_FILE, SESSION_KEYS, SESSION_KEY_ROTATION_SECONDS,
+                                    SESSION_KEY_MAX_KEYS, SESSION_KEY_CHECK_INTERVAL)
+    return _key_ring
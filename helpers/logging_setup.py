@@ -0,0 +1,112 @@
+"""Process-wide logging: per-logger levels, sampled DEBUG records, writes off the request thread.
+
+Request threads only put LogRecords on a bounded queue; a QueueListener thread
+formats them and does the I/O. Records are queued unformatted, so the %-style
+arguments of ``logger.debug("... %s", value)`` are only rendered when the
+record is actually written (and not at all for disabled levels). If the
+writer falls LOG_QUEUE_SIZE records behind, new records are dropped and
+counted instead of blocking the request.
+"""
+import atexit
+import logging
+import queue
+import random
+import sys
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+from config import LOG_DEBUG_SAMPLE_RATE, LOG_FORMAT, LOG_LEVEL, LOG_LEVELS, LOG_QUEUE_SIZE
+
+_lock = threading.Lock()
+_listener = None
+_queue_handler = None
+_stream_handler = None
+
+
+def parse_levels(spec):
+    """Parse "name=LEVEL,name=LEVEL" into {logger name: level}; bad entries are ignored."""
+    levels = {}
+    for item in spec.split(","):
+        name, _, level = item.partition("=")
+        level = logging.getLevelName(level.strip().upper())
+        if name.strip() and isinstance(level, int):
+            levels[name.strip()] = level
+    return levels
+
+
+class DebugSampler(logging.Filter):
+    """Keep only ``rate`` of DEBUG records; other levels always pass."""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or self.rate >= 1 or random.random() < self.rate
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that defers formatting to the listener and drops records when the queue is full."""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Tracebacks have to be rendered now, while the frames still exist
+        if record.exc_info:
+            return super().prepare(record)
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure_logging(stream=None):
+    """
+    Install the queue handler on the root logger and start its writer thread.
+
+    Safe to call more than once; later calls return the running listener.
+
+    Args:
+        stream: Where the listener writes (defaults to stderr)
+    """
+    global _listener, _queue_handler, _stream_handler
+    with _lock:
+        if _listener is not None:
+            return _listener
+
+        _stream_handler = logging.StreamHandler(stream or sys.stderr)
+        _stream_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+        _queue_handler = NonBlockingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+        _queue_handler.addFilter(DebugSampler(LOG_DEBUG_SAMPLE_RATE))
+
+        root = logging.getLogger()
+        for handler in root.handlers[:]:
+            root.removeHandler(handler)
+        root.addHandler(_queue_handler)
+        root.setLevel(LOG_LEVEL.upper())
+        for name, level in parse_levels(LOG_LEVELS).items():
+            logging.getLogger(name).setLevel(level)
+
+        _listener = QueueListener(_queue_handler.queue, _stream_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+        return _listener
+
+
+def set_stream(stream):
+    """Point the listener's output at ``stream`` (the load test sends it to /dev/null)."""
+    if _stream_handler is not None:
+        _stream_handler.setStream(stream)
+
+
+def get_stats():
+    """Queue depth and dropped-record count for /metrics."""
+    if _queue_handler is None:
+        return {"queued": 0, "dropped": 0}
+    return {"queued": _queue_handler.queue.qsize(), "dropped": _queue_handler.dropped}
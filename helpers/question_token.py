@@ -0,0 +1,74 @@
+"""Compact signed tokens naming the practice question a student was served.
+
+A token carries the catalog question id, the correct letter, the index of the
+choice ordering and the issue time, signed with an HMAC that also covers the
+student's user id. The verifier rebuilds the question from the catalog, so
+nothing about the question has to live in the session.
+
+``secret`` may also be a sequence of secrets, oldest first, as returned by
+KeyRing.secrets(): tokens are issued with the last one and accepted under any.
+"""
+import base64
+import hashlib
+import hmac
+import time
+
+TOKEN_VERSION = "1"
+SEPARATOR = "~"
+
+
+def _secret_bytes(secret):
+    return secret if isinstance(secret, bytes) else str(secret).encode("utf-8")
+
+
+def _secret_list(secret):
+    return list(secret) if isinstance(secret, (list, tuple)) else [secret]
+
+
+def _signature(secret, payload, user_id):
+    digest = hmac.new(_secret_bytes(secret), f"{payload}{SEPARATOR}{user_id or ''}".encode("utf-8"),
+                      hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest[:12]).decode("ascii")
+
+
+def issue_question_token(secret, question_id, correct_letter, choice_order, user_id=None, issued_at=None):
+    """Return a URL-safe token for a served question."""
+    issued_at = int(time.time() if issued_at is None else issued_at)
+    payload = SEPARATOR.join((TOKEN_VERSION, question_id, correct_letter, str(choice_order), f"{issued_at:x}"))
+    return f"{payload}{SEPARATOR}{_signature(_secret_list(secret)[-1], payload, user_id)}"
+
+
+def read_question_token(secret, token, user_id=None, max_age=3600):
+    """
+    Check a token's signature and age.
+
+    Returns:
+        dict with question_id, correct_letter, choice_order and issued_at, or
+        None when the token is malformed, forged, for another user or expired
+    """
+    if not isinstance(token, str):
+        return None
+    payload, _, signature = token.rpartition(SEPARATOR)
+    parts = payload.split(SEPARATOR)
+    if len(parts) != 5 or parts[0] != TOKEN_VERSION:
+        return None
+    # Newest key first; tokens issued before a rotation are the exception
+    if not any(hmac.compare_digest(signature, _signature(key, payload, user_id))
+               for key in reversed(_secret_list(secret))):
+        return None
+
+    _, question_id, correct_letter, choice_order, issued_hex = parts
+    try:
+        issued_at = int(issued_hex, 16)
+        choice_order = int(choice_order)
+    except ValueError:
+        return None
+    if time.time() - issued_at > max_age:
+        return None
+
+    return {
+        "question_id": question_id,
+        "correct_letter": correct_letter,
+        "choice_order": choice_order,
+        "issued_at": issued_at
+    }
@@ -0,0 +1,87 @@
+"""Per-user cache of LearningSequence objects for threaded and multi-process workers."""
+import threading
+import weakref
+from collections import OrderedDict
+
+
+class SequenceEntry:
+    """A cached LearningSequence plus the session state it was last synced with."""
+
+    __slots__ = ("sequence", "synced_state")
+
+    def __init__(self, sequence, synced_state):
+        self.sequence = sequence
+        self.synced_state = synced_state
+
+
+class SequenceRegistry:
+    """Bounded, lock-striped LRU cache of LearningSequence objects keyed by user id.
+
+    The session remains the source of truth: an entry is reused only while the
+    session's ``learning_state`` still matches what the entry last wrote, so a
+    request served by another worker process forces a fresh hydration.
+
+    Requests for one user are serialized by ``lock(user_id)``, which lives
+    independently of the cached entry: it must be held around ``get`` and
+    everything up to saving the session, so the entry is built once and a
+    request never works on a sequence another request is changing.
+    """
+
+    def __init__(self, max_entries=5000, stripes=16):
+        self.stripes = stripes
+        self.max_per_stripe = max(1, max_entries // stripes)
+        self._locks = [threading.Lock() for _ in range(stripes)]
+        self._entries = [OrderedDict() for _ in range(stripes)]
+        # A user's lock lives as long as some request holds it; a new one is
+        # only created when nobody does
+        self._user_locks = [weakref.WeakValueDictionary() for _ in range(stripes)]
+
+    def _stripe(self, user_id):
+        index = hash(user_id) % self.stripes
+        return self._locks[index], self._entries[index]
+
+    def lock(self, user_id):
+        """The lock serializing requests for ``user_id``."""
+        index = hash(user_id) % self.stripes
+        with self._locks[index]:
+            user_lock = self._user_locks[index].get(user_id)
+            if user_lock is None:
+                user_lock = self._user_locks[index][user_id] = threading.RLock()
+            return user_lock
+
+    def get(self, user_id, session_state, loader):
+        """Return the entry for ``user_id``, calling ``loader()`` to hydrate it when stale.
+
+        The caller must hold ``lock(user_id)``.
+        """
+        lock, entries = self._stripe(user_id)
+        with lock:
+            entry = entries.get(user_id)
+            if entry is not None and entry.synced_state == session_state:
+                entries.move_to_end(user_id)
+                return entry
+
+        entry = SequenceEntry(loader(), session_state)
+        with lock:
+            entries[user_id] = entry
+            entries.move_to_end(user_id)
+            while len(entries) > self.max_per_stripe:
+                entries.popitem(last=False)
+        return entry
+
+    def mark_synced(self, user_id, session_state):
+        """Record the state most recently written to the session for ``user_id``."""
+        lock, entries = self._stripe(user_id)
+        with lock:
+            entry = entries.get(user_id)
+            if entry is not None:
+                entry.synced_state = session_state
+
+    def discard(self, user_id):
+        """Drop the cached sequence for ``user_id``."""
+        lock, entries = self._stripe(user_id)
+        with lock:
+            entries.pop(user_id, None)
+
+    def __len__(self):
+        return sum(len(entries) for entries in self._entries)
@@ -0,0 +1,307 @@
+"""Compact binary encoding of the whole session for cookie-backed sessions.
+
+Layout::
+
+    header: u8, low 7 bits the version, high bit set when the rest is zlib-compressed
+    fields: field code u8 followed by its payload, in any order
+
+Known fields have their own encoding: the user id as 16 UUID bytes, the
+learning state as varints with a flags byte (followed by a second flags byte
+and the per-skill mastery estimates and answered question tokens when it has
+them), stage names and topics as
+references into a fixed table of known strings, the student profile as its
+profile_codec bytes, and the misconception history as (name, count) pairs.
+Anything that does not fit those shapes (other keys, legacy dicts, unexpected
+types) goes into one tagged-JSON blob, so decoding always returns what was
+encoded. zlib is only applied when it makes the payload smaller.
+"""
+import uuid
+import zlib
+
+from flask.sessions import session_json_serializer
+
+VERSION = 1
+_COMPRESSED = 0x80
+# Payloads shorter than this are never worth compressing
+COMPRESS_MIN_BYTES = 96
+
+_FIELD_USER_UUID = 1
+_FIELD_USER_ID = 2
+_FIELD_TOPIC = 3
+_FIELD_LEARNING_STATE = 4
+_FIELD_PROFILE = 5
+_FIELD_MISCONCEPTIONS = 6
+_FIELD_QUESTION = 7
+_FIELD_LEARNING_STATE_EXTRAS = 8
+_FIELD_OTHER = 127
+
+# Strings that occur in nearly every session; written as their index + 1.
+# Part of the wire format: only ever append, and bump VERSION if an entry has
+# to change or move. Strings not listed here (such as new stages) still round-trip
+KNOWN_STRINGS = (
+    "rounding", "fractions", "rounding_practice", "fractions_practice",
+    "1.1", "1.2", "1.3", "2.1", "2.2", "stretch", "complete",
+)
+_KNOWN_INDEX = {text: i + 1 for i, text in enumerate(KNOWN_STRINGS)}
+
+_LEARNING_STATE_KEYS = frozenset((
+    "topic", "section", "stage", "correct_answers", "consecutive_correct", "questions_attempted",
+    "showing_example", "current_example", "stage_results", "question_cursors"
+))
+# Learning state keys that may be absent, with their bit in the extras flags byte
+_OPTIONAL_STATE_KEYS = {"mastery": 1, "answered_tokens": 2}
+
+
+class SessionDecodeError(ValueError):
+    """Raised for bytes that are not a session this codec can read."""
+
+
+def _is_count(value):
+    return type(value) is int and value >= 0
+
+
+def _fits_learning_state(state):
+    if not isinstance(state, dict) or not _LEARNING_STATE_KEYS <= state.keys():
+        return False
+    if not state.keys() - _LEARNING_STATE_KEYS <= _OPTIONAL_STATE_KEYS.keys():
+        return False
+    if "mastery" in state and (not isinstance(state["mastery"], list)
+                               or not all(_is_count(value) for value in state["mastery"])):
+        return False
+    if "answered_tokens" in state:
+        answered = state["answered_tokens"]
+        if (not isinstance(answered, list) or len(answered) != 2 or not _is_count(answered[0])
+                or not isinstance(answered[1], list) or not all(isinstance(q, str) for q in answered[1])):
+            return False
+    if not all(isinstance(state[key], str) for key in ("topic", "section", "stage")):
+        return False
+    if not all(_is_count(state[key]) for key in
+               ("correct_answers", "consecutive_correct", "questions_attempted", "current_example")):
+        return False
+    if type(state["showing_example"]) is not bool:
+        return False
+    results, cursors = state["stage_results"], state["question_cursors"]
+    if not isinstance(results, dict) or not isinstance(cursors, dict):
+        return False
+    for stage, counts in results.items():
+        if (not isinstance(stage, str) or not isinstance(counts, dict) or counts.keys() != {"attempted", "correct"}
+                or not _is_count(counts["attempted"]) or not _is_count(counts["correct"])):
+            return False
+    for stage, cursor in cursors.items():
+        if (not isinstance(stage, str) or not isinstance(cursor, list) or len(cursor) != 2
+                or not all(_is_count(part) for part in cursor)):
+            return False
+    return True
+
+
+def _fits_counts(mapping):
+    return isinstance(mapping, dict) and all(isinstance(k, str) and _is_count(v) for k, v in mapping.items())
+
+
+class _Writer:
+    __slots__ = ("buffer",)
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def varint(self, value):
+        while value > 0x7F:
+            self.buffer.append((value & 0x7F) | 0x80)
+            value >>= 7
+        self.buffer.append(value)
+
+    def blob(self, data):
+        self.varint(len(data))
+        self.buffer += data
+
+    def string(self, text):
+        index = _KNOWN_INDEX.get(text)
+        if index is None:
+            self.buffer.append(0)
+            self.blob(text.encode("utf-8"))
+        else:
+            self.varint(index)
+
+    def counts(self, mapping):
+        self.varint(len(mapping))
+        for key, value in mapping.items():
+            self.string(key)
+            self.varint(value)
+
+
+class _Reader:
+    __slots__ = ("data", "pos")
+
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def byte(self):
+        value = self.data[self.pos]
+        self.pos += 1
+        return value
+
+    def varint(self):
+        result = shift = 0
+        while True:
+            byte = self.byte()
+            result |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return result
+            shift += 7
+
+    def blob(self):
+        length = self.varint()
+        if self.pos + length > len(self.data):
+            raise IndexError("blob runs past the end of the session")
+        chunk = self.data[self.pos:self.pos + length]
+        self.pos += length
+        return bytes(chunk)
+
+    def string(self):
+        index = self.varint()
+        return KNOWN_STRINGS[index - 1] if index else self.blob().decode("utf-8")
+
+    def counts(self):
+        return {self.string(): self.varint() for _ in range(self.varint())}
+
+
+def _encode_learning_state(writer, state):
+    writer.string(state["topic"])
+    writer.string(state["section"])
+    writer.string(state["stage"])
+    writer.varint(state["correct_answers"])
+    writer.varint(state["consecutive_correct"])
+    writer.varint(state["questions_attempted"])
+    writer.varint(state["current_example"])
+    writer.buffer.append(1 if state["showing_example"] else 0)
+    writer.varint(len(state["stage_results"]))
+    for stage, counts in state["stage_results"].items():
+        writer.string(stage)
+        writer.varint(counts["attempted"])
+        writer.varint(counts["correct"])
+    writer.varint(len(state["question_cursors"]))
+    for stage, (seed, offset) in state["question_cursors"].items():
+        writer.string(stage)
+        writer.varint(seed)
+        writer.varint(offset)
+    extras = sum(bit for key, bit in _OPTIONAL_STATE_KEYS.items() if key in state)
+    if not extras:
+        return
+    writer.buffer.append(extras)
+    if "mastery" in state:
+        writer.varint(len(state["mastery"]))
+        for value in state["mastery"]:
+            writer.varint(value)
+    if "answered_tokens" in state:
+        issued_at, question_ids = state["answered_tokens"]
+        writer.varint(issued_at)
+        writer.varint(len(question_ids))
+        for question_id in question_ids:
+            writer.string(question_id)
+
+
+def _decode_learning_state(reader, field):
+    state = {
+        "topic": reader.string(),
+        "section": reader.string(),
+        "stage": reader.string(),
+        "correct_answers": reader.varint(),
+        "consecutive_correct": reader.varint(),
+        "questions_attempted": reader.varint(),
+        "current_example": reader.varint(),
+        "showing_example": bool(reader.byte())
+    }
+    state["stage_results"] = {reader.string(): {"attempted": reader.varint(), "correct": reader.varint()}
+                              for _ in range(reader.varint())}
+    state["question_cursors"] = {reader.string(): [reader.varint(), reader.varint()]
+                                 for _ in range(reader.varint())}
+    extras = reader.byte() if field == _FIELD_LEARNING_STATE_EXTRAS else 0
+    if extras & _OPTIONAL_STATE_KEYS["mastery"]:
+        state["mastery"] = [reader.varint() for _ in range(reader.varint())]
+    if extras & _OPTIONAL_STATE_KEYS["answered_tokens"]:
+        issued_at = reader.varint()
+        state["answered_tokens"] = [issued_at, [reader.string() for _ in range(reader.varint())]]
+    return state
+
+
+def encode_session(data):
+    """Encode a session dict to bytes."""
+    writer = _Writer()
+    other = {}
+    for key, value in data.items():
+        if key == "user_id" and isinstance(value, str):
+            try:
+                parsed = uuid.UUID(value)
+            except ValueError:
+                parsed = None
+            if parsed is not None and str(parsed) == value:
+                writer.buffer.append(_FIELD_USER_UUID)
+                writer.buffer += parsed.bytes
+            else:
+                writer.buffer.append(_FIELD_USER_ID)
+                writer.blob(value.encode("utf-8"))
+        elif key == "current_topic" and isinstance(value, str):
+            writer.buffer.append(_FIELD_TOPIC)
+            writer.string(value)
+        elif key == "learning_state" and _fits_learning_state(value):
+            has_extras = not value.keys() <= _LEARNING_STATE_KEYS
+            writer.buffer.append(_FIELD_LEARNING_STATE_EXTRAS if has_extras else _FIELD_LEARNING_STATE)
+            _encode_learning_state(writer, value)
+        elif key == "student_profile" and isinstance(value, bytes):
+            writer.buffer.append(_FIELD_PROFILE)
+            writer.blob(value)
+        elif key == "misconception_history" and _fits_counts(value):
+            writer.buffer.append(_FIELD_MISCONCEPTIONS)
+            writer.counts(value)
+        elif key == "current_question" and isinstance(value, str):
+            writer.buffer.append(_FIELD_QUESTION)
+            writer.blob(value.encode("utf-8"))
+        else:
+            other[key] = value
+    if other:
+        writer.buffer.append(_FIELD_OTHER)
+        writer.blob(session_json_serializer.dumps(other).encode("utf-8"))
+
+    body = bytes(writer.buffer)
+    if len(body) >= COMPRESS_MIN_BYTES:
+        compressed = zlib.compress(body, 6)
+        if len(compressed) < len(body):
+            return bytes((VERSION | _COMPRESSED,)) + compressed
+    return bytes((VERSION,)) + body
+
+
+def decode_session(payload):
+    """Decode bytes from encode_session back into a session dict."""
+    if not payload or payload[0] & ~_COMPRESSED != VERSION:
+        raise SessionDecodeError("not an encoded session")
+    try:
+        body = zlib.decompress(payload[1:]) if payload[0] & _COMPRESSED else payload[1:]
+        reader = _Reader(body)
+        data = {}
+        while reader.pos < len(body):
+            field = reader.byte()
+            if field == _FIELD_USER_UUID:
+                data["user_id"] = str(uuid.UUID(bytes=bytes(body[reader.pos:reader.pos + 16])))
+                reader.pos += 16
+            elif field == _FIELD_USER_ID:
+                data["user_id"] = reader.blob().decode("utf-8")
+            elif field == _FIELD_TOPIC:
+                data["current_topic"] = reader.string()
+            elif field in (_FIELD_LEARNING_STATE, _FIELD_LEARNING_STATE_EXTRAS):
+                data["learning_state"] = _decode_learning_state(reader, field)
+            elif field == _FIELD_PROFILE:
+                data["student_profile"] = reader.blob()
+            elif field == _FIELD_MISCONCEPTIONS:
+                data["misconception_history"] = reader.counts()
+            elif field == _FIELD_QUESTION:
+                data["current_question"] = reader.blob().decode("utf-8")
+            elif field == _FIELD_OTHER:
+                data.update(session_json_serializer.loads(reader.blob().decode("utf-8")))
+            else:
+                raise SessionDecodeError(f"unknown session field {field}")
+    except (IndexError, ValueError, zlib.error) as e:
+        if isinstance(e, SessionDecodeError):
+            raise
+        raise SessionDecodeError(f"truncated or corrupt session: {e}") from e
+    return data
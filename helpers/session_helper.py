@@ -1,7 +1,10 @@
 """Helper functions for session management with enhanced student profiling and topic support."""
 from flask import session
 from datetime import datetime
+from models.mastery import MASTERY_MODEL
 from models.student_profile import StudentProfile
+from models.profile_codec import ProfileDecodeError
+from services.attempt_log import get_attempt_log
 
 def prepare_session_data(learning_sequence, topic="rounding"):
     """Convert session data to JSON-serializable format with topic support."""
@@ -15,7 +18,9 @@ def prepare_session_data(learning_sequence, topic="rounding"):
         'showing_example': learning_sequence.showing_example,
         'current_example': learning_sequence.current_example,
         'stage_results': learning_sequence.stage_results,
-        'used_questions': {k: list(v) for k, v in learning_sequence.used_questions.items()}  # Convert sets to lists
+        'question_cursors': {k: list(v) for k, v in learning_sequence.question_cursors.items()},  # [seed, offset] per stage
+        'mastery': list(learning_sequence.mastery),  # per-skill estimates in basis points
+        'answered_tokens': [learning_sequence.answered_tokens[0], list(learning_sequence.answered_tokens[1])]
     }
 
 def load_learning_sequence_from_session(learning_sequence, topic="rounding"):
@@ -43,9 +48,18 @@ def load_learning_sequence_from_session(learning_sequence, topic="rounding"):
     if 'stage_results' in session[session_key]:
         learning_sequence.stage_results = session[session_key]['stage_results']
     
-    if 'used_questions' in session[session_key]:
-        used_questions_dict = session[session_key]['used_questions']
-        learning_sequence.used_questions = {k: set(v) for k, v in used_questions_dict.items()}
+    if 'question_cursors' in session[session_key]:
+        cursors = session[session_key]['question_cursors']
+        learning_sequence.question_cursors = {k: list(v) for k, v in cursors.items()}
+
+    # Sessions written before mastery tracking start from the prior estimates
+    mastery = session[session_key].get('mastery')
+    if MASTERY_MODEL.fits(mastery):
+        learning_sequence.mastery = list(mastery)
+
+    answered = session[session_key].get('answered_tokens')
+    if answered:
+        learning_sequence.answered_tokens = [answered[0], list(answered[1])]
     
     return learning_sequence
 
@@ -60,15 +74,27 @@ def get_student_profile() -> StudentProfile:
     if 'student_profile' not in session:
         # Create new profile
         profile = StudentProfile()
-        session['student_profile'] = profile.to_dict()
+        session['student_profile'] = profile.to_bytes()
         return profile
     else:
-        # Load existing profile
-        return StudentProfile.from_dict(session['student_profile'])
+        # Load existing profile; recent question history comes from the attempt log
+        stored = session['student_profile']
+        if isinstance(stored, dict):
+            # Sessions written before the binary encoding
+            profile = StudentProfile.from_dict(stored)
+        else:
+            try:
+                profile = StudentProfile.from_bytes(stored)
+            except ProfileDecodeError:
+                profile = StudentProfile()
+        user_id = session.get('user_id')
+        if user_id and profile.total_questions:
+            profile.question_history = get_attempt_log().recent(user_id, profile.total_questions)
+        return profile
 
 def save_student_profile(profile: StudentProfile):
     """Save student profile to session"""
-    session['student_profile'] = profile.to_dict()
+    session['student_profile'] = profile.to_bytes()
 
 def update_student_profile_with_question(question_data: dict, verification_result: dict, response_time: float = 0):
     """Update student profile with new question result - now topic-aware"""
@@ -98,6 +124,11 @@ def update_student_profile_with_question(question_data: dict, verification_resul
     profile.current_stage = f"{current_topic}_{current_stage}"
     profile.current_topic = current_topic  # NEW: Track current topic
     
+    # Persist the attempt itself; the session only keeps the counters
+    user_id = session.get('user_id')
+    if user_id:
+        get_attempt_log().append(user_id, profile.total_questions, result)
+    
     # Calculate session time
     time_diff = (datetime.now() - profile.session_start_time).total_seconds() / 60
     profile.total_time_spent_minutes = time_diff
@@ -172,13 +203,10 @@ def get_student_context_for_ai() -> dict:
     profile = get_student_profile()
     current_topic = session.get('current_topic', 'rounding')
     
-    # Filter performance data by current topic
-    topic_questions = [q for q in profile.question_history if getattr(q, 'topic', 'rounding') == current_topic]
-    
-    # Calculate topic-specific metrics
-    topic_total = len(topic_questions)
-    topic_correct = sum(1 for q in topic_questions if q.is_correct)
-    topic_success_rate = topic_correct / topic_total if topic_total > 0 else 0
+    # Topic-specific metrics from the profile's running counts
+    topic_performance = profile.get_topic_performance(current_topic)
+    topic_total = topic_performance["questions_attempted"]
+    topic_success_rate = topic_performance["success_rate"]
     
     return {
         "performance_summary": {
@@ -209,17 +237,16 @@ def get_student_context_for_ai() -> dict:
 def get_topic_progress(topic: str) -> dict:
     """Get progress summary for a specific topic"""
     profile = get_student_profile()
-    topic_questions = [q for q in profile.question_history if getattr(q, 'topic', 'rounding') == topic]
+    topic_performance = profile.get_topic_performance(topic)
     
-    if not topic_questions:
+    if not topic_performance["questions_attempted"]:
         return {"questions": 0, "correct": 0, "success_rate": 0.0}
     
-    correct_count = sum(1 for q in topic_questions if q.is_correct)
     return {
-        "questions": len(topic_questions),
-        "correct": correct_count,
-        "success_rate": correct_count / len(topic_questions),
-        "last_attempted": max(q.timestamp for q in topic_questions) if topic_questions else None
+        "questions": topic_performance["questions_attempted"],
+        "correct": topic_performance["questions_correct"],
+        "success_rate": topic_performance["success_rate"],
+        "last_attempted": topic_performance["last_activity"]
     }
 
 def switch_topic(new_topic: str):
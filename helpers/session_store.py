@@ -0,0 +1,416 @@
+"""Session interfaces: server-side storage with only the user id in the cookie, or a compact signed cookie."""
+import base64
+import dbm
+import hashlib
+import os
+import sqlite3
+import struct
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from flask.sessions import SecureCookieSession, SessionInterface, SessionMixin, session_json_serializer
+from itsdangerous import BadSignature, TimestampSigner, URLSafeTimedSerializer
+from werkzeug.datastructures import CallbackDict
+
+from helpers.instrumentation import span
+from helpers.session_codec import SessionDecodeError, decode_session, encode_session
+
+
+class MemorySessionStore:
+    """In-process LRU store. Fast, but private to one worker process."""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            payload = self._data.get(key)
+            if payload is not None:
+                self._data.move_to_end(key)
+            return payload
+
+    def set(self, key, payload):
+        with self._lock:
+            self._data[key] = payload
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def keys(self):
+        with self._lock:
+            return list(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteSessionStore:
+    """SQLite store shared by every worker process on the same host."""
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "key TEXT PRIMARY KEY, payload BLOB NOT NULL, updated_at REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._connect().execute(
+            "SELECT payload FROM sessions WHERE key = ?", (key,)
+        ).fetchone()
+        return bytes(row[0]) if row else None
+
+    def set(self, key, payload):
+        self._connect().execute(
+            "INSERT OR REPLACE INTO sessions (key, payload, updated_at) VALUES (?, ?, ?)",
+            (key, payload, time.time())
+        )
+
+    def delete(self, key):
+        self._connect().execute("DELETE FROM sessions WHERE key = ?", (key,))
+
+    def purge_older_than(self, max_age_seconds):
+        """Drop sessions that have not been written for ``max_age_seconds``."""
+        cursor = self._connect().execute(
+            "DELETE FROM sessions WHERE updated_at < ?", (time.time() - max_age_seconds,)
+        )
+        return cursor.rowcount
+
+
+class KeyValueSessionStore:
+    """Local dbm file standing in for an external key-value service such as Redis.
+
+    Each value is prefixed with the time it was written, so ``purge_older_than``
+    can sweep idle entries the way a TTL would expire them in Redis.
+    """
+
+    _STAMP = struct.Struct(">d")
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = dbm.open(path, "c")
+
+    def get(self, key):
+        with self._lock:
+            value = self._db.get(key.encode())
+        return bytes(value[self._STAMP.size:]) if value is not None else None
+
+    def set(self, key, payload):
+        value = self._STAMP.pack(time.time()) + payload
+        with self._lock:
+            self._db[key.encode()] = value
+
+    def delete(self, key):
+        with self._lock:
+            try:
+                del self._db[key.encode()]
+            except KeyError:
+                pass
+
+    def keys(self):
+        with self._lock:
+            return [key.decode() for key in self._db.keys()]
+
+    def purge_older_than(self, max_age_seconds):
+        """Drop entries that have not been written for ``max_age_seconds``."""
+        cutoff = time.time() - max_age_seconds
+        removed = 0
+        with self._lock:
+            for key in list(self._db.keys()):
+                value = self._db.get(key)
+                if value is not None and self._STAMP.unpack_from(value)[0] < cutoff:
+                    del self._db[key]
+                    removed += 1
+        return removed
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+def create_session_store(backend, path=None, max_entries=10000):
+    """Build the store named by ``backend`` ("memory", "sqlite" or "kv")."""
+    if backend == "memory":
+        return MemorySessionStore(max_entries=max_entries)
+    if backend == "sqlite":
+        return SQLiteSessionStore(path)
+    if backend == "kv":
+        return KeyValueSessionStore(path)
+    raise ValueError(f"Unknown session backend: {backend}")
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """Session dict whose contents live in a server-side store."""
+
+    def __init__(self, initial=None, sid=None, loaded_payload=None, has_cookie=False):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.loaded_payload = loaded_payload
+        self.has_cookie = has_cookie
+        self.modified = False
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """Keeps session data in a store and only a signed user id in the cookie.
+
+    The stored record is keyed by ``session['user_id']``. Each request compares
+    the serialized session with the bytes it loaded, so state that was merely
+    reassigned with identical values is not written back to the store.
+
+    Once the cookie's max age (PERMANENT_SESSION_LIFETIME) has passed, a record
+    can no longer be reached, so every PURGE_EVERY writes records idle for
+    longer are purged from stores that support it (SQLite and kv; the memory
+    store is bounded by its LRU instead).
+    """
+
+    serializer = session_json_serializer
+    salt = "server-side-session"
+    PURGE_EVERY = 1000
+
+    def __init__(self, store, key_ring=None):
+        self.store = store
+        self.key_ring = key_ring
+        self._signers = (None, None, None)
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+
+    def get_signing_serializer(self, app):
+        return self._get_signers(app)[0]
+
+    def _get_signers(self, app):
+        """(serializer verifying every active key, serializer for the newest key only)."""
+        secret_keys = self.key_ring.secrets() if self.key_ring is not None else (app.secret_key,)
+        if not secret_keys or not secret_keys[-1]:
+            return None, None
+        cached_keys, every_key, newest_key = self._signers
+        if cached_keys != secret_keys:
+            every_key = URLSafeTimedSerializer(list(secret_keys), salt=self.salt)
+            newest_key = URLSafeTimedSerializer(secret_keys[-1], salt=self.salt)
+            self._signers = (secret_keys, every_key, newest_key)
+        return every_key, newest_key
+
+    def open_session(self, app, request):
+        every_key, newest_key = self._get_signers(app)
+        if every_key is None:
+            return None
+
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if not cookie:
+            return ServerSideSession(sid=str(uuid.uuid4()))
+
+        max_age = int(app.permanent_session_lifetime.total_seconds())
+        current = True
+        try:
+            sid = newest_key.loads(cookie, max_age=max_age)
+        except BadSignature:
+            try:
+                sid = every_key.loads(cookie, max_age=max_age)
+            except BadSignature:
+                return ServerSideSession(sid=str(uuid.uuid4()))
+            # Signed with an older key: re-issue the cookie with the newest one
+            current = False
+
+        with span("session_load"):
+            payload = self.store.get(sid)
+            if payload is None:
+                return ServerSideSession({"user_id": sid}, sid=sid, has_cookie=current)
+
+            data = self.serializer.loads(payload.decode("utf-8"))
+        return ServerSideSession(data, sid=sid, loaded_payload=payload, has_cookie=current)
+
+    def refresh(self, session, key):
+        """
+        Re-read ``session`` from the store, e.g. after waiting for a per-user lock.
+
+        An unmodified session is replaced by the stored one. Once this request
+        has changed the session only ``key`` is refreshed, so its other changes
+        are kept.
+        """
+        if not isinstance(session, ServerSideSession):
+            return
+        store_key = session.get("user_id") or session.sid
+        payload = self.store.get(store_key)
+        if payload is None or payload == session.loaded_payload:
+            return
+        data = self.serializer.loads(payload.decode("utf-8"))
+        if not session.modified:
+            dict.clear(session)
+            dict.update(session, data)
+            session.loaded_payload = payload
+        elif key in data:
+            session[key] = data[key]
+        else:
+            session.pop(key, None)
+
+    def purge_expired(self, app):
+        """Drop records idle for longer than a session cookie stays valid."""
+        purge_older_than = getattr(self.store, "purge_older_than", None)
+        if purge_older_than is None:
+            return 0
+        return purge_older_than(app.permanent_session_lifetime.total_seconds())
+
+    def _count_write(self, app):
+        with self._writes_lock:
+            self._writes += 1
+            purge = self._writes % self.PURGE_EVERY == 0
+        if purge:
+            with span("session_purge"):
+                self.purge_expired(app)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.modified:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        key = session.get("user_id") or session.sid
+        if key != session.sid:
+            # The session was cleared and restarted under a new id.
+            self.store.delete(session.sid)
+            session.loaded_payload = None
+
+        with span("session_save"):
+            payload = self.serializer.dumps(dict(session)).encode("utf-8")
+            if payload != session.loaded_payload:
+                self.store.set(key, payload)
+                self._count_write(app)
+
+        if key == session.sid and session.has_cookie:
+            return
+
+        response.vary.add("Cookie")
+        response.set_cookie(
+            name,
+            self.get_signing_serializer(app).dumps(key),
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
+
+
+class CompactCookieSession(SecureCookieSession):
+    """Cookie session that remembers the encoded bytes it was loaded from."""
+
+    def __init__(self, initial=None, loaded_payload=None, current_key=False):
+        super().__init__(initial)
+        self.loaded_payload = loaded_payload
+        self.current_key = current_key
+
+
+class CompactCookieSessionInterface(SessionInterface):
+    """Whole session in the cookie, encoded by session_codec and signed with a KeyRing.
+
+    The session is re-encoded on every response, so changes to nested values
+    are picked up too, and the cookie is only sent when the encoded bytes
+    differ from what the request brought (or were signed with an older key).
+    """
+
+    salt = "compact-session"
+    session_class = CompactCookieSession
+
+    def __init__(self, key_ring):
+        self.key_ring = key_ring
+        self._signers = (None, None, None)
+
+    def _get_signers(self):
+        """(signer verifying every active key, signer for the newest key only)."""
+        secret_keys = self.key_ring.secrets()
+        cached_keys, every_key, newest_key = self._signers
+        if cached_keys != secret_keys:
+            every_key = TimestampSigner(list(secret_keys), salt=self.salt, digest_method=hashlib.sha1)
+            newest_key = TimestampSigner(secret_keys[-1], salt=self.salt, digest_method=hashlib.sha1)
+            self._signers = (secret_keys, every_key, newest_key)
+        return every_key, newest_key
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if not cookie:
+            return self.session_class()
+
+        every_key, newest_key = self._get_signers()
+        max_age = int(app.permanent_session_lifetime.total_seconds())
+        current_key = True
+        try:
+            encoded = newest_key.unsign(cookie, max_age=max_age)
+        except BadSignature:
+            try:
+                encoded = every_key.unsign(cookie, max_age=max_age)
+            except BadSignature:
+                return self.session_class()
+            current_key = False
+
+        with span("session_load"):
+            try:
+                payload = base64.urlsafe_b64decode(encoded + b"=" * (-len(encoded) % 4))
+                data = decode_session(payload)
+            except (ValueError, SessionDecodeError):
+                return self.session_class()
+        return self.session_class(data, loaded_payload=payload, current_key=current_key)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.modified or session.loaded_payload is not None:
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        if session.accessed:
+            response.vary.add("Cookie")
+
+        with span("session_save"):
+            payload = encode_session(dict(session))
+            refresh = session.permanent and app.config["SESSION_REFRESH_EACH_REQUEST"]
+            if payload == session.loaded_payload and session.current_key and not refresh:
+                return
+            value = self._get_signers()[1].sign(base64.urlsafe_b64encode(payload).rstrip(b"="))
+
+        response.set_cookie(
+            name,
+            value.decode("ascii"),
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+        )
@@ -0,0 +1,168 @@
+"""Worked examples for the rounding stages, serialized once into JSON bytes with ETags."""
+import hashlib
+import json
+
+# Worked examples by example set and number, in the shape the pages expect
+WORKED_EXAMPLES = {
+    "decimal1": {
+        1: {
+            "example_number": 1,
+            "question_text": "Round 12.632 to 1 decimal place",
+            "total_steps": 3,
+            "steps": [
+                {
+                    "step_number": 1,
+                    "image_content": {
+                        "display_text": "12.6|32",
+                        "annotation": "1st decimal place",
+                        "highlight_position": "after_6"
+                    },
+                    "text_content": "Identify the digit in the 1st decimal place. This is the first digit after the decimal point. We will call it the \"rounding digit\". Draw a \"cut off\" line after the rounding digit."
+                },
+                {
+                    "step_number": 2,
+                    "image_content": {
+                        "display_text": "12.6|32",
+                        "annotation": "Next digit is 3 (less than 5)",
+                        "highlight_position": "after_line"
+                    },
+                    "text_content": "Check the digit to the right of the \"cut off\" line. If this digit is less than 5 we keep our rounding digit the same."
+                },
+                {
+                    "step_number": 3,
+                    "image_content": {
+                        "display_text": "12.6",
+                        "annotation": "Final answer",
+                        "highlight_position": "complete"
+                    },
+                    "text_content": "Remove all digits after the \"cut off\" line. We have now rounded the number to 1 decimal place."
+                }
+            ],
+            "answer": "12.6"
+        },
+        2: {
+            "example_number": 2,
+            "question_text": "Round 12.682 to 1 decimal place",
+            "total_steps": 3,
+            "steps": [
+                {
+                    "step_number": 1,
+                    "image_content": {
+                        "display_text": "12.6|82",
+                        "annotation": "1st decimal place",
+                        "highlight_position": "after_6"
+                    },
+                    "text_content": "Identify the digit in the 1st decimal place. This is the first digit after the decimal point. We will call it the \"rounding digit\". Draw a \"cut off\" line after the rounding digit."
+                },
+                {
+                    "step_number": 2,
+                    "image_content": {
+                        "display_text": "12.6|82",
+                        "annotation": "Next digit is 8 (5 or greater)",
+                        "highlight_position": "after_line"
+                    },
+                    "text_content": "Check the digit to the right of the \"cut off\" line. If this digit is 5 or bigger we need to round up. We do this by adding 1 to the rounding digit."
+                },
+                {
+                    "step_number": 3,
+                    "image_content": {
+                        "display_text": "12.7",
+                        "annotation": "Final answer (6 became 7)",
+                        "highlight_position": "complete"
+                    },
+                    "text_content": "Remove all digits after the \"cut off\" line. We have now rounded the number to 1 decimal place. Notice that the 6 has changed to a 7 as we rounded up."
+                }
+            ],
+            "answer": "12.7"
+        }
+    },
+    "decimal2": {
+        1: {
+            'question_text': 'Round 12.632 to 2 decimal places',
+            'steps': [
+                {
+                    'explanation': 'Identify the digit in the 2nd decimal place. This is the second digit after the decimal point. We will call it the "rounding digit". Draw a "cut off" line after the rounding digit.',
+                    'image': '/static/images/stage2_1_step1.jpg'
+                },
+                {
+                    'explanation': 'Check the digit to the right of the "cut off" line. If this digit is less than 5 we keep our rounding digit the same.',
+                    'image': '/static/images/stage2_1_step2.jpg'
+                },
+                {
+                    'explanation': 'Remove all digits after the "cut off" line. We have now rounded the number to 2 decimal places.',
+                    'image': '/static/images/stage2_1_step3.jpg'
+                }
+            ],
+            'answer': '12.63'
+        },
+        2: {
+            'question_text': 'Round 12.678 to 3 decimal places',
+            'steps': [
+                {
+                    'explanation': 'Identify the digit in the 3rd decimal place. This is the third digit after the decimal point. We will call it the "rounding digit". Draw a "cut off" line after the rounding digit.',
+                    'image': '/static/images/stage2_2_step1.jpg'
+                },
+                {
+                    'explanation': 'Check the digit to the right of the "cut off" line. If this digit is 5 or bigger we need to round up. We do this by adding 1 to the rounding digit.',
+                    'image': '/static/images/stage2_2_step2.jpg'
+                },
+                {
+                    'explanation': 'Remove all digits after the "cut off" line. We have now rounded the number to 3 decimal places. Notice that the 7 has changed to an 8 as we rounded up.',
+                    'image': '/static/images/stage2_2_step3.jpg'
+                }
+            ],
+            'answer': '12.68'
+        }
+    }
+}
+
+
+class CompiledPayload:
+    """A JSON body ready to send, with its strong ETag."""
+
+    __slots__ = ("body", "etag")
+
+    def __init__(self, payload):
+        self.body = json.dumps(payload, separators=(",", ":"), sort_keys=True).encode("utf-8")
+        self.etag = hashlib.sha1(self.body).hexdigest()[:20]
+
+
+class CompiledExample:
+    """One worked example serialized whole and step by step."""
+
+    __slots__ = ("full", "steps")
+
+    def __init__(self, example_number, example):
+        self.full = CompiledPayload(example)
+        steps = example["steps"]
+        self.steps = tuple(
+            CompiledPayload({
+                "example_number": example_number,
+                "step": step,
+                "total_steps": example.get("total_steps", len(steps)),
+                "question_text": example["question_text"]
+            })
+            for step in steps
+        )
+
+
+class ExampleRegistry:
+    """Every worked example, compiled once at startup and then only read."""
+
+    def __init__(self, examples=WORKED_EXAMPLES):
+        self._examples = {
+            (example_set, number): CompiledExample(number, example)
+            for example_set, numbered in examples.items()
+            for number, example in numbered.items()
+        }
+
+    def example(self, example_set, number):
+        """Compiled example, or None if there is no such example."""
+        return self._examples.get((example_set, number))
+
+    def step(self, example_set, number, step_number):
+        """Compiled payload for one step (1-based), or None if out of range."""
+        compiled = self._examples.get((example_set, number))
+        if compiled is None or not 1 <= step_number <= len(compiled.steps):
+            return None
+        return compiled.steps[step_number - 1]
@@ -1,29 +1,29 @@
 """Controls the learning sequence and student progression."""
-from config import STAGES, ADVANCEMENT_CRITERIA, QUESTION_RULES
+import logging
+
+from models.mastery import MASTERY_MODEL, skills_for_question
+from models.question_catalog import new_cursor_seed
+from models.stage_graph import STAGE_GRAPH
+
+logger = logging.getLogger(__name__)
 
 class LearningSequence:
     """Controls the learning sequence and student progression."""
 
+    stage_graph = STAGE_GRAPH
+
     def __init__(self):
-        self.current_stage = STAGES["ROUNDING_1DP_NO_UP"]  # Start at stage 1.1
+        self.current_stage = self.stage_graph.initial  # Start at stage 1.1
         self.correct_answers = 0
         self.consecutive_correct = 0
         self.questions_attempted = 0
-        self.stage_results = {
-            STAGES["ROUNDING_1DP_NO_UP"]: {"attempted": 0, "correct": 0},
-            STAGES["ROUNDING_1DP_WITH_UP"]: {"attempted": 0, "correct": 0},
-            STAGES["ROUNDING_1DP_BOTH"]: {"attempted": 0, "correct": 0},
-            STAGES["ROUNDING_2DP"]: {"attempted": 0, "correct": 0}
-        }
+        self.stage_results = {stage: {"attempted": 0, "correct": 0} for stage in self.stage_graph.tracked_stages}
         self.showing_example = True  # Start with an example
         self.current_example = 1  # Start with the first example
-        self.used_questions = {  # Track questions already shown to student
-            STAGES["ROUNDING_1DP_NO_UP"]: set(),
-            STAGES["ROUNDING_1DP_WITH_UP"]: set(),
-            STAGES["ROUNDING_1DP_BOTH"]: set(),
-            STAGES["ROUNDING_2DP"]: set(),
-            STAGES["STRETCH"]: set()
-        }
+        self.question_cursors = {}  # stage -> [seed, offset] into the question catalog
+        self.mastery = MASTERY_MODEL.initial_state()  # per-skill estimates in basis points, SKILLS order
+        # issued_at of the newest question token answered, and the question ids answered under it
+        self.answered_tokens = [0, []]
 
     def get_current_stage(self):
         """Returns the current learning stage."""
@@ -31,11 +31,17 @@ class LearningSequence:
 
     def get_stage_rules(self):
         """Gets the rules for generating questions in the current stage."""
-        return QUESTION_RULES.get(self.current_stage, QUESTION_RULES[STAGES["ROUNDING_1DP_NO_UP"]])
+        return self.stage_graph.rules_for(self.current_stage)
 
-    def update_progress(self, is_correct):
-        """Updates student progress based on performance."""
+    def update_progress(self, is_correct, question=None):
+        """Updates student progress based on performance.
+
+        ``question`` is the answered question (number, decimal_places); when
+        given, the mastery estimates of the skills it exercises are updated.
+        """
         self.questions_attempted += 1
+        if question is not None:
+            MASTERY_MODEL.update(self.mastery, skills_for_question(question), is_correct)
         
         # Update stage-specific results
         if self.current_stage in self.stage_results:
@@ -49,43 +55,21 @@ class LearningSequence:
         else:
             self.consecutive_correct = 0
         
-        # Check for stage advancement criteria - keep existing stages
-        if self.current_stage == STAGES["ROUNDING_1DP_NO_UP"] and is_correct:
-            self.current_stage = STAGES["ROUNDING_1DP_WITH_UP"]  # Move to stage 1.2 after one correct
-            self.consecutive_correct = 0
-            self.showing_example = False
-        elif self.current_stage == STAGES["ROUNDING_1DP_WITH_UP"] and is_correct:
-            self.current_stage = STAGES["ROUNDING_1DP_BOTH"]  # Move to stage 1.3 after one correct
-            self.consecutive_correct = 0
-            self.showing_example = False
-        elif self.current_stage == STAGES["ROUNDING_1DP_BOTH"] and self.consecutive_correct >= 2:
-            # Move to 2dp examples instead of stretch or complete
-            self.current_stage = STAGES["ROUNDING_2DP"]
-            self.consecutive_correct = 0
-            self.showing_example = True  # Show examples for 2dp content
+        next_stage = self.stage_graph.next_stage(self.current_stage, is_correct, self.consecutive_correct,
+                                                 self.stage_results, self.mastery)
+        if next_stage is not None:
+            self.enter_stage(next_stage)
+
+    def enter_stage(self, stage):
+        """Move to ``stage``, starting on its worked examples if it has any."""
+        node = self.stage_graph.node(stage)
+        self.current_stage = stage
+        if node.terminal:
+            return
+        self.consecutive_correct = 0
+        self.showing_example = node.example_count > 0
+        if self.showing_example:
             self.current_example = 1  # Reset to first example
-        
-        # Add the new progression rule for stage 2.1 to 2.2
-        elif self.current_stage == STAGES["ROUNDING_2DP"] and self.consecutive_correct >= 2:
-            # Move to stage 2.2 after two consecutive correct answers
-            self.current_stage = STAGES["ROUNDING_2DP_STAGE_2"]
-            self.consecutive_correct = 0
-            self.showing_example = False
-        
-        # Add the new progression rule for stage 2.2 to stretch/complete
-        elif self.current_stage == STAGES["ROUNDING_2DP_STAGE_2"] and is_correct:
-            # Check if eligible for stretch content
-            total_attempted = sum(stage["attempted"] for stage in self.stage_results.values())
-            total_correct = sum(stage["correct"] for stage in self.stage_results.values())
-            
-            if total_attempted > 0 and (total_correct / total_attempted) >= 0.8:
-                self.current_stage = STAGES["STRETCH"]  # Move to stretch after 80% correct
-                self.consecutive_correct = 0
-                self.showing_example = True  # Show examples for stretch content
-                self.current_example = 1  # Reset to first example
-            else:
-                self.current_stage = STAGES["COMPLETE"]  # End lesson if not eligible for stretch
-
 
     def should_model_example(self):
         """Determines if we should show a model example."""
@@ -93,29 +77,23 @@ class LearningSequence:
 
     def next_example(self):
         """Advances to the next example or to practice questions."""
-        print(f"next_example called: current_stage={self.current_stage}, current_example={self.current_example}, showing_example={self.showing_example}")
+        logger.debug("next_example called: current_stage=%s, current_example=%s, showing_example=%s",
+                     self.current_stage, self.current_example, self.showing_example)
         
         self.current_example += 1
 
-        # Force "showing_example" to False when we've seen example 2 in stage 1.1
-        if self.current_stage == STAGES["ROUNDING_1DP_NO_UP"] and self.current_example > 2:
-            self.showing_example = False
-            print(" Forcing showing_example to False to move to practice questions")
-
-        # Safety check to prevent jumping from example 1 to 3
-        if self.current_stage == STAGES["ROUNDING_1DP_NO_UP"] and self.current_example > 2 and self.showing_example:
-            # Set to exactly 2 to force showing the second example
-            self.current_example = 2
-            print(" Safety check triggered, setting current_example to 2")
-
         # If we've shown all examples for this stage, move to questions
-        if ((self.current_stage == STAGES["ROUNDING_1DP_NO_UP"] and self.current_example > 2) or
-            (self.current_stage == STAGES["ROUNDING_2DP"] and self.current_example > 2) or
-            (self.current_stage == STAGES["STRETCH"] and self.current_example > 2)):
+        node = self.stage_graph.nodes.get(self.current_stage)
+        if node is not None and node.example_count and self.current_example > node.example_count:
             self.showing_example = False
-            print(" All examples shown, setting showing_example to False")
+            logger.debug("All examples shown, setting showing_example to False")
+
+        logger.debug("next_example returning: current_example=%s, showing_example=%s",
+                     self.current_example, self.showing_example)
 
-        print(f"next_example returning: current_example={self.current_example}, showing_example={self.showing_example}")
+    def page_endpoint(self):
+        """Endpoint of the page the student should be on."""
+        return self.stage_graph.node(self.current_stage).page_for(self.showing_example)
 
     def get_current_example_number(self):
         """Returns the current example number."""
@@ -125,23 +103,30 @@ class LearningSequence:
         """Returns whether we're currently showing an example."""
         return self.showing_example
 
-    def add_used_question(self, stage, question_idx):
-        """Mark a question as used for the current stage."""
-        if stage in self.used_questions:
-            self.used_questions[stage].add(question_idx)
-
-    def reset_used_questions(self, stage=None):
-        """Reset the used questions tracking."""
-        if stage:
-            if stage in self.used_questions:
-                self.used_questions[stage] = set()
+    def advance_question_cursor(self, stage):
+        """Return this stage's (seed, offset) draw cursor and move it on by one."""
+        cursor = self.question_cursors.get(stage)
+        if cursor is None:
+            cursor = self.question_cursors[stage] = [new_cursor_seed(), 0]
+        seed, offset = cursor
+        cursor[1] = offset + 1
+        return seed, offset
+
+    def consume_question_token(self, question_id, issued_at):
+        """
+        Record that a question token is being answered.
+
+        Returns False for a token issued before the newest one already
+        answered, or answered already, so one served question is graded once.
+        """
+        last_issued, question_ids = self.answered_tokens
+        if issued_at < last_issued or (issued_at == last_issued and question_id in question_ids):
+            return False
+        if issued_at > last_issued:
+            self.answered_tokens = [issued_at, [question_id]]
         else:
-            for key in self.used_questions:
-                self.used_questions[key] = set()
-
-    def get_used_questions(self, stage):
-        """Get the set of used question indices for a stage."""
-        return self.used_questions.get(stage, set())
+            question_ids.append(question_id)
+        return True
 
     def reset(self):
         """Resets the learning sequence."""
@@ -0,0 +1,109 @@
+"""Per-skill mastery estimates by Bayesian knowledge tracing.
+
+Each skill in config.SKILLS has a probability that the student has mastered
+it. An answer updates every skill the question exercises with the standard
+BKT step: Bayes' rule on the answer (allowing for slips and guesses), then the
+chance of having learned the skill on this attempt. That is a few float
+operations per skill, independent of how many questions came before.
+
+Estimates are kept as ints in basis points (0..10000), one per skill in
+SKILLS order, so the state stored in the session is a short list of small
+ints and an estimate read back from the session is exactly the one written.
+
+Parameters default to config.BKT_PARAMS; BKT_PARAMS_PATH points at a file
+fitted from the attempt log by scripts/fit_mastery.py.
+"""
+import json
+
+from config import BKT_PARAMS, BKT_PARAMS_PATH, SKILLS
+from models.rounding_kernel import analyze_text
+
+SCALE = 10000
+SKILL_INDEX = {skill: i for i, skill in enumerate(SKILLS)}
+PARAM_NAMES = ("p_init", "p_transit", "p_slip", "p_guess")
+
+
+def load_params(path, defaults=BKT_PARAMS):
+    """
+    Read fitted parameters from ``path`` over ``defaults``.
+
+    The file is {"skills": {skill: {"p_init": ..., "p_transit": ..., "p_slip": ...,
+    "p_guess": ...}}}; other keys (fit statistics) are ignored. Raises ValueError
+    for unknown skills or probabilities that cannot be BKT parameters.
+    """
+    with open(path, encoding="utf-8") as f:
+        fitted = json.load(f).get("skills", {})
+    params = {skill: dict(values) for skill, values in defaults.items()}
+    for skill, values in fitted.items():
+        if skill not in params:
+            raise ValueError(f"{path}: unknown skill {skill!r}")
+        for name in PARAM_NAMES:
+            value = values.get(name)
+            if not isinstance(value, (int, float)) or not 0 < value < 1:
+                raise ValueError(f"{path}: {skill}.{name} must be a probability strictly between 0 and 1")
+            params[skill][name] = float(value)
+        if params[skill]["p_slip"] + params[skill]["p_guess"] >= 1:
+            raise ValueError(f"{path}: {skill} has p_slip + p_guess >= 1, so a correct answer is not evidence")
+    return params
+
+
+class MasteryModel:
+    """BKT parameters for every skill, compiled for the per-answer update."""
+
+    def __init__(self, skills=SKILLS, params=BKT_PARAMS):
+        missing = [skill for skill in skills if skill not in params]
+        if missing:
+            raise ValueError(f"no BKT parameters for skills: {missing}")
+        self.skills = tuple(skills)
+        self.index = {skill: i for i, skill in enumerate(self.skills)}
+        # (p_transit, P(correct | mastered), P(correct | not), P(wrong | mastered), P(wrong | not))
+        self._steps = tuple(
+            (params[skill]["p_transit"], 1 - params[skill]["p_slip"], params[skill]["p_guess"],
+             params[skill]["p_slip"], 1 - params[skill]["p_guess"])
+            for skill in self.skills
+        )
+        self._initial = [round(params[skill]["p_init"] * SCALE) for skill in self.skills]
+
+    def initial_state(self):
+        """Fresh estimates for a new student."""
+        return list(self._initial)
+
+    def update(self, state, skill_indexes, is_correct):
+        """Apply one answer to ``state`` in place for the skills at ``skill_indexes``."""
+        for i in skill_indexes:
+            transit, right_known, right_unknown, wrong_known, wrong_unknown = self._steps[i]
+            known = state[i] / SCALE
+            if is_correct:
+                evidence = known * right_known
+                posterior = evidence / (evidence + (1 - known) * right_unknown)
+            else:
+                evidence = known * wrong_known
+                posterior = evidence / (evidence + (1 - known) * wrong_unknown)
+            state[i] = round((posterior + (1 - posterior) * transit) * SCALE)
+
+    def fits(self, state):
+        """Whether ``state`` is a list of estimates for these skills."""
+        return (isinstance(state, list) and len(state) == len(self.skills)
+                and all(type(value) is int and 0 <= value <= SCALE for value in state))
+
+
+def skills_for_question(question):
+    """Indexes into SKILLS of the skills a question exercises.
+
+    One decimal place questions practise rounding down or up; two and three
+    place questions the 2/3dp skill. Dropping more than one digit adds
+    multi-digit, and a round-up that carries through a 9 adds nines-carry.
+    """
+    facts = analyze_text(question["number"], question["decimal_places"])
+    if facts.places == 1:
+        skills = [SKILL_INDEX["1dp_up"] if facts.round_up else SKILL_INDEX["1dp_down"]]
+    else:
+        skills = [SKILL_INDEX["2_3dp"]]
+    if facts.scale - facts.places > 1:
+        skills.append(SKILL_INDEX["multi_digit"])
+    if facts.carry_digits:
+        skills.append(SKILL_INDEX["nines_carry"])
+    return skills
+
+
+MASTERY_MODEL = MasteryModel(params=load_params(BKT_PARAMS_PATH) if BKT_PARAMS_PATH else BKT_PARAMS)
@@ -0,0 +1,111 @@
+"""Vectorized misconception labelling over columns of answers.
+
+Reproduces, for whole arrays at once, the two labels the Verifier derives for a
+wrong answer:
+
+* ``student_action`` from ``Verifier._analyze_student_choice`` (exact
+  comparison with the correct and the truncated value)
+* ``type`` from ``Verifier._identify_misconception`` followed by
+  ``Verifier._categorize_misconception_type`` (string shape, then exact
+  comparison with the correct value)
+
+Numbers are passed as scaled integers, the same (scaled, scale) representation
+as models.rounding_kernel: ``12.64`` is ``(1264, 2)``. Values must fit in int64
+after aligning scales.
+"""
+import numpy as np
+
+ACTIONS = (
+    "correct_rounding",
+    "truncated_instead_of_rounded",
+    "rounded_down_when_should_round_up",
+    "rounded_up_when_should_round_down",
+)
+TYPES = (
+    "general_rounding_error",
+    "place_value_confusion",
+    "decimal_place_confusion",
+    "rounding_direction_confusion",
+)
+
+ACTION_CORRECT, ACTION_TRUNCATED, ACTION_ROUNDED_DOWN, ACTION_ROUNDED_UP = range(4)
+TYPE_GENERAL, TYPE_PLACE_VALUE, TYPE_DECIMAL_PLACE, TYPE_DIRECTION = range(4)
+
+_POWERS = 10 ** np.arange(19, dtype=np.int64)
+
+
+def parse_decimal_column(values):
+    """
+    Split decimal strings into (scaled int64, scale int8, has_point bool) arrays.
+
+    ``"13"`` and ``"13.0"`` differ only in ``has_point`` and scale, which the
+    whole-number check needs.
+    """
+    count = len(values)
+    scaled = np.empty(count, dtype=np.int64)
+    scales = np.empty(count, dtype=np.int8)
+    has_point = np.empty(count, dtype=bool)
+    for i, text in enumerate(values):
+        whole, point, fraction = text.partition(".")
+        scaled[i] = int(whole + fraction)
+        scales[i] = len(fraction)
+        has_point[i] = bool(point)
+    return scaled, scales, has_point
+
+
+def _compare_exact(a_scaled, a_scales, b_scaled, b_scales):
+    """Sign of a - b compared as exact decimals (-1, 0, 1)."""
+    common = np.maximum(a_scales, b_scales).astype(np.int64)
+    a = a_scaled * _POWERS[common - a_scales]
+    b = b_scaled * _POWERS[common - b_scales]
+    return np.sign(a - b)
+
+
+def classify(number_scaled, number_scales, decimal_places,
+             student_scaled, student_scales, student_has_point,
+             correct_scaled, correct_scales):
+    """
+    Label every answer in one vectorized pass.
+
+    Returns:
+        (action_codes, type_codes) int8 arrays indexing ACTIONS and TYPES
+    """
+    number_scaled = np.asarray(number_scaled, dtype=np.int64)
+    number_scales = np.asarray(number_scales, dtype=np.int64)
+    decimal_places = np.asarray(decimal_places, dtype=np.int64)
+    student_scaled = np.asarray(student_scaled, dtype=np.int64)
+    student_scales = np.asarray(student_scales, dtype=np.int64)
+    student_has_point = np.asarray(student_has_point, dtype=bool)
+    correct_scaled = np.asarray(correct_scaled, dtype=np.int64)
+    correct_scales = np.asarray(correct_scales, dtype=np.int64)
+
+    direction = _compare_exact(student_scaled, student_scales, correct_scaled, correct_scales)
+
+    # Truncated value: keep decimal_places digits when the number has more, else the number itself
+    has_more = number_scales > decimal_places
+    drop = np.where(has_more, number_scales - decimal_places, 0)
+    truncated_scaled = number_scaled // _POWERS[drop]
+    truncated_scales = np.where(has_more, decimal_places, number_scales)
+    is_truncated = _compare_exact(student_scaled, student_scales, truncated_scaled, truncated_scales) == 0
+
+    actions = np.where(direction < 0, ACTION_ROUNDED_DOWN, ACTION_ROUNDED_UP)
+    actions = np.where(is_truncated, ACTION_TRUNCATED, actions)
+    actions = np.where(direction == 0, ACTION_CORRECT, actions).astype(np.int8)
+
+    # Misconception type follows the order of the checks in _identify_misconception
+    types = np.full(len(actions), TYPE_GENERAL, dtype=np.int8)
+    types[direction > 0] = TYPE_DECIMAL_PLACE      # "rounded up when you shouldn't have"
+    types[direction < 0] = TYPE_DIRECTION          # "didn't round up when you should have"
+    types[student_scales != decimal_places] = TYPE_DECIMAL_PLACE
+    types[~student_has_point] = TYPE_PLACE_VALUE
+    return actions, types
+
+
+def classify_answers(numbers, decimal_places, student_values, correct_values):
+    """Convenience wrapper taking the strings stored with each attempt."""
+    number_scaled, number_scales, _ = parse_decimal_column(numbers)
+    student_scaled, student_scales, student_has_point = parse_decimal_column(student_values)
+    correct_scaled, correct_scales, _ = parse_decimal_column(correct_values)
+    return classify(number_scaled, number_scales, decimal_places,
+                    student_scaled, student_scales, student_has_point,
+                    correct_scaled, correct_scales)
@@ -0,0 +1,332 @@
+"""Compact, versioned binary encoding of StudentProfile for session storage.
+
+Layout (version 1)::
+
+    b"SP" version:u8
+    header: one fixed struct (see _HEADER) holding the counters, string
+        references for current_stage, current_topic, response_time_trend,
+        engagement_level and top_misconception, and the byte lengths of the
+        string table and of each section
+    string table: UTF-8, each string followed by NUL
+    sections: misconception_patterns, stage_performance, topic_performance, recent_results
+
+Stage names, topics and misconception types are written once in the string
+table and referenced by index (plus one; 0 is None) everywhere else. Reading a
+profile costs one struct unpack and one split; the sections are only decoded
+when the profile first touches the attribute, and sections that were never
+touched are copied through unchanged by the next encode.
+"""
+import json
+import struct
+from collections import deque
+from datetime import datetime
+
+from models.student_profile import RECENT_RESULTS_SIZE, StudentProfile
+
+MAGIC = b"SP"
+VERSION = 1
+SECTIONS = ("misconception_patterns", "stage_performance", "topic_performance", "recent_results")
+
+# total_questions, total_correct, consecutive_correct, consecutive_errors,
+# questions_this_session, recent_bits, recent_seen, flags, session_start_time,
+# total_time_spent_minutes, average_response_time, ewma_response_time, ewma_success_rate,
+# five string references, string table length, four section lengths
+_HEADER = struct.Struct("<IIIIIIBBddddd5HI4I")
+_PREFIX = len(MAGIC) + 1
+_DOUBLE = struct.Struct("<d")
+# Fixed-width records: (string reference, count) and (stage reference, attempted, correct)
+_COUNT = struct.Struct("<HI")
+_STAGE = struct.Struct("<HII")
+# One recent_results entry: is_correct, response time, misconception reference
+_RECENT = struct.Struct("<?dH")
+_FLAG_LEARNS_QUICKLY, _FLAG_PREFERS_ENCOURAGEMENT, _FLAG_RESPONDS_TO_CHALLENGES = 1, 2, 4
+# Keys of a topic_performance entry with a dedicated encoding; anything else goes into a JSON extra
+_TOPIC_KEYS = frozenset(("questions_attempted", "questions_correct", "current_stage", "last_activity",
+                         "stages_completed", "misconceptions", "recent_bits", "recent_seen"))
+
+
+class ProfileDecodeError(ValueError):
+    """Raised for bytes that are not a profile this codec can read."""
+
+
+class _Writer:
+    """Byte buffer plus the string table being built for one profile."""
+
+    __slots__ = ("buffer", "strings", "index")
+
+    def __init__(self, strings=()):
+        self.buffer = bytearray()
+        self.strings = list(strings)
+        self.index = {text: i for i, text in enumerate(self.strings)}
+
+    def varint(self, value):
+        while value > 0x7F:
+            self.buffer.append((value & 0x7F) | 0x80)
+            value >>= 7
+        self.buffer.append(value)
+
+    def reference(self, text):
+        """Index + 1 of ``text`` in the string table, adding it if needed; 0 for None."""
+        if text is None:
+            return 0
+        index = self.index.get(text)
+        if index is None:
+            if "\0" in text:
+                raise ValueError(f"profile strings cannot contain NUL: {text!r}")
+            index = self.index[text] = len(self.strings)
+            self.strings.append(text)
+        return index + 1
+
+    def string(self, text):
+        self.varint(self.reference(text))
+
+    def double(self, value):
+        self.buffer += _DOUBLE.pack(value)
+
+    def counts(self, mapping):
+        """Write a str -> non-negative int mapping."""
+        self.varint(len(mapping))
+        for key, value in mapping.items():
+            self.buffer += _COUNT.pack(self.reference(key), value)
+
+
+class _Reader:
+    """Cursor over encoded bytes, resolving string references against ``strings``."""
+
+    __slots__ = ("data", "pos", "strings")
+
+    def __init__(self, data, pos=0, strings=()):
+        self.data = data
+        self.pos = pos
+        self.strings = strings
+
+    def varint(self):
+        data = self.data
+        result = shift = 0
+        while True:
+            byte = data[self.pos]
+            self.pos += 1
+            result |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return result
+            shift += 7
+
+    def string(self):
+        index = self.varint()
+        return self.strings[index - 1] if index else None
+
+    def double(self):
+        value = _DOUBLE.unpack_from(self.data, self.pos)[0]
+        self.pos += 8
+        return value
+
+    def raw(self, length):
+        chunk = self.data[self.pos:self.pos + length]
+        self.pos += length
+        return chunk
+
+    def counts(self):
+        strings = self.strings
+        records = self.raw(self.varint() * _COUNT.size)
+        return {strings[index - 1]: count for index, count in _COUNT.iter_unpack(records)}
+
+
+def _timestamp(value):
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, str):
+        try:
+            return datetime.fromisoformat(value).timestamp()
+        except ValueError:
+            return None
+    return None
+
+
+# Section encoders / decoders
+
+def _encode_misconceptions(writer, patterns):
+    writer.counts(patterns)
+
+
+def _decode_misconceptions(reader):
+    return reader.counts()
+
+
+def _encode_stages(writer, stage_performance):
+    for stage, data in stage_performance.items():
+        writer.buffer += _STAGE.pack(writer.reference(stage), data.get("attempted", 0), data.get("correct", 0))
+
+
+def _decode_stages(reader):
+    strings = reader.strings
+    return {strings[index - 1]: {"attempted": attempted, "correct": correct}
+            for index, attempted, correct in _STAGE.iter_unpack(reader.data)}
+
+
+def _encode_topics(writer, topic_performance):
+    writer.varint(len(topic_performance))
+    for topic, data in topic_performance.items():
+        writer.string(topic)
+        writer.varint(data.get("questions_attempted", 0))
+        writer.varint(data.get("questions_correct", 0))
+        writer.string(data.get("current_stage"))
+        last_activity = _timestamp(data.get("last_activity"))
+        if last_activity is None:
+            writer.buffer.append(0)
+        else:
+            writer.buffer.append(1)
+            writer.double(last_activity)
+        stages_completed = data.get("stages_completed", ())
+        writer.varint(len(stages_completed))
+        for stage in sorted(stages_completed):
+            writer.string(stage)
+        writer.counts(data.get("misconceptions", {}))
+        writer.varint(data.get("recent_bits", 0))
+        writer.varint(data.get("recent_seen", 0))
+
+        extras = {key: value for key, value in data.items() if key not in _TOPIC_KEYS}
+        encoded = json.dumps(extras, default=str).encode("utf-8") if extras else b""
+        writer.varint(len(encoded))
+        writer.buffer += encoded
+
+
+def _decode_topics(reader):
+    topics = {}
+    for _ in range(reader.varint()):
+        topic = reader.string()
+        data = {
+            "questions_attempted": reader.varint(),
+            "questions_correct": reader.varint(),
+            "current_stage": reader.string()
+        }
+        data["last_activity"] = datetime.fromtimestamp(reader.double()) if reader.raw(1)[0] else None
+        data["stages_completed"] = {reader.string() for _ in range(reader.varint())}
+        data["misconceptions"] = reader.counts()
+        data["recent_bits"] = reader.varint()
+        data["recent_seen"] = reader.varint()
+        extras = reader.varint()
+        if extras:
+            data.update(json.loads(bytes(reader.raw(extras))))
+        topics[topic] = data
+    return topics
+
+
+def _encode_recent(writer, recent_results):
+    for is_correct, response_time, misconception in recent_results:
+        writer.buffer += _RECENT.pack(is_correct, response_time, writer.reference(misconception))
+
+
+def _decode_recent(reader):
+    strings = reader.strings
+    return deque(((is_correct, response_time, strings[index - 1] if index else None)
+                  for is_correct, response_time, index in _RECENT.iter_unpack(reader.data)),
+                 maxlen=RECENT_RESULTS_SIZE)
+
+
+_ENCODERS = (_encode_misconceptions, _encode_stages, _encode_topics, _encode_recent)
+_DECODERS = dict(zip(SECTIONS, (_decode_misconceptions, _decode_stages, _decode_topics, _decode_recent)))
+
+
+class PackedSections:
+    """Undecoded section bytes kept on a profile until an attribute is first read."""
+
+    __slots__ = ("spans", "strings")
+
+    def __init__(self, spans, strings):
+        self.spans = spans      # section name -> bytes
+        self.strings = strings
+
+    def decode(self, name):
+        return _DECODERS[name](_Reader(self.spans[name], 0, self.strings))
+
+
+def encode_profile(profile):
+    """Encode a StudentProfile to bytes."""
+    packed = profile.__dict__.get("_packed")
+    # Keep the old string table so untouched sections can be copied through as-is
+    writer = _Writer(packed.strings if packed is not None else ())
+
+    flags = ((_FLAG_LEARNS_QUICKLY if profile.learns_from_mistakes_quickly else 0) |
+             (_FLAG_PREFERS_ENCOURAGEMENT if profile.prefers_encouragement else 0) |
+             (_FLAG_RESPONDS_TO_CHALLENGES if profile.responds_to_challenges else 0))
+    bodies = []
+    for name, encode in zip(SECTIONS, _ENCODERS):
+        if packed is not None and name not in profile.__dict__:
+            bodies.append(packed.spans[name])
+            continue
+        encode(writer, getattr(profile, name))
+        bodies.append(bytes(writer.buffer))
+        writer.buffer.clear()
+
+    references = [writer.reference(text) for text in (
+        profile.current_stage, profile.current_topic, profile.response_time_trend,
+        profile.engagement_level, profile.top_misconception)]
+    table = "".join(text + "\0" for text in writer.strings).encode("utf-8")
+    header = _HEADER.pack(
+        profile.total_questions, profile.total_correct, profile.consecutive_correct,
+        profile.consecutive_errors, profile.questions_this_session, profile.recent_bits,
+        profile.recent_seen, flags, profile.session_start_time.timestamp(),
+        profile.total_time_spent_minutes, profile.average_response_time,
+        profile.ewma_response_time, profile.ewma_success_rate,
+        *references, len(table), *(len(body) for body in bodies)
+    )
+    return b"".join((MAGIC, bytes((VERSION,)), header, table, *bodies))
+
+
+def decode_profile(data):
+    """
+    Decode bytes from encode_profile into a StudentProfile.
+
+    Only the counters and the string table are read here; the sections are
+    attached as PackedSections and decoded lazily by the profile.
+    """
+    if len(data) < _PREFIX or data[:2] != MAGIC:
+        raise ProfileDecodeError("not an encoded student profile")
+    if data[2] != VERSION:
+        raise ProfileDecodeError(f"unsupported profile version {data[2]}")
+
+    try:
+        (total_questions, total_correct, consecutive_correct, consecutive_errors, questions_this_session,
+         recent_bits, recent_seen, flags, session_start, total_time, average_time, ewma_time, ewma_success,
+         *references, table_length, misconceptions_length, stages_length, topics_length,
+         recent_length) = _HEADER.unpack_from(data, _PREFIX)
+        pos = _PREFIX + _HEADER.size
+        strings = data[pos:pos + table_length].decode("utf-8").split("\0")[:-1]
+        pos += table_length
+        spans = {}
+        for name, length in zip(SECTIONS, (misconceptions_length, stages_length, topics_length, recent_length)):
+            spans[name] = data[pos:pos + length]
+            pos += length
+        if pos != len(data):
+            raise ProfileDecodeError("profile length does not match its header")
+        current_stage, current_topic, trend, engagement, top_misconception = (
+            strings[index - 1] if index else None for index in references)
+    except (IndexError, struct.error, UnicodeDecodeError) as e:
+        raise ProfileDecodeError(f"truncated or corrupt profile: {e}") from e
+
+    profile = StudentProfile.__new__(StudentProfile)
+    profile.__dict__.update(
+        total_questions=total_questions,
+        total_correct=total_correct,
+        consecutive_correct=consecutive_correct,
+        consecutive_errors=consecutive_errors,
+        current_stage=current_stage,
+        current_topic=current_topic,
+        question_history=[],
+        session_start_time=datetime.fromtimestamp(session_start),
+        total_time_spent_minutes=total_time,
+        questions_this_session=questions_this_session,
+        average_response_time=average_time,
+        response_time_trend=trend,
+        engagement_level=engagement,
+        learns_from_mistakes_quickly=bool(flags & _FLAG_LEARNS_QUICKLY),
+        prefers_encouragement=bool(flags & _FLAG_PREFERS_ENCOURAGEMENT),
+        responds_to_challenges=bool(flags & _FLAG_RESPONDS_TO_CHALLENGES),
+        recent_bits=recent_bits,
+        recent_seen=recent_seen,
+        ewma_response_time=ewma_time,
+        ewma_success_rate=ewma_success,
+        top_misconception=top_misconception,
+        _packed=PackedSections(spans, strings)
+    )
+    return profile
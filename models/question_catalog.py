@@ -0,0 +1,139 @@
+"""Precomputed per-stage question catalog with constant-size per-student draw cursors."""
+import random
+from array import array
+from math import gcd
+
+from config import QUESTION_CATALOG_SIZE, QUESTION_CATALOG_SEED
+
+# Mixes the pass number into the cursor seed so every pass uses a new permutation
+_PASS_MIX = 0x9E3779B1
+
+
+class StageCatalog:
+    """Questions for one stage, stored column-wise in compact arrays."""
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.values = array("q")       # number scaled by 10 ** length
+        self.lengths = array("B")      # digits after the decimal point
+        self.places = array("B")       # decimal places to round to
+        self.answers = array("q")      # answer scaled by 10 ** places
+        self.target_digits = array("B")
+        self.right_digits = array("B")
+        self.distractors = []          # three strings per question, flattened
+        self.multipliers = ()
+
+    def __len__(self):
+        return len(self.values)
+
+    def add(self, question, distractors):
+        whole, fraction = question["number"].split(".")
+        places = question["decimal_places"]
+        answer_whole, answer_fraction = question["answer"].split(".")
+        self.values.append(int(whole + fraction))
+        self.lengths.append(len(fraction))
+        self.places.append(places)
+        self.answers.append(int(answer_whole + answer_fraction))
+        self.target_digits.append(int(fraction[places - 1]))
+        self.right_digits.append(int(fraction[places]))
+        self.distractors.extend(distractors[:3])
+
+    def seal(self):
+        """Finish building: precompute the multipliers usable for affine permutations."""
+        size = len(self)
+        self.multipliers = tuple(a for a in range(1, max(size, 2)) if gcd(a, size) == 1) or (1,)
+
+    def number(self, index):
+        scale = 10 ** self.lengths[index]
+        value = self.values[index]
+        return f"{value // scale}.{value % scale:0{self.lengths[index]}d}"
+
+    def question(self, index):
+        """Materialize the question dict used by the rest of the app."""
+        places = self.places[index]
+        scale = 10 ** places
+        answer = self.answers[index]
+        return {
+            "number": self.number(index),
+            "decimal_places": places,
+            "answer": f"{answer // scale}.{answer % scale:0{places}d}",
+            "rounding_up": self.right_digits[index] >= 5,
+            "question_id": f"{self.stage}:{index}"
+        }
+
+    def distractors_for(self, index):
+        start = index * 3
+        return self.distractors[start:start + 3]
+
+    def verification_steps(self, index):
+        """Same shape as Verifier._get_verification_steps, from the stored digits."""
+        question = self.question(index)
+        round_up = question["rounding_up"]
+        return {
+            "original_number": question["number"],
+            "decimal_places": question["decimal_places"],
+            "target_digit": str(self.target_digits[index]),
+            "right_digit": str(self.right_digits[index]),
+            "round_up": round_up,
+            "round_up_text": "round up" if round_up else "keep the same",
+            "correct_answer": question["answer"]
+        }
+
+    def draw(self, seed, offset):
+        """
+        Map a cursor to a catalog index.
+
+        Each pass over the catalog is an affine permutation ``(a * i + b) % size``
+        chosen from the seed and pass number, so a student sees every question
+        once per pass without any per-question state.
+        """
+        size = len(self)
+        rounds, position = divmod(offset, size)
+        key = (seed + rounds * _PASS_MIX) & 0xFFFFFFFF
+        multiplier = self.multipliers[key % len(self.multipliers)]
+        return (multiplier * position + (key >> 8)) % size
+
+
+class QuestionCatalog:
+    """Question catalogs for every stage, built once at startup from a fixed seed."""
+
+    def __init__(self, engine, distractor_fn, size=QUESTION_CATALOG_SIZE, seed=QUESTION_CATALOG_SEED):
+        self.stages = {}
+        for stage in engine.plans:
+            catalog = StageCatalog(stage)
+            seen = set()
+            stream = engine.stream(stage, f"{seed}:{stage}")
+            # Small stages (e.g. 1.1) have fewer distinct numbers than ``size``
+            for _ in range(size * 20):
+                question = next(stream)
+                key = (question["number"], question["decimal_places"])
+                if key in seen:
+                    continue
+                seen.add(key)
+                catalog.add(question, distractor_fn(question))
+                if len(catalog) >= size:
+                    break
+            catalog.seal()
+            self.stages[stage] = catalog
+
+    def __contains__(self, stage):
+        return stage in self.stages
+
+    def next_question(self, stage, learning_sequence):
+        """Draw the student's next question for ``stage`` in O(1)."""
+        catalog = self.stages[stage]
+        seed, offset = learning_sequence.advance_question_cursor(stage)
+        return catalog.question(catalog.draw(seed, offset))
+
+    def lookup(self, question_id):
+        """Return (stage catalog, index) for a ``question_id``, or (None, None)."""
+        stage, _, index = str(question_id).rpartition(":")
+        catalog = self.stages.get(stage)
+        if catalog is None or not index.isdigit() or int(index) >= len(catalog):
+            return None, None
+        return catalog, int(index)
+
+
+def new_cursor_seed():
+    """Random seed for a fresh per-student cursor."""
+    return random.getrandbits(31)
@@ -0,0 +1,105 @@
+"""Rule-driven generator producing an unbounded, seeded stream of rounding questions."""
+import random
+from config import QUESTION_RULES
+from models.rounding_kernel import format_fixed, round_half_up
+
+# Largest whole-number part used in questions
+MAX_WHOLE = 100
+
+
+def _as_list(value, default):
+    if value is None:
+        return [default]
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+
+class StagePlan:
+    """Pre-computed digit choices for one QUESTION_RULES entry."""
+
+    __slots__ = ("shapes", "right_digits", "target_digits")
+
+    def __init__(self, rules):
+        places = _as_list(rules.get("decimal_places"), 1)
+        lengths = _as_list(rules.get("digits_after_decimal"), 2)
+        # Every (decimal places, digits after the point) pair where there is a digit to round away
+        self.shapes = [(dp, length) for dp in places for length in lengths if length > dp]
+        if not self.shapes:
+            self.shapes = [(dp, dp + 1) for dp in places]
+
+        if rules.get("must_have_nines"):
+            # A 9 in the rounding position that has to carry
+            self.target_digits = (9,)
+            self.right_digits = (5, 6, 7, 8, 9)
+        else:
+            self.target_digits = tuple(range(9)) if rules.get("avoid_rounding_nines") else tuple(range(10))
+            if rules.get("avoid_rounding_up"):
+                self.right_digits = (0, 1, 2, 3, 4)
+            elif rules.get("must_round_up"):
+                self.right_digits = (5, 6, 7, 8, 9)
+            else:
+                self.right_digits = tuple(range(10))
+
+
+class QuestionEngine:
+    """Builds questions from QUESTION_RULES using integer digit arithmetic."""
+
+    def __init__(self, rules=QUESTION_RULES):
+        self.rules = rules
+        self.plans = {stage: StagePlan(stage_rules) for stage, stage_rules in rules.items()}
+
+    def plan_for(self, stage_rules):
+        """Find the plan for a rules dict, building one for rules not in QUESTION_RULES."""
+        for stage, rules in self.rules.items():
+            if rules is stage_rules:
+                return self.plans[stage]
+        return StagePlan(stage_rules)
+
+    def generate(self, stage, rng=random):
+        """Generate one question for ``stage`` using ``rng``."""
+        return self.build(self.plans[stage], rng.random)
+
+    def stream(self, stage, seed):
+        """Yield an endless, reproducible sequence of questions for ``stage``."""
+        plan = self.plans[stage]
+        rand = random.Random(seed).random
+        build = self.build
+        while True:
+            yield build(plan, rand)
+
+    @staticmethod
+    def build(plan, rand):
+        """
+        Assemble a question from random digits.
+
+        The fraction is built as an integer: leading digits, the rounding (target)
+        digit, the digit to its right, then a tail whose last digit is never 0 so
+        the written number keeps its full length.
+        """
+        shapes = plan.shapes
+        decimal_places, length = shapes[int(rand() * len(shapes))]
+        target_digits = plan.target_digits
+        right_digits = plan.right_digits
+        target = target_digits[int(rand() * len(target_digits))]
+        right = right_digits[int(rand() * len(right_digits))]
+
+        tail_length = length - decimal_places - 1
+        if tail_length:
+            tail = int(rand() * 10 ** (tail_length - 1)) * 10 + 1 + int(rand() * 9)
+        elif right == 0:
+            # The deciding digit is also the last digit, so it cannot be 0
+            right = right_digits[1 + int(rand() * (len(right_digits) - 1))]
+            tail = 0
+        else:
+            tail = 0
+
+        lead = int(rand() * 10 ** (decimal_places - 1))
+        whole = int(rand() * MAX_WHOLE)
+        fraction = ((lead * 10 + target) * 10 + right) * 10 ** tail_length + tail
+        value = whole * 10 ** length + fraction
+
+        return {
+            "number": format_fixed(value, length),
+            "decimal_places": decimal_places,
+            "answer": format_fixed(round_half_up(value, length, decimal_places), decimal_places),
+            "rounding_up": right >= 5
+        }
@@ -0,0 +1,94 @@
+"""Exact fixed-point rounding facts shared by the generator, verifier and content service.
+
+A decimal is held as ``(scaled, scale)``: ``12.64`` is ``(1264, 2)`` and a whole
+number like ``13`` is ``(13, 0)``. All arithmetic is on Python ints, so results
+match ``Decimal`` exactly without its parsing and context overhead.
+"""
+from typing import NamedTuple
+
+_POWERS = tuple(10 ** n for n in range(40))
+
+
+class RoundingFacts(NamedTuple):
+    """Everything needed to explain rounding one number to ``places`` decimal places."""
+    scaled: int          # the number, scaled by 10 ** scale
+    scale: int
+    places: int
+    target_digit: int    # digit in the rounding position
+    right_digit: int     # digit immediately to its right (0 if there is none)
+    round_up: bool       # right_digit >= 5
+    rounded: int         # round half up, scaled by 10 ** places
+    truncated: int       # digits after ``places`` dropped
+    ceiling: int         # rounded away from zero whenever any dropped digit is non-zero
+    carry_digits: int    # nines the round-up carries through (0 when not rounding up)
+
+
+def parse(text):
+    """Parse a non-negative decimal string into (scaled, scale)."""
+    whole, _, fraction = text.partition(".")
+    return int((whole or "0") + fraction), len(fraction)
+
+
+def format_fixed(scaled, scale):
+    """Format (scaled, scale) with exactly ``scale`` decimal places."""
+    digits = str(scaled)
+    if scale == 0:
+        return digits
+    if len(digits) <= scale:
+        digits = digits.rjust(scale + 1, "0")
+    return digits[:-scale] + "." + digits[-scale:]
+
+
+def rescale(scaled, scale, places):
+    """Express (scaled, scale) at ``places`` decimal places, truncating extra digits."""
+    if places >= scale:
+        return scaled * _POWERS[places - scale]
+    return scaled // _POWERS[scale - places]
+
+
+def compare(a, b):
+    """Compare two (scaled, scale) values exactly; returns -1, 0 or 1."""
+    common = max(a[1], b[1])
+    left = a[0] * _POWERS[common - a[1]]
+    right = b[0] * _POWERS[common - b[1]]
+    return (left > right) - (left < right)
+
+
+def round_half_up(scaled, scale, places):
+    """Round (scaled, scale) half up to ``places``; returns the value scaled by 10 ** places."""
+    if places >= scale:
+        return scaled * _POWERS[places - scale]
+    kept, dropped = divmod(scaled, _POWERS[scale - places])
+    return kept + (dropped * 2 >= _POWERS[scale - places])
+
+
+def analyze(scaled, scale, places, _new=tuple.__new__):
+    """Compute every rounding fact for (scaled, scale) at ``places`` in one pass."""
+    if places >= scale:
+        kept = scaled * _POWERS[places - scale]
+        return _new(RoundingFacts, (scaled, scale, places, kept % 10, 0, False, kept, kept, kept, 0))
+
+    unit = _POWERS[scale - places]
+    kept, dropped = divmod(scaled, unit)
+    right = dropped * 10 // unit
+    target = kept % 10
+    round_up = right >= 5
+
+    carry = 0
+    if round_up and target == 9:
+        remaining = kept
+        while remaining % 10 == 9:
+            carry += 1
+            remaining //= 10
+
+    # Built with tuple.__new__ to skip the keyword handling of the generated constructor
+    return _new(RoundingFacts, (
+        scaled, scale, places, target, right, round_up,
+        kept + round_up, kept, kept + (dropped > 0), carry
+    ))
+
+
+def analyze_text(text, places):
+    """``analyze`` for a decimal string."""
+    whole, _, fraction = text.partition(".")
+    return analyze(int((whole or "0") + fraction), len(fraction), places)
@@ -0,0 +1,189 @@
+"""Stage graph compiled once from config: states, advancement rules, example counts and pages.
+
+Every stage becomes a StageNode holding everything the request path needs,
+so an answer, an example step or a page lookup is a dict lookup plus a
+comparison. The graph is checked when it is built: unknown stages, missing
+question rules or pages, unreachable stages and stages that can never finish
+raise StageGraphError at import time rather than on some student's request.
+
+In "mastery" mode a stage with STAGE_SKILLS is left once every one of its
+skills is estimated mastered (models/mastery.py) instead of by its answer
+counts; min_accuracy still picks between next and otherwise.
+"""
+import re
+
+from config import (ADVANCEMENT_CRITERIA, ADVANCEMENT_MODE, MASTERY_THRESHOLD, QUESTION_RULES, SKILLS, STAGES,
+                    STAGE_PAGES, STAGE_SKILLS, TRACKED_STAGES)
+from models.mastery import SCALE
+
+_EXAMPLE_KEY = re.compile(r"example\d+$")
+ADVANCEMENT_MODES = ("counters", "mastery")
+
+
+class StageGraphError(ValueError):
+    """Raised when the configured stages do not form a valid lesson."""
+
+
+class StageNode:
+    """One stage and what happens in it."""
+
+    __slots__ = ("stage", "rules", "example_count", "examples_page", "page", "tracked",
+                 "correct_required", "streak_required", "min_accuracy", "next", "otherwise", "terminal",
+                 "skills")
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.rules = None
+        self.example_count = 0
+        self.examples_page = None
+        self.page = None
+        self.tracked = False
+        self.correct_required = 0
+        self.streak_required = 0
+        self.min_accuracy = None
+        self.next = None
+        self.otherwise = None
+        self.terminal = False
+        self.skills = ()  # indexes into SKILLS
+
+    def page_for(self, showing_example):
+        """Endpoint of the page a student in this stage belongs on."""
+        return self.examples_page if showing_example and self.examples_page else self.page
+
+
+class StageGraph:
+    """Compiled lesson: nodes by stage name plus the start and end stages."""
+
+    def __init__(self, nodes, initial, fallback_rules, mode="counters", mastery_threshold=MASTERY_THRESHOLD):
+        self.nodes = nodes
+        self.initial = initial
+        self.fallback_rules = fallback_rules
+        self.mode = mode
+        self.mastery_threshold = round(mastery_threshold * SCALE)
+        self.tracked_stages = tuple(stage for stage, node in nodes.items() if node.tracked)
+
+    def node(self, stage):
+        return self.nodes[stage]
+
+    def rules_for(self, stage):
+        """Question rules for ``stage`` (the first stage's for stages without questions)."""
+        node = self.nodes.get(stage)
+        return node.rules if node is not None and node.rules is not None else self.fallback_rules
+
+    def next_stage(self, stage, is_correct, consecutive_correct, stage_results, mastery=None):
+        """
+        Stage to move to after an answer, or None to stay.
+
+        Args:
+            stage: Stage the answer was given in
+            is_correct: Whether it was correct
+            consecutive_correct: Streak including this answer
+            stage_results: LearningSequence.stage_results, already updated
+            mastery: LearningSequence.mastery, already updated (used in mastery mode)
+        """
+        node = self.nodes.get(stage)
+        if node is None or node.next is None or not is_correct:
+            return None
+        if self.mode == "mastery" and node.skills and mastery is not None:
+            threshold = self.mastery_threshold
+            if any(mastery[i] < threshold for i in node.skills):
+                return None
+        elif consecutive_correct < node.streak_required:
+            return None
+        elif node.correct_required > 1 and stage_results[stage]["correct"] < node.correct_required:
+            return None
+        if node.min_accuracy is None:
+            return node.next
+        attempted = sum(results["attempted"] for results in stage_results.values())
+        correct = sum(results["correct"] for results in stage_results.values())
+        return node.next if attempted > 0 and correct / attempted >= node.min_accuracy else node.otherwise
+
+    def check_endpoints(self, endpoints):
+        """Raise StageGraphError if a page names an endpoint not in ``endpoints`` (e.g. app.view_functions)."""
+        for node in self.nodes.values():
+            for endpoint in (node.page, node.examples_page):
+                if endpoint is not None and endpoint not in endpoints:
+                    raise StageGraphError(f"stage {node.stage!r} names unknown page endpoint {endpoint!r}")
+
+
+def build_stage_graph(stages=STAGES, criteria=ADVANCEMENT_CRITERIA, rules=QUESTION_RULES,
+                      pages=STAGE_PAGES, tracked=TRACKED_STAGES, stage_skills=STAGE_SKILLS,
+                      mode=ADVANCEMENT_MODE, mastery_threshold=MASTERY_THRESHOLD):
+    """Compile and validate the stage graph; raises StageGraphError on an inconsistent config."""
+    if mode not in ADVANCEMENT_MODES:
+        raise StageGraphError(f"unknown advancement mode {mode!r}; expected one of {ADVANCEMENT_MODES}")
+    if not 0 < mastery_threshold < 1:
+        raise StageGraphError(f"mastery threshold must be between 0 and 1, got {mastery_threshold}")
+    order = list(stages.values())
+    if not order:
+        raise StageGraphError("no stages configured")
+    nodes = {stage: StageNode(stage) for stage in order}
+
+    for name, table in (("ADVANCEMENT_CRITERIA", criteria), ("QUESTION_RULES", rules),
+                        ("STAGE_PAGES", pages), ("TRACKED_STAGES", tracked), ("STAGE_SKILLS", stage_skills)):
+        unknown = [stage for stage in table if stage not in nodes]
+        if unknown:
+            raise StageGraphError(f"{name} names unknown stages: {unknown}")
+
+    for stage, node in nodes.items():
+        node.rules = rules.get(stage)
+        if node.rules is not None:
+            node.example_count = sum(1 for key in node.rules if _EXAMPLE_KEY.match(key))
+        node.tracked = stage in tracked
+        unknown = [skill for skill in stage_skills.get(stage, ()) if skill not in SKILLS]
+        if unknown:
+            raise StageGraphError(f"stage {stage!r} names unknown skills: {unknown}")
+        node.skills = tuple(SKILLS.index(skill) for skill in stage_skills.get(stage, ()))
+        stage_pages = pages.get(stage, {})
+        node.page = stage_pages.get("page")
+        node.examples_page = stage_pages.get("examples")
+        if node.page is None:
+            raise StageGraphError(f"stage {stage!r} has no page in STAGE_PAGES")
+        if node.example_count and node.examples_page is None:
+            raise StageGraphError(f"stage {stage!r} has worked examples but no examples page")
+        if node.examples_page is not None and not node.example_count:
+            raise StageGraphError(f"stage {stage!r} has an examples page but no exampleN question rules")
+
+        rule = criteria.get(stage)
+        if rule is None:
+            node.terminal = node.rules is None
+            continue
+        if node.rules is None:
+            raise StageGraphError(f"stage {stage!r} has advancement criteria but no questions")
+        node.correct_required = rule.get("correct_required", 0)
+        node.streak_required = rule.get("consecutive_correct_required", 0)
+        if not node.correct_required and not node.streak_required:
+            raise StageGraphError(f"stage {stage!r} needs correct_required or consecutive_correct_required")
+        if node.correct_required > 1 and not node.tracked:
+            raise StageGraphError(f"stage {stage!r} counts correct answers but is not in TRACKED_STAGES")
+        node.min_accuracy = rule.get("min_accuracy")
+        node.next = rule.get("next")
+        node.otherwise = rule.get("otherwise")
+        for target in (node.next, node.otherwise):
+            if target is not None and target not in nodes:
+                raise StageGraphError(f"stage {stage!r} advances to unknown stage {target!r}")
+        if node.next is None:
+            raise StageGraphError(f"stage {stage!r} has advancement criteria but no next stage")
+        if (node.min_accuracy is None) != (node.otherwise is None):
+            raise StageGraphError(f"stage {stage!r} needs both min_accuracy and otherwise, or neither")
+
+    initial = order[0]
+    if nodes[initial].rules is None:
+        raise StageGraphError(f"first stage {initial!r} has no question rules")
+    reachable, frontier = {initial}, [initial]
+    while frontier:
+        node = nodes[frontier.pop()]
+        for target in (node.next, node.otherwise):
+            if target is not None and target not in reachable:
+                reachable.add(target)
+                frontier.append(target)
+    unreachable = [stage for stage in order if stage not in reachable]
+    if unreachable:
+        raise StageGraphError(f"stages unreachable from {initial!r}: {unreachable}")
+    if not any(nodes[stage].terminal for stage in reachable):
+        raise StageGraphError("no reachable stage ends the lesson")
+
+    return StageGraph(nodes, initial, nodes[initial].rules, mode, mastery_threshold)
+
+
+STAGE_GRAPH = build_stage_graph()
@@ -6,8 +6,25 @@ File: models/student_profile.py
 from typing import Dict, List, Any, Optional
 from dataclasses import dataclass, field
 from datetime import datetime
+from collections import deque
+from itertools import islice
 import json
 
+# Outcomes kept per topic as a bitmask (newest in bit 0) for recent-window checks
+RECENT_BITS = 32
+RECENT_MASK = (1 << RECENT_BITS) - 1
+# (is_correct, response time, misconception) of the latest attempts across topics
+RECENT_RESULTS_SIZE = 20
+# Weight of the newest attempt in the exponentially weighted averages
+EWMA_ALPHA = 0.3
+
+
+def _recent_correct(bits: int, seen: int, n: int) -> tuple:
+    """(attempts, correct) among the last ``n`` outcomes packed in ``bits``"""
+    n = min(n, seen, RECENT_BITS)
+    return n, (bits & ((1 << n) - 1)).bit_count()
+
+
 @dataclass
 class QuestionResult:
     """Individual question result for tracking"""
@@ -56,6 +73,23 @@ class StudentProfile:
     prefers_encouragement: bool = True
     responds_to_challenges: bool = False
     
+    # Incremental aggregates so derived properties never rescan question_history
+    recent_results: deque = field(default_factory=lambda: deque(maxlen=RECENT_RESULTS_SIZE))
+    recent_bits: int = 0  # overall outcomes, newest in bit 0
+    recent_seen: int = 0  # outcomes recorded in recent_bits, capped at RECENT_BITS
+    ewma_response_time: float = 0
+    ewma_success_rate: float = 0
+    top_misconception: Optional[str] = None
+    
+    def __getattr__(self, name: str):
+        """Decode a section left packed by from_bytes on first access"""
+        packed = self.__dict__.get("_packed")
+        if packed is None or name not in packed.spans:
+            raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+        value = packed.decode(name)
+        setattr(self, name, value)
+        return value
+    
     def add_question_result(self, result: QuestionResult):
         """Add a new question result and update all metrics"""
         
@@ -79,6 +113,19 @@ class StudentProfile:
             if result.misconception_type not in self.misconception_patterns:
                 self.misconception_patterns[result.misconception_type] = 0
             self.misconception_patterns[result.misconception_type] += 1
+            count = self.misconception_patterns[result.misconception_type]
+            if (self.top_misconception is None or
+                    count > self.misconception_patterns.get(self.top_misconception, 0)):
+                self.top_misconception = result.misconception_type
+        
+        # Rolling windows and weighted success rate
+        self.recent_results.append((result.is_correct, result.response_time_seconds, result.misconception_type))
+        self.recent_bits = ((self.recent_bits << 1) | result.is_correct) & RECENT_MASK
+        self.recent_seen = min(self.recent_seen + 1, RECENT_BITS)
+        if self.total_questions == 1:
+            self.ewma_success_rate = float(result.is_correct)
+        else:
+            self.ewma_success_rate += EWMA_ALPHA * (result.is_correct - self.ewma_success_rate)
             
         # Update stage performance
         if result.stage not in self.stage_performance:
@@ -95,13 +142,17 @@ class StudentProfile:
                 "current_stage": result.stage,
                 "last_activity": result.timestamp,
                 "stages_completed": set(),
-                "misconceptions": {}
+                "misconceptions": {},
+                "recent_bits": 0,
+                "recent_seen": 0
             }
         
         topic_data = self.topic_performance[result.topic]
         topic_data["questions_attempted"] += 1
         if result.is_correct:
             topic_data["questions_correct"] += 1
+        topic_data["recent_bits"] = ((topic_data.get("recent_bits", 0) << 1) | result.is_correct) & RECENT_MASK
+        topic_data["recent_seen"] = min(topic_data.get("recent_seen", 0) + 1, RECENT_BITS)
         topic_data["current_stage"] = result.stage
         topic_data["last_activity"] = result.timestamp
         
@@ -121,19 +172,21 @@ class StudentProfile:
         """Update response time trends"""
         if self.total_questions == 1:
             self.average_response_time = new_time
+            self.ewma_response_time = new_time
         else:
             # Rolling average
             self.average_response_time = (
                 (self.average_response_time * (self.total_questions - 1) + new_time) / 
                 self.total_questions
             )
+            self.ewma_response_time += EWMA_ALPHA * (new_time - self.ewma_response_time)
             
         # Analyze trend (simple version)
-        if len(self.question_history) >= 3:
-            recent_times = [q.response_time_seconds for q in self.question_history[-3:]]
-            if recent_times[-1] < recent_times[0] * 0.8:
+        if len(self.recent_results) >= 3:
+            first_time = self.recent_results[-3][1]
+            if new_time < first_time * 0.8:
                 self.response_time_trend = "improving"
-            elif recent_times[-1] > recent_times[0] * 1.2:
+            elif new_time > first_time * 1.2:
                 self.response_time_trend = "declining"
             else:
                 self.response_time_trend = "stable"
@@ -144,7 +197,7 @@ class StudentProfile:
         # Check if student learns from mistakes quickly
         if self.consecutive_errors >= 2:
             self.learns_from_mistakes_quickly = False
-        elif self.consecutive_correct >= 3 and any(not q.is_correct for q in self.question_history[-5:]):
+        elif self.consecutive_correct >= 3 and self._recent_errors(5):
             self.learns_from_mistakes_quickly = True
             
         # Determine engagement level
@@ -159,6 +212,10 @@ class StudentProfile:
         if self.success_rate > 0.8 and self.consecutive_correct >= 4:
             self.responds_to_challenges = True
             
+    def _recent_errors(self, n: int) -> int:
+        attempts, correct = _recent_correct(self.recent_bits, self.recent_seen, n)
+        return attempts - correct
+    
     @property
     def success_rate(self) -> float:
         """Calculate overall success rate"""
@@ -179,9 +236,7 @@ class StudentProfile:
     @property
     def most_common_misconception(self) -> Optional[str]:
         """Get the most frequent misconception type"""
-        if not self.misconception_patterns:
-            return None
-        return max(self.misconception_patterns.items(), key=lambda x: x[1])[0]
+        return self.top_misconception
     
     @property
     def is_struggling(self) -> bool:
@@ -202,18 +257,21 @@ class StudentProfile:
     
     def get_recent_performance_summary(self, last_n: int = 5) -> Dict[str, Any]:
         """Get summary of recent performance"""
-        if len(self.question_history) == 0:
+        if not self.recent_results:
             return {"questions": 0, "correct": 0, "success_rate": 0.0}
             
-        recent_questions = self.question_history[-last_n:]
-        correct_count = sum(1 for q in recent_questions if q.is_correct)
+        skip = len(self.recent_results) - last_n
+        recent = list(islice(self.recent_results, skip, None)) if skip > 0 else self.recent_results
+        correct_count = sum(is_correct for is_correct, _, _ in recent)
         
         return {
-            "questions": len(recent_questions),
+            "questions": len(recent),
             "correct": correct_count,
-            "success_rate": correct_count / len(recent_questions),
-            "average_time": sum(q.response_time_seconds for q in recent_questions) / len(recent_questions),
-            "misconceptions": [q.misconception_type for q in recent_questions if q.misconception_type]
+            "success_rate": correct_count / len(recent),
+            "average_time": sum(response_time for _, response_time, _ in recent) / len(recent),
+            "misconceptions": [misconception for _, _, misconception in recent if misconception],
+            "weighted_success_rate": round(self.ewma_success_rate, 3),
+            "weighted_response_time": round(self.ewma_response_time, 2)
         }
     
     # NEW: Topic-specific methods
@@ -246,27 +304,27 @@ class StudentProfile:
         }
     
     def get_topic_questions(self, topic: str) -> List[QuestionResult]:
-        """Get all questions for a specific topic"""
+        """Get the loaded questions for a specific topic (the attempt log's recent tail)"""
         return [q for q in self.question_history if q.topic == topic]
     
     def get_topic_success_rate(self, topic: str) -> float:
         """Get success rate for a specific topic"""
-        topic_questions = self.get_topic_questions(topic)
-        if not topic_questions:
+        topic_data = self.topic_performance.get(topic)
+        if not topic_data or not topic_data["questions_attempted"]:
             return 0.0
-        correct_count = sum(1 for q in topic_questions if q.is_correct)
-        return correct_count / len(topic_questions)
+        return topic_data["questions_correct"] / topic_data["questions_attempted"]
+    
+    def _topic_recent_correct(self, topic: str, n: int) -> tuple:
+        topic_data = self.topic_performance.get(topic) or {}
+        return _recent_correct(topic_data.get("recent_bits", 0), topic_data.get("recent_seen", 0), n)
     
     def is_struggling_in_topic(self, topic: str) -> bool:
         """Determine if student is struggling in a specific topic"""
-        topic_questions = self.get_topic_questions(topic)
-        if len(topic_questions) < 3:
+        attempts, recent_correct = self._topic_recent_correct(topic, 3)
+        if attempts < 3:
             return False
         
         # Check recent performance in this topic
-        recent_topic_questions = topic_questions[-3:]
-        recent_correct = sum(1 for q in recent_topic_questions if q.is_correct)
-        
         return (
             recent_correct == 0 or
             self.get_topic_success_rate(topic) < 0.4
@@ -274,13 +332,11 @@ class StudentProfile:
     
     def is_excelling_in_topic(self, topic: str) -> bool:
         """Determine if student is excelling in a specific topic"""
-        topic_questions = self.get_topic_questions(topic)
-        if len(topic_questions) < 3:
+        attempts, recent_correct = self._topic_recent_correct(topic, 4)
+        if attempts < 3:
             return False
         
         # Check if recent performance is strong
-        recent_topic_questions = topic_questions[-4:]
-        recent_correct = sum(1 for q in recent_topic_questions if q.is_correct)
         
         return (
             recent_correct >= 3 or
@@ -354,9 +410,25 @@ class StudentProfile:
             "learns_from_mistakes_quickly": self.learns_from_mistakes_quickly,
             "prefers_encouragement": self.prefers_encouragement,
             "responds_to_challenges": self.responds_to_challenges,
-            # Note: question_history excluded for session storage size
+            "recent_results": [list(item) for item in self.recent_results],
+            "recent_bits": self.recent_bits,
+            "recent_seen": self.recent_seen,
+            "ewma_response_time": self.ewma_response_time,
+            "ewma_success_rate": self.ewma_success_rate,
+            # Note: question_history excluded for session storage size; services.attempt_log keeps it
         }
     
+    def to_bytes(self) -> bytes:
+        """Encode with the compact binary session format (see models.profile_codec)"""
+        from models.profile_codec import encode_profile
+        return encode_profile(self)
+    
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'StudentProfile':
+        """Decode from to_bytes output; rarely used sections are decoded on first access"""
+        from models.profile_codec import decode_profile
+        return decode_profile(data)
+    
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'StudentProfile':
         """Create from dictionary (session restoration)"""
@@ -378,6 +450,13 @@ class StudentProfile:
         profile.learns_from_mistakes_quickly = data.get("learns_from_mistakes_quickly", True)
         profile.prefers_encouragement = data.get("prefers_encouragement", True)
         profile.responds_to_challenges = data.get("responds_to_challenges", False)
+        profile.recent_results.extend(tuple(item) for item in data.get("recent_results", []))
+        profile.recent_bits = data.get("recent_bits", 0)
+        profile.recent_seen = data.get("recent_seen", 0)
+        profile.ewma_response_time = data.get("ewma_response_time", profile.average_response_time)
+        profile.ewma_success_rate = data.get("ewma_success_rate", profile.success_rate)
+        if profile.misconception_patterns:
+            profile.top_misconception = max(profile.misconception_patterns.items(), key=lambda x: x[1])[0]
         
         # Restore topic performance
         topic_performance_data = data.get("topic_performance", {})
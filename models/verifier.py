@@ -1,9 +1,62 @@
 """Verifies student answers for rounding questions."""
-import decimal
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from config import VERIFY_BATCH_MAX_PROCESSES
+from helpers.instrumentation import timed
+from models.rounding_kernel import analyze_text, compare, parse
+
+logger = logging.getLogger(__name__)
+
+# Batches smaller than this are always verified in-process
+PARALLEL_BATCH_THRESHOLD = 5000
+
+_batch_pool = None
+_batch_pool_lock = threading.Lock()
+
+
+def get_batch_pool():
+    """The process pool shared by every parallel verify_batch call, started on first use.
+
+    It has VERIFY_BATCH_MAX_PROCESSES workers whoever starts it; callers choose
+    how many chunks to split their batch into.
+    """
+    global _batch_pool
+    if _batch_pool is None:
+        with _batch_pool_lock:
+            if _batch_pool is None:
+                _batch_pool = ProcessPoolExecutor(max_workers=VERIFY_BATCH_MAX_PROCESSES)
+    return _batch_pool
+
+
+def _malformed(question, student_answer):
+    """Why a verify_batch item cannot be graded, or None if it has the expected shape."""
+    if not isinstance(question, dict):
+        return "question must be an object"
+    original = question.get("original_question")
+    choices = question.get("choices")
+    if not isinstance(original, dict) or not isinstance(choices, dict):
+        return "question needs original_question and choices objects"
+    if not isinstance(original.get("number"), str):
+        return "number must be a string"
+    decimal_places = original.get("decimal_places")
+    if type(decimal_places) is not int or decimal_places < 0:
+        return "decimal_places must be a non-negative integer"
+    correct_letter = question.get("correct_letter")
+    if not isinstance(correct_letter, str) or not isinstance(student_answer, str):
+        return "correct_letter and answer must be strings"
+    if correct_letter not in choices or student_answer not in choices:
+        return "correct_letter and answer must name choices"
+    if not all(isinstance(value, str) for value in choices.values()):
+        return "choices must be strings"
+    return None
 
 class Verifier:
     """Verifies student answers for rounding questions."""
 
+    def __init__(self, catalog=None):
+        self.catalog = catalog
+
     def verify_answer(self, question, student_answer):
         """Verifies if the student's answer is correct."""
 
@@ -19,16 +72,22 @@ class Verifier:
         student_value = question["choices"][student_answer]
         correct_value = question["choices"][correct_letter]
 
-        # Record verification steps
-        verification_steps = self._get_verification_steps(
-            original_number,
-            decimal_places,
-            correct_value
-        )
+        # Record verification steps (precomputed for catalog questions)
+        catalog, index = (self.catalog.lookup(question["original_question"].get("question_id"))
+                          if self.catalog else (None, None))
+        if catalog is not None:
+            verification_steps = catalog.verification_steps(index)
+        else:
+            verification_steps = self._get_verification_steps(
+                original_number,
+                decimal_places,
+                correct_value
+            )
 
         # CRITICAL FIX: Double-check that verification steps use the correct original number
         if verification_steps["original_number"] != original_number:
-            print(f"WARNING: Fixing mismatch in verification steps: {verification_steps['original_number']} to {original_number}")
+            logger.warning("Fixing mismatch in verification steps: %s to %s",
+                           verification_steps["original_number"], original_number)
             verification_steps["original_number"] = original_number
 
         # Enhanced misconception analysis
@@ -46,29 +105,80 @@ class Verifier:
         return is_correct, verification_steps, enhanced_misconception
 
 
+    def verify_batch(self, items, processes=None):
+        """
+        Verifies many (question, student_answer) pairs in one pass.
+
+        Verification steps are computed once per distinct (number, decimal places)
+        and misconception analysis once per distinct (number, decimal places,
+        student value, correct value). Identical inputs share result dicts, so
+        copy a result before mutating it.
+
+        Args:
+            items: Iterable of (question, student_answer) pairs, where question has
+                the same shape as for verify_answer
+            processes: Chunks to spread a large batch over in the shared process
+                pool, at most VERIFY_BATCH_MAX_PROCESSES (None or 1 = in-process)
+
+        Returns:
+            List of (is_correct, verification_steps, misconception) tuples in input
+            order; malformed items give (None, None, {"error": message})
+        """
+        items = list(items)
+        processes = min(processes or 1, VERIFY_BATCH_MAX_PROCESSES)
+        if processes > 1 and len(items) >= PARALLEL_BATCH_THRESHOLD:
+            chunk_size = -(-len(items) // processes)
+            chunks = [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
+            pool = get_batch_pool()
+            return [result for chunk in pool.map(_verify_chunk, chunks) for result in chunk]
+
+        steps_cache = {}
+        misconception_cache = {}
+        results = []
+        for question, student_answer in items:
+            problem = _malformed(question, student_answer)
+            if problem is not None:
+                results.append((None, None, {"error": f"Malformed item: {problem}"}))
+                continue
+            correct_letter = question["correct_letter"]
+            choices = question["choices"]
+            original_number = question["original_question"]["number"]
+            decimal_places = question["original_question"]["decimal_places"]
+            student_value = choices[student_answer]
+            correct_value = choices[correct_letter]
+
+            try:
+                step_key = (original_number, decimal_places, correct_value)
+                verification_steps = steps_cache.get(step_key)
+                if verification_steps is None:
+                    verification_steps = steps_cache[step_key] = self._get_verification_steps(
+                        original_number, decimal_places, correct_value
+                    )
+
+                is_correct = student_answer == correct_letter
+                misconception = None
+                if not is_correct:
+                    analysis_key = (original_number, decimal_places, student_value, correct_value)
+                    misconception = misconception_cache.get(analysis_key)
+                    if misconception is None:
+                        misconception = misconception_cache[analysis_key] = self._analyze_misconception_enhanced(
+                            original_number, decimal_places, student_value, correct_value, student_answer, choices
+                        )
+            except (ArithmeticError, IndexError, KeyError, TypeError, ValueError) as e:
+                results.append((None, None, {"error": f"Malformed item: {e!r}"}))
+                continue
+
+            results.append((is_correct, verification_steps, misconception))
+
+        return results
+
     def _get_verification_steps(self, number, decimal_places, correct_answer):
         """Records detailed verification steps."""
-        # Convert to Decimal for precise handling
-        num = decimal.Decimal(number)
-        
-        # Identify the digit in the target decimal place
-        target_digit_idx = number.find(".") + decimal_places
-        
-        if target_digit_idx < len(number):
-            target_digit = number[target_digit_idx]
-        else:
-            target_digit = "0"
-            
-        # Identify the digit to the right
-        right_digit_idx = target_digit_idx + 1
-        
-        if right_digit_idx < len(number):
-            right_digit = number[right_digit_idx]
-        else:
-            right_digit = "0"
-            
-        # Determine if rounding up is needed
-        round_up = int(right_digit) >= 5
+        # Target digit, the digit to its right and the rounding direction
+        facts = analyze_text(number, decimal_places)
+        target_digit = str(facts.target_digit)
+        right_digit = str(facts.right_digit)
+        round_up = facts.round_up
         
         steps = {
             "original_number": number,
@@ -112,12 +222,14 @@ class Verifier:
             else:
                 return detailed_misconception + misconceptions["under_rounded"]
 
+        direction = compare(parse(student_value), parse(correct_value))
+
         # Check if should have rounded up but didn't
-        if decimal.Decimal(student_value) < decimal.Decimal(correct_value):
+        if direction < 0:
             return detailed_misconception + misconceptions["should_round_up"]
 
         # Check if should not have rounded up but did
-        if decimal.Decimal(student_value) > decimal.Decimal(correct_value):
+        if direction > 0:
             return detailed_misconception + misconceptions["shouldnt_round_up"]
 
         # Check if trailing zeros are missing
@@ -127,6 +239,7 @@ class Verifier:
         # Default
         return detailed_misconception + "There seems to be a misunderstanding of the rounding process."
 
+    @timed("misconception_analysis")
     def _analyze_misconception_enhanced(self, number, decimal_places, student_value, correct_value, student_letter, all_choices):
         """Enhanced misconception analysis that returns structured data for AI consumption."""
 
@@ -162,21 +275,21 @@ class Verifier:
     def _analyze_student_choice(self, student_value, correct_value, all_choices, number, decimal_places):
         """Analyze what the student's specific choice reveals about their thinking."""
 
-        # Convert values to numbers for analysis
+        # Convert values to exact fixed-point numbers for analysis
         try:
-            student_num = float(student_value)
-            correct_num = float(correct_value)
-            original_num = float(number)
-        except:
+            student_num = parse(student_value)
+            correct_num = parse(correct_value)
+            direction = compare(student_num, correct_num)
+        except ValueError:
             return self._fallback_choice_analysis()
 
         # Analyze the relationship between student choice and correct answer
-        if student_num == correct_num:
+        if direction == 0:
             return self._correct_choice_analysis()
 
         # Check if student truncated instead of rounded
         truncated_value = self._get_truncated_value(number, decimal_places)
-        if abs(student_num - truncated_value) < 0.0001:
+        if compare(student_num, truncated_value) == 0:
             return {
                 'student_action': 'truncated_instead_of_rounded',
                 'correct_concept': 'rounding_vs_truncation',
@@ -187,7 +300,7 @@ class Verifier:
             }
 
         # Check if student rounded in wrong direction
-        if student_num < correct_num:
+        if direction < 0:
             return {
                 'student_action': 'rounded_down_when_should_round_up',
                 'correct_concept': 'rounding_up_rule',
@@ -196,7 +309,7 @@ class Verifier:
                 'missed_concept': 'rounding_up_when_digit_5_or_greater',
                 'suggested_focus': 'practice_identifying_when_to_round_up'
             }
-        elif student_num > correct_num:
+        elif direction > 0:
             return {
                 'student_action': 'rounded_up_when_should_round_down',
                 'correct_concept': 'rounding_down_rule',
@@ -229,19 +342,8 @@ class Verifier:
         }
 
     def _get_truncated_value(self, number, decimal_places):
-        """Get what the value would be if truncated (not rounded)."""
-        try:
-            if '.' not in number:
-                return float(number)
-
-            parts = number.split('.')
-            if len(parts[1]) <= decimal_places:
-                return float(number)
-
-            truncated = parts[0] + '.' + parts[1][:decimal_places]
-            return float(truncated)
-        except:
-            return 0.0
+        """Get what the value would be if truncated (not rounded), as (scaled, scale)."""
+        return analyze_text(number, decimal_places).truncated, decimal_places
 
     def _categorize_misconception_type(self, original_text):
         """Categorize the misconception for AI processing."""
@@ -320,3 +422,8 @@ class Verifier:
             'missed_concept': 'none',
             'suggested_focus': 'continue_current_approach'
         }
+
+
+def _verify_chunk(items):
+    """Process-pool entry point for Verifier.verify_batch."""
+    return Verifier().verify_batch(items)
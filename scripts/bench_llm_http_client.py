@@ -0,0 +1,69 @@
+"""Benchmark the pooled LLM HTTP client against one-shot requests.post calls.
+
+Usage: python scripts/bench_llm_http_client.py [--requests 500] [--threads 4] [--latency 0.0]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from scripts.llm_stub_server import start_stub_server
+from services.http_client import PooledHTTPClient
+
+PAYLOAD = json.dumps({
+    "model": "stub",
+    "system": "You are a helpful assistant for students learning math.",
+    "messages": [{"role": "user", "content": "Explain rounding 12.68 to 1 decimal place."}],
+    "max_tokens": 150
+})
+HEADERS = {"Content-Type": "application/json"}
+
+
+def run(label, send, total, threads):
+    latencies = []
+
+    def one(_):
+        start = time.perf_counter()
+        send().raise_for_status()
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"{label:<14} {total / elapsed:9.1f} req/s   "
+          f"p50 {statistics.median(latencies) * 1000:7.2f} ms   "
+          f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.0, help="stub response delay in seconds")
+    args = parser.parse_args()
+
+    server, url = start_stub_server(latency=args.latency)
+    client = PooledHTTPClient(pool_size=args.threads)
+
+    run("requests.post", lambda: requests.post(url, headers=HEADERS, data=PAYLOAD, timeout=10),
+        args.requests, args.threads)
+    run("pooled client", lambda: client.post(url, headers=HEADERS, data=PAYLOAD),
+        args.requests, args.threads)
+    print("pooled client stats:", client.stats.snapshot())
+
+    client.close()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""Compare counter-based and mastery-based advancement on simulated students.
+
+Each simulated student has a hidden state per skill (known or not) that
+follows its own BKT process: a practice question is answered correctly with
+probability 1 - slip if every skill it exercises is known and with the guess
+probability otherwise, and each unknown skill it exercises is then learned
+with the student's transit probability. Questions come from the real
+question engine and the lesson is driven through LearningSequence, so skill
+tagging and the stage graph are the ones the app uses.
+
+For every policy the script reports practice questions until the student
+leaves the core lesson (reaches stretch or complete) and the student's
+expected accuracy at that point on a post-test drawn from stages 1.1 to 2.2.
+Counter policies are a sweep of "k correct in a row" in every stage plus the
+configured ADVANCEMENT_CRITERIA; mastery policies are a sweep of thresholds.
+The last table pairs each mastery threshold with the cheapest counter policy
+that reaches at least the same post-test accuracy.
+
+Usage: python scripts/bench_mastery.py [--students 400] [--thresholds 0.9,0.95,0.98]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from config import ADVANCEMENT_CRITERIA, SKILLS
+from models.learning_sequence import LearningSequence
+from models.mastery import skills_for_question
+from models.question_engine import QuestionEngine
+from models.stage_graph import build_stage_graph
+
+CORE_STAGES = ("1.1", "1.2", "1.3", "2.1", "2.2")
+EXIT_STAGES = ("stretch", "complete")
+
+# Hidden learning parameters per kind of student: prior, transit, slip, guess
+STUDENT_KINDS = {
+    "strong": (0.7, 0.35, 0.05, 0.25),
+    "average": (0.35, 0.2, 0.08, 0.25),
+    "weak": (0.1, 0.08, 0.12, 0.25),
+}
+
+
+class SimulatedStudent:
+    """Hidden per-skill knowledge that answers and learns like a BKT student."""
+
+    def __init__(self, kind, rng):
+        self.kind = kind
+        self.p_init, self.p_transit, self.p_slip, self.p_guess = STUDENT_KINDS[kind]
+        self.rng = rng
+        self.known = [rng.random() < self.p_init for _ in SKILLS]
+
+    def p_correct(self, skills):
+        return 1 - self.p_slip if all(self.known[i] for i in skills) else self.p_guess
+
+    def answer(self, skills):
+        is_correct = self.rng.random() < self.p_correct(skills)
+        for i in skills:
+            if not self.known[i] and self.rng.random() < self.p_transit:
+                self.known[i] = True
+        return is_correct
+
+
+def counter_criteria(streak):
+    """ADVANCEMENT_CRITERIA with every stage asking for ``streak`` correct in a row."""
+    return {stage: {**{k: v for k, v in rule.items() if k not in ("correct_required", "consecutive_correct_required")},
+                    "consecutive_correct_required": streak}
+            for stage, rule in ADVANCEMENT_CRITERIA.items()}
+
+
+def policies(thresholds, max_streak):
+    found = [("counters (config)", build_stage_graph(mode="counters"))]
+    found += [(f"counters k={k}", build_stage_graph(criteria=counter_criteria(k), mode="counters"))
+              for k in range(1, max_streak + 1)]
+    found += [(f"mastery {t:g}", build_stage_graph(mode="mastery", mastery_threshold=t)) for t in thresholds]
+    return found
+
+
+def run_lesson(sequence_class, student, engine, rng, max_questions):
+    """Drive one student through the lesson; returns (practice questions, seconds in update_progress)."""
+    sequence = sequence_class()
+    questions = 0
+    update_seconds = 0.0
+    while sequence.current_stage not in EXIT_STAGES and questions < max_questions:
+        if sequence.showing_example:
+            sequence.next_example()
+            continue
+        question = engine.generate(sequence.current_stage, rng)
+        is_correct = student.answer(skills_for_question(question))
+        start = time.perf_counter()
+        sequence.update_progress(is_correct, question)
+        update_seconds += time.perf_counter() - start
+        questions += 1
+    return questions, update_seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=400, help="students of each kind")
+    parser.add_argument("--thresholds", default="0.9,0.95,0.98")
+    parser.add_argument("--max-streak", type=int, default=5)
+    parser.add_argument("--max-questions", type=int, default=400)
+    parser.add_argument("--post-test", type=int, default=100, help="post-test questions per core stage")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    engine = QuestionEngine()
+    test_rng = random.Random(args.seed)
+    post_test = [skills_for_question(engine.generate(stage, test_rng))
+                 for stage in CORE_STAGES for _ in range(args.post_test)]
+    thresholds = [float(t) for t in args.thresholds.split(",") if t]
+
+    results = {}
+    for name, graph in policies(thresholds, args.max_streak):
+        sequence_class = type("SimulatedSequence", (LearningSequence,), {"stage_graph": graph})
+        per_kind = {}
+        updates = update_seconds = 0
+        for kind_index, kind in enumerate(STUDENT_KINDS):
+            questions = accuracy = 0.0
+            for i in range(args.students):
+                # The same students, with the same luck, under every policy
+                rng = random.Random(f"{args.seed}:{kind_index}:{i}")
+                student = SimulatedStudent(kind, rng)
+                count, seconds = run_lesson(sequence_class, student, engine, rng, args.max_questions)
+                questions += count
+                updates += count
+                update_seconds += seconds
+                accuracy += sum(student.p_correct(skills) for skills in post_test) / len(post_test)
+            per_kind[kind] = (questions / args.students, accuracy / args.students)
+        mean_questions = sum(q for q, _ in per_kind.values()) / len(per_kind)
+        mean_accuracy = sum(a for _, a in per_kind.values()) / len(per_kind)
+        results[name] = (mean_questions, mean_accuracy, per_kind, update_seconds / max(updates, 1) * 1e6)
+
+    print(f"{args.students} students of each kind; questions to leave the core lesson and post-test accuracy")
+    header = f"{'policy':<20}{'all q':>8}{'acc':>7}"
+    for kind in STUDENT_KINDS:
+        header += f"{kind + ' q':>12}{'acc':>7}"
+    print(header + f"{'us/answer':>11}")
+    for name, (questions, accuracy, per_kind, update_us) in results.items():
+        row = f"{name:<20}{questions:>8.1f}{accuracy:>7.3f}"
+        for kind_questions, kind_accuracy in per_kind.values():
+            row += f"{kind_questions:>12.1f}{kind_accuracy:>7.3f}"
+        print(row + f"{update_us:>11.2f}")
+
+    print("\nmastery vs the cheapest counter policy with at least the same post-test accuracy")
+    counters = [(questions, accuracy, name) for name, (questions, accuracy, _, _) in results.items()
+                if name.startswith("counters")]
+    for name, (questions, accuracy, _, _) in results.items():
+        if not name.startswith("mastery"):
+            continue
+        matches = sorted(entry for entry in counters if entry[1] >= accuracy)
+        if not matches:
+            print(f"  {name}: acc {accuracy:.3f}, {questions:.1f} q; no counter policy reaches this accuracy")
+            continue
+        match_questions, match_accuracy, match_name = matches[0]
+        print(f"  {name}: acc {accuracy:.3f}, {questions:.1f} q  vs  {match_name}: acc {match_accuracy:.3f}, "
+              f"{match_questions:.1f} q  ({(questions - match_questions) / match_questions:+.0%} questions)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Microbenchmark cold versus warm multiple-choice serving.
+
+Cold: distractors and question text are rebuilt with Decimal for every serve.
+Warm: the memoized path used by the app after QuestionGenerator.warm_up().
+
+Usage: python scripts/bench_multiple_choice.py [--serves 100000]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from models.question_generator import QuestionGenerator
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--serves", type=int, default=100000)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    generator = QuestionGenerator()
+    generator.warm_up()
+    print(f"catalog build + warm-up: {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    questions = [catalog.question(index)
+                 for catalog in generator.catalog.stages.values()
+                 for index in range(len(catalog))]
+    sample = [random.choice(questions) for _ in range(args.serves)]
+
+    def cold(question):
+        distractors = generator._compute_distractors(
+            question["number"], question["decimal_places"], question["answer"], question["rounding_up"]
+        )
+        choices = [question["answer"]] + list(distractors)
+        random.shuffle(choices)
+        return {
+            "question_text": f"Round {question['number']} to {question['decimal_places']} decimal places",
+            "choices": dict(zip("ABCD", choices)),
+            "correct_letter": "ABCD"[choices.index(question["answer"])],
+            "original_question": question
+        }
+
+    for label, serve in (("cold", cold), ("warm", generator.format_multiple_choice)):
+        start = time.perf_counter()
+        for question in sample:
+            serve(question)
+        elapsed = time.perf_counter() - start
+        print(f"{label:<5} {elapsed / args.serves * 1e6:7.2f} us/serve   {args.serves / elapsed:11,.0f} serves/s")
+
+    print(generator.cache_info())
+
+
+if __name__ == "__main__":
+    main()
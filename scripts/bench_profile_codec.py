@@ -0,0 +1,95 @@
+"""Compare the binary StudentProfile encoding with the JSON dict path.
+
+Builds profiles with --attempts results over the rounding stages, checks that
+both encodings round-trip to equal profiles, then reports bytes per profile
+(raw and as stored in the JSON session) and encode/decode times.
+
+Usage: python scripts/bench_profile_codec.py [--attempts 200] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from flask.json.tag import TaggedJSONSerializer
+
+from models.student_profile import QuestionResult, StudentProfile
+
+STAGES = ("1.1", "1.2", "1.3", "2.1", "2.2", "stretch")
+MISCONCEPTIONS = ("rounding_direction_confusion", "decimal_place_confusion", "place_value_confusion")
+
+
+def build_profile(attempts, seed):
+    rng = random.Random(seed)
+    profile = StudentProfile()
+    for i in range(attempts):
+        is_correct = rng.random() < 0.7
+        stage = STAGES[min(len(STAGES) - 1, i * len(STAGES) // max(attempts, 1))]
+        profile.add_question_result(QuestionResult(
+            question_id=f"rounding_{i}",
+            stage=f"rounding_{stage}",
+            is_correct=is_correct,
+            response_time_seconds=round(rng.uniform(2, 40), 2),
+            misconception_type=None if is_correct else rng.choice(MISCONCEPTIONS)
+        ))
+        profile.current_stage = f"rounding_{stage}"
+    profile.topic_performance["rounding"]["stages_completed"] = set(STAGES[:3])
+    # Neither encoding carries the history; it lives in the attempt log
+    profile.question_history = []
+    return profile
+
+
+def timed(fn, repeat, loops):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        best = min(best, time.perf_counter() - start)
+    return best / loops * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--attempts", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--loops", type=int, default=2000)
+    args = parser.parse_args()
+
+    profile = build_profile(args.attempts, 1)
+    session_serializer = TaggedJSONSerializer()
+
+    as_json = json.dumps(profile.to_dict())
+    as_bytes = profile.to_bytes()
+    from_json = StudentProfile.from_dict(json.loads(as_json))
+    from_bytes = StudentProfile.from_bytes(as_bytes)
+    assert from_bytes == profile, "binary round trip changed the profile"
+    assert from_bytes.to_bytes() == as_bytes
+    assert StudentProfile.from_bytes(as_bytes).to_bytes() == as_bytes, "untouched sections must copy through"
+
+    print(f"profile with {args.attempts} attempts")
+    print(f"  JSON dict        {len(as_json):6d} bytes   in session {len(session_serializer.dumps({'p': profile.to_dict()})):6d}")
+    print(f"  binary           {len(as_bytes):6d} bytes   in session {len(session_serializer.dumps({'p': as_bytes})):6d}")
+    del from_json
+
+    def touch_all(p):
+        return p.misconception_patterns, p.stage_performance, p.topic_performance, p.recent_results
+
+    cases = (
+        ("encode JSON", lambda: json.dumps(profile.to_dict())),
+        ("encode binary", lambda: profile.to_bytes()),
+        ("decode JSON", lambda: StudentProfile.from_dict(json.loads(as_json))),
+        ("decode binary (counters)", lambda: StudentProfile.from_bytes(as_bytes)),
+        ("decode binary (all)", lambda: touch_all(StudentProfile.from_bytes(as_bytes))),
+        ("decode+encode binary", lambda: StudentProfile.from_bytes(as_bytes).to_bytes()),
+    )
+    for label, fn in cases:
+        print(f"  {label:<26}{timed(fn, args.repeat, args.loops):8.2f} us")
+
+
+if __name__ == "__main__":
+    main()
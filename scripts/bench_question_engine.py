@@ -0,0 +1,62 @@
+"""Benchmark and validate the procedural question engine.
+
+Usage: python scripts/bench_question_engine.py [--count 200000] [--seed 1]
+"""
+import argparse
+import os
+import sys
+import time
+from decimal import Decimal, ROUND_HALF_UP
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from config import QUESTION_RULES
+from models.question_engine import QuestionEngine
+
+
+def check(stage, question):
+    """Assert a generated question obeys its QUESTION_RULES entry."""
+    rules = QUESTION_RULES[stage]
+    number, places = question["number"], question["decimal_places"]
+    fraction = number.split(".")[1]
+    target, right = int(fraction[places - 1]), int(fraction[places])
+
+    expected = Decimal(number).quantize(Decimal(1).scaleb(-places), rounding=ROUND_HALF_UP)
+    assert question["answer"] == str(expected), (stage, question)
+    assert question["rounding_up"] == (right >= 5), (stage, question)
+    assert fraction[-1] != "0", (stage, question)
+
+    lengths = rules["digits_after_decimal"]
+    assert len(fraction) in (lengths if isinstance(lengths, list) else [lengths]), (stage, question)
+    if rules.get("avoid_rounding_up"):
+        assert right < 5, (stage, question)
+    if rules.get("must_round_up"):
+        assert right >= 5, (stage, question)
+    if rules.get("avoid_rounding_nines"):
+        assert target != 9, (stage, question)
+    if rules.get("must_have_nines"):
+        assert target == 9 and right >= 5, (stage, question)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=200000, help="questions per stage")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    engine = QuestionEngine()
+    for stage in QUESTION_RULES:
+        stream = engine.stream(stage, args.seed)
+        start = time.perf_counter()
+        questions = [next(stream) for _ in range(args.count)]
+        elapsed = time.perf_counter() - start
+
+        for question in questions:
+            check(stage, question)
+        unique = len({q["number"] for q in questions})
+        print(f"stage {stage:<8} {args.count / elapsed:11,.0f} questions/s   "
+              f"{unique:,} distinct numbers   e.g. {questions[0]['number']} -> {questions[0]['answer']}")
+
+
+if __name__ == "__main__":
+    main()
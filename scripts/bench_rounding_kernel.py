@@ -0,0 +1,70 @@
+"""Benchmark the fixed-point rounding kernel against the Decimal path.
+
+Both compute the rounded, truncated and ceiling values plus the target and
+right digits for every catalog number; results are checked to be identical.
+
+Usage: python scripts/bench_rounding_kernel.py [--repeat 5]
+"""
+import argparse
+import decimal
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from models.question_engine import QuestionEngine
+from models.rounding_kernel import analyze_text, format_fixed
+
+
+def decimal_facts(number, places):
+    num = decimal.Decimal(number)
+    quantum = decimal.Decimal(1).scaleb(-places)
+    fraction = number.split(".")[1] + "0" * (places + 1)
+    return (
+        str(num.quantize(quantum, rounding=decimal.ROUND_HALF_UP)),
+        str(num.quantize(quantum, rounding=decimal.ROUND_DOWN)),
+        str(num.quantize(quantum, rounding=decimal.ROUND_UP)),
+        int(fraction[places - 1]),
+        int(fraction[places])
+    )
+
+
+def kernel_facts(number, places):
+    facts = analyze_text(number, places)
+    return (
+        format_fixed(facts.rounded, places),
+        format_fixed(facts.truncated, places),
+        format_fixed(facts.ceiling, places),
+        facts.target_digit,
+        facts.right_digit
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--count", type=int, default=20000, help="numbers per stage")
+    args = parser.parse_args()
+
+    engine = QuestionEngine()
+    cases = []
+    for stage in engine.plans:
+        stream = engine.stream(stage, 1)
+        cases.extend((q["number"], q["decimal_places"]) for q in (next(stream) for _ in range(args.count)))
+
+    assert all(decimal_facts(n, p) == kernel_facts(n, p) for n, p in cases), "kernel disagrees with Decimal"
+
+    # The verifier and content service only need the facts, not formatted strings
+    for label, fn in (("Decimal", decimal_facts), ("kernel", kernel_facts), ("facts", analyze_text)):
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            for number, places in cases:
+                fn(number, places)
+            best = min(best, time.perf_counter() - start)
+        print(f"{label:<8} {len(cases) / best:11,.0f} numbers/s   {best / len(cases) * 1e6:6.2f} us/number")
+
+
+if __name__ == "__main__":
+    main()
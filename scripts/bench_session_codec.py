@@ -0,0 +1,119 @@
+"""Compare the compact session cookie with Flask's default signed JSON cookie.
+
+Runs simulated students (the load test's VirtualStudent) through a whole
+lesson with SESSION_BACKEND=cookie, snapshots the session after every
+response, then reports for both encodings the cookie size as the lesson
+progresses, encode and decode time per snapshot, and how many responses had
+to send a Set-Cookie.
+
+Usage: python scripts/bench_session_codec.py [--students 3] [--accuracy 0.75]
+"""
+import argparse
+import base64
+import copy
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def best_of(fn, snapshots, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for snapshot in snapshots:
+            fn(snapshot)
+        best = min(best, time.perf_counter() - start)
+    return best / len(snapshots) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=3)
+    parser.add_argument("--accuracy", type=float, default=0.75)
+    parser.add_argument("--max-steps", type=int, default=120)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    os.environ["SESSION_BACKEND"] = "cookie"
+    os.environ["SESSION_KEY_FILE"] = ""
+    os.environ.pop("LLM_API_KEY", None)
+    from load_test import Recorder, TestClientTransport, VirtualStudent, silence_app_output
+    silence_app_output()
+    from app import app
+    silence_app_output()
+    out = sys.__stdout__
+
+    from flask.sessions import SecureCookieSessionInterface
+    from helpers.session_codec import decode_session, encode_session
+
+    interface = app.session_interface
+    snapshots = []
+    original_save = interface.save_session
+
+    def recording_save(app_, session, response):
+        # Flask's cookie interface sends a cookie whenever the session was modified
+        modified = session.modified
+        original_save(app_, session, response)
+        snapshots[-1].append((copy.deepcopy(dict(session)), "Set-Cookie" in response.headers, modified))
+
+    interface.save_session = recording_save
+    rng = random.Random(args.seed)
+    for _ in range(args.students):
+        snapshots.append([])
+        student = VirtualStudent(TestClientTransport(app), Recorder(), args.accuracy, rng,
+                                 args.max_steps, False, 0.0)
+        student.run()
+    interface.save_session = original_save
+
+    with app.test_request_context():
+        flask_signer = SecureCookieSessionInterface().get_signing_serializer(app)
+    compact_signer = interface._get_signers()[1]
+
+    def flask_cookie(data):
+        return flask_signer.dumps(data)
+
+    def compact_cookie(data):
+        return compact_signer.sign(base64.urlsafe_b64encode(encode_session(data)).rstrip(b"="))
+
+    def compact_read(cookie):
+        encoded = compact_signer.unsign(cookie)
+        return decode_session(base64.urlsafe_b64decode(encoded + b"=" * (-len(encoded) % 4)))
+
+    lesson = snapshots[0]
+    print(f"one lesson, {len(lesson)} responses (student 1 of {args.students}); cookie bytes", file=out)
+    print(f"{'response':>10}{'flask':>10}{'compact':>10}", file=out)
+    marks = sorted({0, len(lesson) // 4, len(lesson) // 2, 3 * len(lesson) // 4, len(lesson) - 1})
+    for i in marks:
+        data = lesson[i][0]
+        print(f"{i + 1:>10}{len(flask_cookie(data)):>10}{len(compact_cookie(data)):>10}", file=out)
+
+    every = [data for student in snapshots for data, _, _ in student if data]
+    for data in every:
+        assert compact_read(compact_cookie(data)) == data, "compact round trip changed the session"
+    flask_sizes = [len(flask_cookie(data)) for data in every]
+    compact_sizes = [len(compact_cookie(data)) for data in every]
+    compact_writes = sum(sent for student in snapshots for _, sent, _ in student)
+    flask_writes = sum(modified for student in snapshots for _, _, modified in student)
+    flask_cookies = [flask_cookie(data) for data in every]
+    compact_cookies = [compact_cookie(data) for data in every]
+
+    print(f"\nall {args.students} students, {len(every)} non-empty sessions", file=out)
+    print(f"{'':<24}{'flask':>12}{'compact':>12}", file=out)
+    print(f"{'mean cookie bytes':<24}{sum(flask_sizes) / len(every):>12.0f}{sum(compact_sizes) / len(every):>12.0f}", file=out)
+    print(f"{'max cookie bytes':<24}{max(flask_sizes):>12}{max(compact_sizes):>12}", file=out)
+    print(f"{'encode+sign us':<24}{best_of(flask_cookie, every, args.repeat):>12.1f}"
+          f"{best_of(compact_cookie, every, args.repeat):>12.1f}", file=out)
+    print(f"{'verify+decode us':<24}{best_of(flask_signer.loads, flask_cookies, args.repeat):>12.1f}"
+          f"{best_of(compact_read, compact_cookies, args.repeat):>12.1f}", file=out)
+    responses = sum(len(student) for student in snapshots)
+    print(f"{'Set-Cookie responses':<24}{f'{flask_writes}/{responses}':>12}{f'{compact_writes}/{responses}':>12}", file=out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""Benchmark StudentProfile's derived properties on long attempt histories.
+
+Builds a profile with --attempts results spread over two topics, checks the
+incremental aggregates against a full rescan of question_history, then times
+the derived queries both ways.
+
+Usage: python scripts/bench_student_profile.py [--attempts 10000] [--repeat 5]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from models.student_profile import QuestionResult, StudentProfile
+
+TOPICS = ("rounding", "fractions")
+MISCONCEPTIONS = (None, "rounding_direction_confusion", "decimal_place_confusion", "place_value_confusion")
+
+
+def scan_topic_success_rate(profile, topic):
+    questions = [q for q in profile.question_history if q.topic == topic]
+    return sum(q.is_correct for q in questions) / len(questions) if questions else 0.0
+
+
+def scan_struggling(profile, topic):
+    questions = [q for q in profile.question_history if q.topic == topic]
+    if len(questions) < 3:
+        return False
+    return sum(q.is_correct for q in questions[-3:]) == 0 or scan_topic_success_rate(profile, topic) < 0.4
+
+
+def scan_excelling(profile, topic):
+    questions = [q for q in profile.question_history if q.topic == topic]
+    if len(questions) < 3:
+        return False
+    return sum(q.is_correct for q in questions[-4:]) >= 3 or scan_topic_success_rate(profile, topic) > 0.8
+
+
+def scan_recent_summary(profile, last_n=5):
+    recent = profile.question_history[-last_n:]
+    return (len(recent), sum(q.is_correct for q in recent),
+            [q.misconception_type for q in recent if q.misconception_type])
+
+
+def build_profile(attempts, seed):
+    rng = random.Random(seed)
+    profile = StudentProfile()
+    for i in range(attempts):
+        is_correct = rng.random() < 0.7
+        profile.add_question_result(QuestionResult(
+            question_id=f"q{i}",
+            stage="1.1",
+            topic=TOPICS[rng.random() < 0.2],
+            is_correct=is_correct,
+            response_time_seconds=rng.uniform(2, 40),
+            misconception_type=None if is_correct else MISCONCEPTIONS[1 + int(rng.random() * 3)]
+        ))
+    return profile
+
+
+def timed(fn, repeat, loops):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        best = min(best, time.perf_counter() - start)
+    return best / loops * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--attempts", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    profile = build_profile(args.attempts, args.seed)
+    build_us = (time.perf_counter() - start) / args.attempts * 1e6
+
+    for topic in TOPICS:
+        assert profile.get_topic_success_rate(topic) == scan_topic_success_rate(profile, topic)
+        assert profile.is_struggling_in_topic(topic) == scan_struggling(profile, topic)
+        assert profile.is_excelling_in_topic(topic) == scan_excelling(profile, topic)
+    summary = profile.get_recent_performance_summary()
+    assert (summary["questions"], summary["correct"], summary["misconceptions"]) == scan_recent_summary(profile)
+    restored = StudentProfile.from_dict(profile.to_dict())
+    assert restored.is_struggling_in_topic("rounding") == profile.is_struggling_in_topic("rounding")
+    assert restored.most_common_misconception == profile.most_common_misconception
+
+    print(f"add_question_result: {build_us:.2f} us/attempt with {args.attempts:,} attempts")
+    loops = max(1, 200000 // args.attempts)
+    cases = (
+        ("topic success rate", lambda: scan_topic_success_rate(profile, "rounding"),
+         lambda: profile.get_topic_success_rate("rounding")),
+        ("struggling in topic", lambda: scan_struggling(profile, "rounding"),
+         lambda: profile.is_struggling_in_topic("rounding")),
+        ("excelling in topic", lambda: scan_excelling(profile, "rounding"),
+         lambda: profile.is_excelling_in_topic("rounding")),
+        ("recent summary", lambda: scan_recent_summary(profile),
+         lambda: profile.get_recent_performance_summary()),
+    )
+    print(f"{'query':<22}{'rescan us':>12}{'incremental us':>16}")
+    for label, scan, incremental in cases:
+        print(f"{label:<22}{timed(scan, args.repeat, loops):12.2f}{timed(incremental, args.repeat, 20000):16.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Property check and benchmark for the vectorized misconception classifier.
+
+Random answers (catalog questions plus arbitrary decimals, whole numbers and
+mismatched decimal places) are labelled by both the vectorized classifier and
+the per-item Verifier logic; every label must agree.
+
+Usage: python scripts/check_misconception_classifier.py [--cases 200000] [--seed 7]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from models.misconception_classifier import ACTIONS, TYPES, classify, classify_answers, parse_decimal_column
+from models.question_engine import QuestionEngine
+from models.verifier import Verifier
+
+
+def random_decimal(rng, max_scale=5):
+    whole = str(rng.randrange(0, 120))
+    scale = rng.randrange(0, max_scale + 1)
+    if scale == 0 and rng.random() < 0.5:
+        return whole
+    return whole + "." + "".join(rng.choice("0123456789") for _ in range(scale))
+
+
+def make_cases(count, seed):
+    rng = random.Random(seed)
+    engine = QuestionEngine()
+    stages = list(engine.plans)
+    cases = []
+    for _ in range(count):
+        question = engine.generate(rng.choice(stages), rng)
+        number, places, answer = question["number"], question["decimal_places"], question["answer"]
+        roll = rng.random()
+        if roll < 0.5:
+            # Plausible mistakes: truncation, off-by-one unit, other places, whole numbers
+            whole, fraction = number.split(".")
+            student = rng.choice([
+                whole + "." + fraction[:places],
+                whole + "." + fraction[:places + 1],
+                whole + "." + fraction[:max(places - 1, 1)],
+                str(int(whole) + rng.choice([0, 1])),
+                answer
+            ])
+        elif roll < 0.8:
+            student = random_decimal(rng)
+        else:
+            student = answer
+        correct = answer if rng.random() < 0.9 else random_decimal(rng, 3)
+        cases.append((number, places, student, correct))
+    return cases
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cases", type=int, default=200000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    cases = make_cases(args.cases, args.seed)
+    verifier = Verifier()
+
+    start = time.perf_counter()
+    expected = [
+        (verifier._analyze_student_choice(s, c, {}, n, p)["student_action"],
+         verifier._categorize_misconception_type(verifier._identify_misconception(n, p, s, c)))
+        for n, p, s, c in cases
+    ]
+    per_item = time.perf_counter() - start
+
+    numbers, places, students, corrects = (list(column) for column in zip(*cases))
+    start = time.perf_counter()
+    actions, types = classify_answers(numbers, places, students, corrects)
+    vectorized = time.perf_counter() - start
+
+    columns = [parse_decimal_column(numbers), parse_decimal_column(students), parse_decimal_column(corrects)]
+    start = time.perf_counter()
+    classify(columns[0][0], columns[0][1], places, *columns[1], columns[2][0], columns[2][1])
+    columnar = time.perf_counter() - start
+
+    mismatches = [
+        (case, want, (ACTIONS[a], TYPES[t]))
+        for case, want, a, t in zip(cases, expected, actions, types)
+        if want != (ACTIONS[a], TYPES[t])
+    ]
+    for mismatch in mismatches[:10]:
+        print("MISMATCH", mismatch)
+
+    print(f"{len(cases):,} cases, {len(mismatches)} mismatches")
+    print(f"per-item Verifier: {len(cases) / per_item:12,.0f} answers/s")
+    print(f"vectorized:        {len(cases) / vectorized:12,.0f} answers/s (including string parsing)")
+    print(f"vectorized:        {len(cases) / columnar:12,.0f} answers/s (pre-parsed columns)")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""Check that sessions survive worker restarts, round-robin routing and key rotation.
+
+Starts --workers app processes sharing a SQLite session store and a session
+key file in a temporary directory, then drives one student through them in
+round-robin order:
+
+  1. every worker sees the same user id, and a question served by one worker
+     is graded by another (its token is signed with the shared key);
+  2. after all workers are restarted the student is still known;
+  3. after a key rotation the old cookie is still accepted, the workers
+     re-issue it under the new key, and questions still verify.
+
+Exits non-zero on the first failed check.
+
+Usage: python scripts/check_multi_worker.py [--workers 3]
+"""
+import argparse
+import os
+import socket
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import requests
+
+
+def serve(port):
+    """Worker entry point: run the app on ``port`` until killed."""
+    from werkzeug.serving import make_server
+    from app import app
+    server = make_server("127.0.0.1", port, app, threaded=True)
+    print("ready", flush=True)
+    server.serve_forever()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class Cluster:
+    """Worker processes on fixed ports, restartable in place."""
+
+    def __init__(self, count, env):
+        self.env = env
+        self.ports = [free_port() for _ in range(count)]
+        self.processes = []
+        self.turn = 0
+
+    def start(self):
+        self.processes = [
+            subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", str(port)],
+                             env=self.env, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+            for port in self.ports
+        ]
+        for process in self.processes:
+            for line in process.stdout:
+                if line.strip() == "ready":
+                    break
+            else:
+                raise RuntimeError("worker failed to start")
+
+    def stop(self):
+        for process in self.processes:
+            process.terminate()
+        for process in self.processes:
+            process.wait(timeout=10)
+        self.processes = []
+
+    def next_url(self):
+        """Base URL of the next worker in round-robin order."""
+        port = self.ports[self.turn % len(self.ports)]
+        self.turn += 1
+        return f"http://127.0.0.1:{port}"
+
+
+def check(condition, message):
+    print(f"  {'ok  ' if condition else 'FAIL'} {message}")
+    if not condition:
+        raise SystemExit(1)
+
+
+def user_ids(cluster, client, rounds):
+    return {client.get(f"{cluster.next_url()}/api/test").json()["session_id"] for _ in range(rounds)}
+
+
+def answer_across_workers(cluster, client):
+    """Fetch a question from one worker and answer it on the next; True if it was graded."""
+    question = client.get(f"{cluster.next_url()}/api/decimal1/practice/question").json()["question"]
+    result = client.post(f"{cluster.next_url()}/api/verify-answer",
+                         json={"answer": question["correct_letter"],
+                               "question_token": question.get("question_token")})
+    return result.status_code == 200 and result.json().get("is_correct") is True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=3)
+    parser.add_argument("--serve", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        serve(args.serve)
+        return
+
+    workdir = tempfile.mkdtemp(prefix="tutor-workers-")
+    env = dict(os.environ)
+    env.pop("LLM_API_KEY", None)
+    env.pop("SESSION_KEYS", None)
+    env.update({
+        "SESSION_BACKEND": "sqlite",
+        "SESSION_STORE_PATH": os.path.join(workdir, "sessions.sqlite3"),
+        "SESSION_KEY_FILE": os.path.join(workdir, "session_keys.json"),
+        "SESSION_KEY_CHECK_INTERVAL": "0",
+        "ATTEMPT_LOG_PATH": os.path.join(workdir, "attempts.sqlite3"),
+        "LOG_LEVEL": "WARNING",
+    })
+    os.environ.update(env)
+    from helpers.key_ring import KeyRing
+
+    cluster = Cluster(args.workers, env)
+    client = requests.Session()
+    rounds = 2 * args.workers
+    try:
+        print(f"{args.workers} workers, state in {workdir}")
+        cluster.start()
+        client.get(f"{cluster.next_url()}/rounding/intro")
+        ids = user_ids(cluster, client, rounds)
+        check(len(ids) == 1, f"one user id across {args.workers} workers: {ids}")
+        user_id = ids.pop()
+        check(answer_across_workers(cluster, client), "question served by one worker is graded by another")
+        stage = client.get(f"{cluster.next_url()}/api/current-stage").json()
+
+        print("restarting every worker")
+        cluster.stop()
+        cluster.start()
+        check(user_ids(cluster, client, rounds) == {user_id}, "user id unchanged after restart")
+        check(client.get(f"{cluster.next_url()}/api/current-stage").json() == stage,
+              "learning progress unchanged after restart")
+
+        print("rotating the session key")
+        old_cookie = client.cookies.get("session")
+        KeyRing(env["SESSION_KEY_FILE"], max_keys=3).rotate()
+        check(user_ids(cluster, client, rounds) == {user_id}, "cookie signed with the old key still accepted")
+        check(client.cookies.get("session") != old_cookie, "cookie re-issued under the new key")
+        check(answer_across_workers(cluster, client), "questions still verify after rotation")
+        client.cookies.set("session", old_cookie)
+        check(user_ids(cluster, client, 1) == {user_id}, "old cookie still accepted by a worker")
+    finally:
+        cluster.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+    print("all checks passed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,431 @@
+"""Fit the mastery model's BKT parameters from logged attempts.
+
+Reads QuestionResult-shaped records (user_id, seq, question_id, is_correct,
+topic) from the attempt log's SQLite file, or from JSON-lines / CSV exports
+with the same columns, in chunks into columnar NumPy arrays. Each attempt is
+tagged with its skills by models/mastery.skills_for_question (the number and
+decimal places come from the question id "rounding_<number>_<places>").
+
+Every skill is fitted by EM (Baum-Welch for the two-state BKT model) on one
+sequence per student: that student's attempts exercising the skill, in seq
+order. Sequences are laid out time-major, longest first, so step t of every
+sequence is one contiguous slice and each EM pass is a loop over steps with
+array arithmetic over all students at once. The (skill, restart) fits run in
+a process pool; the restart with the best log-likelihood is kept per skill.
+
+The result is a small JSON file for BKT_PARAMS_PATH. Skills with fewer than
+--min-attempts attempts are left out, so they keep config.BKT_PARAMS.
+
+--synthetic N fits N simulated attempts instead of reading logs, to time the
+fit at scale and check that it recovers the parameters behind the data: the
+run fails unless every fitted parameter is within --recovery-tolerance of
+config.BKT_PARAMS. The simulated students follow the per-skill model being
+fitted, each attempt being answered from one of its question's skills and
+tagged with that skill only. --write-synthetic saves the attempts as an
+attempt log; read back, they are tagged with all of their question's skills
+like real attempts, so such a log is for timing the reader, not for recovery.
+
+Usage: python scripts/fit_mastery.py instance/attempts.sqlite3 [-o instance/bkt_params.json]
+       python scripts/fit_mastery.py --synthetic 20000000 [--processes 8] [--recovery-tolerance 0.05]
+"""
+import argparse
+import csv
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from config import BKT_PARAMS, QUESTION_RULES, SKILLS
+from models.mastery import PARAM_NAMES, skills_for_question
+
+CHUNK_ROWS = 1 << 16
+# Slip and guess stay below this so "mastered" keeps meaning "more likely right"
+MAX_SLIP_GUESS = 0.45
+EPSILON = 1e-6
+
+
+class AttemptColumns:
+    """Attempts accumulated chunk by chunk: user index, seq, skill bit mask, correctness."""
+
+    def __init__(self):
+        self.user_index = {}
+        self.mask_cache = {}
+        self.chunks = []
+        self.skipped = 0
+
+    def skill_mask(self, question_id):
+        """Bit i set for SKILLS[i]; 0 for question ids that do not name a rounding question."""
+        mask = self.mask_cache.get(question_id)
+        if mask is None:
+            mask = 0
+            parts = question_id.rsplit("_", 2)
+            if len(parts) == 3 and parts[0] == "rounding":
+                try:
+                    for i in skills_for_question({"number": parts[1], "decimal_places": int(parts[2])}):
+                        mask |= 1 << i
+                except ValueError:
+                    mask = 0
+            self.mask_cache[question_id] = mask
+        return mask
+
+    def add(self, user_ids, seqs, question_ids, correct):
+        """Append one chunk given as parallel sequences."""
+        index = self.user_index
+        users = np.fromiter((index.setdefault(u, len(index)) for u in user_ids), np.int64, len(user_ids))
+        masks = np.fromiter(map(self.skill_mask, question_ids), np.uint8, len(question_ids))
+        keep = masks != 0
+        self.skipped += int(len(masks) - keep.sum())
+        self.chunks.append((users[keep], np.asarray(seqs, np.int64)[keep], masks[keep],
+                            np.asarray(correct, np.uint8)[keep]))
+
+    def columns(self):
+        if not self.chunks:
+            empty = np.empty(0, np.int64)
+            return empty, empty, empty.astype(np.uint8), empty.astype(np.uint8)
+        return tuple(np.concatenate(parts) for parts in zip(*self.chunks))
+
+
+def read_sqlite(path, columns):
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        cursor = conn.execute("SELECT user_id, seq, question_id, is_correct FROM attempts WHERE topic = 'rounding'")
+        while True:
+            rows = cursor.fetchmany(CHUNK_ROWS)
+            if not rows:
+                break
+            columns.add(*zip(*rows))
+    finally:
+        conn.close()
+
+
+def _read_records(records, columns):
+    batch = []
+    for record in records:
+        if record.get("topic", "rounding") != "rounding":
+            continue
+        correct = record["is_correct"]
+        if isinstance(correct, str):
+            correct = correct.strip().lower() in ("1", "true", "yes")
+        batch.append((record["user_id"], int(record["seq"]), record["question_id"], 1 if correct else 0))
+        if len(batch) == CHUNK_ROWS:
+            columns.add(*zip(*batch))
+            batch = []
+    if batch:
+        columns.add(*zip(*batch))
+
+
+def read_export(path, columns):
+    """Read a .jsonl or .csv export, or an attempt log SQLite file."""
+    if path.endswith(".jsonl"):
+        with open(path, encoding="utf-8") as f:
+            _read_records((json.loads(line) for line in f if line.strip()), columns)
+    elif path.endswith(".csv"):
+        with open(path, encoding="utf-8", newline="") as f:
+            _read_records(csv.DictReader(f), columns)
+    else:
+        read_sqlite(path, columns)
+
+
+def skill_sequences(users, seqs, masks, correct, skill, max_length):
+    """
+    Time-major layout of one skill's attempts.
+
+    Returns (observations, offsets): sequences are ranked longest first and
+    observations[offsets[t]:offsets[t + 1]] holds step t of every sequence
+    still running at t, in rank order. Sequences are cut at ``max_length``.
+    """
+    rows = np.flatnonzero(masks & (1 << skill))
+    if not len(rows):
+        return np.empty(0, np.uint8), np.zeros(1, np.int64)
+    order = rows[np.lexsort((seqs[rows], users[rows]))]
+    user = users[order]
+    starts = np.flatnonzero(np.r_[True, user[1:] != user[:-1]])
+    sequence = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, len(user)]))
+    position = np.arange(len(user)) - starts[sequence]
+    keep = position < max_length
+    order, sequence, position = order[keep], sequence[keep], position[keep]
+
+    lengths = np.bincount(sequence, minlength=len(starts))
+    rank = np.empty(len(starts), np.int64)
+    rank[np.argsort(-lengths, kind="stable")] = np.arange(len(starts))
+    offsets = np.r_[0, np.cumsum(np.bincount(position))]
+    observations = np.empty(len(order), np.uint8)
+    observations[offsets[position] + rank[sequence]] = correct[order]
+    return observations, offsets
+
+
+def expected_counts(observations, offsets, params):
+    """E step: log-likelihood and the expected counts the M step needs."""
+    p_init, p_transit, p_slip, p_guess = params
+    right = observations.astype(bool)
+    right_float = observations.astype(np.float64)
+    # Emission probabilities of each observation given mastered / not mastered
+    emit_known = np.where(right, 1 - p_slip, p_slip)
+    emit_unknown = np.where(right, p_guess, 1 - p_guess)
+    steps = len(offsets) - 1
+
+    filtered = np.empty(len(observations))
+    scale = np.empty(len(observations))
+    predicted = np.full(offsets[1] - offsets[0], p_init)
+    for t in range(steps):
+        a, b = offsets[t], offsets[t + 1]
+        predicted = predicted[:b - a]
+        known = predicted * emit_known[a:b]
+        total = known + (1 - predicted) * emit_unknown[a:b]
+        posterior = known / total
+        filtered[a:b] = posterior
+        scale[a:b] = total
+        predicted = posterior + (1 - posterior) * p_transit
+
+    known_total = known_wrong = unknown_total = unknown_right = 0.0
+    learned = could_learn = first_known = 0.0
+    back_known = back_unknown = np.ones(0)
+    for t in range(steps - 1, -1, -1):
+        a, b = offsets[t], offsets[t + 1]
+        count = b - a
+        # Sequences that end at step t start their backward pass here
+        back_known = np.r_[back_known, np.ones(count - len(back_known))]
+        back_unknown = np.r_[back_unknown, np.ones(count - len(back_unknown))]
+        gamma_known = filtered[a:b] * back_known
+        gamma_known /= gamma_known + (1 - filtered[a:b]) * back_unknown
+        gamma_unknown = 1 - gamma_known
+        known_sum = gamma_known.sum()
+        known_total += known_sum
+        known_wrong += known_sum - gamma_known @ right_float[a:b]
+        unknown_total += count - known_sum
+        unknown_right += gamma_unknown @ right_float[a:b]
+        if t == 0:
+            first_known = known_sum
+            break
+        # Transition from step t - 1 into step t, for the sequences still running at t
+        previous = offsets[t - 1]
+        carried_known = emit_known[a:b] * back_known / scale[a:b]
+        carried_unknown = emit_unknown[a:b] * back_unknown / scale[a:b]
+        was_unknown = 1 - filtered[previous:previous + count]
+        learned += (was_unknown * p_transit * carried_known).sum()
+        back_known = carried_known
+        back_unknown = p_transit * carried_known + (1 - p_transit) * carried_unknown
+        prior_known = filtered[previous:previous + count] * back_known
+        could_learn += (was_unknown * back_unknown / (prior_known + was_unknown * back_unknown)).sum()
+
+    return (np.log(scale).sum(), first_known, offsets[1] - offsets[0], learned, could_learn,
+            known_total, known_wrong, unknown_total, unknown_right)
+
+
+def fit_skill(task):
+    """Run EM for one (skill, starting parameters) task; returns the fit summary."""
+    skill, start, observations, offsets, max_iterations, tolerance = task
+    params = start
+    log_likelihood = previous = -np.inf
+    iterations = 0
+    for iterations in range(1, max_iterations + 1):
+        (log_likelihood, first_known, sequences, learned, could_learn,
+         known_total, known_wrong, unknown_total, unknown_right) = expected_counts(observations, offsets, params)
+        params = (
+            np.clip(first_known / sequences, EPSILON, 1 - EPSILON),
+            np.clip(learned / could_learn if could_learn else params[1], EPSILON, 1 - EPSILON),
+            np.clip(known_wrong / known_total if known_total else params[2], EPSILON, MAX_SLIP_GUESS),
+            np.clip(unknown_right / unknown_total if unknown_total else params[3], EPSILON, MAX_SLIP_GUESS),
+        )
+        if log_likelihood - previous < tolerance * abs(log_likelihood):
+            break
+        previous = log_likelihood
+    return skill, [float(p) for p in params], float(log_likelihood), iterations
+
+
+def starting_points(skill, restarts, rng):
+    """The configured parameters first, then random plausible ones."""
+    configured = BKT_PARAMS.get(skill)
+    starts = [tuple(configured[name] for name in PARAM_NAMES)] if configured else []
+    while len(starts) < restarts:
+        starts.append((rng.uniform(0.05, 0.6), rng.uniform(0.02, 0.4), rng.uniform(0.02, 0.2), rng.uniform(0.1, 0.35)))
+    return starts[:restarts]
+
+
+def fit(columns, processes, restarts, max_length, max_iterations, tolerance, min_attempts, seed):
+    users, seqs, masks, correct = columns
+    rng = random.Random(seed)
+    tasks, sizes = [], {}
+    for i, skill in enumerate(SKILLS):
+        observations, offsets = skill_sequences(users, seqs, masks, correct, i, max_length)
+        sizes[skill] = (len(observations), int(offsets[1] - offsets[0]) if len(offsets) > 1 else 0)
+        if len(observations) < min_attempts:
+            continue
+        tasks += [(skill, start, observations, offsets, max_iterations, tolerance)
+                  for start in starting_points(skill, restarts, rng)]
+
+    if processes > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(processes, len(tasks))) as pool:
+            results = list(pool.map(fit_skill, tasks))
+    else:
+        results = [fit_skill(task) for task in tasks]
+
+    fitted = {}
+    for skill, params, log_likelihood, iterations in results:
+        if skill not in fitted or log_likelihood > fitted[skill]["log_likelihood"]:
+            fitted[skill] = {**dict(zip(PARAM_NAMES, params)), "attempts": sizes[skill][0],
+                             "sequences": sizes[skill][1], "log_likelihood": log_likelihood,
+                             "iterations": iterations}
+    return {skill: fitted[skill] for skill in SKILLS if skill in fitted}, sizes
+
+
+def synthetic_attempts(attempts, per_student, truth, seed):
+    """
+    Simulated attempt columns plus their question ids.
+
+    Students answer random questions from the stage question rules. Each
+    attempt is answered from one of the question's skills, picked at random,
+    with that skill's BKT parameters: right with probability 1 - slip if it is
+    mastered and the guess probability if not, after which an unmastered skill
+    is learned with its transit probability. The attempt is tagged with that
+    skill alone, so every skill's sequence is exactly a BKT process.
+    """
+    from models.question_engine import QuestionEngine
+    engine = QuestionEngine()
+    question_rng = random.Random(seed)
+    pool = [engine.generate(stage, question_rng) for stage in QUESTION_RULES for _ in range(500)]
+    question_ids = np.array([f"rounding_{q['number']}_{q['decimal_places']}" for q in pool])
+    columns = AttemptColumns()
+    pool_masks = np.array([columns.skill_mask(qid) for qid in question_ids], np.uint8)
+
+    # For each skill mask, its skill indexes in order (padded) and how many there are
+    masks = range(1 << len(SKILLS))
+    skill_counts = np.array([bin(m).count("1") for m in masks])
+    nth_skill = np.array([[i for i in range(len(SKILLS)) if m & (1 << i)] + [0] * (len(SKILLS) - skill_counts[m])
+                          for m in masks])
+
+    rng = np.random.default_rng(seed)
+    students = -(-attempts // per_student)
+    p = {name: np.array([truth[skill][name] for skill in SKILLS]) for name in PARAM_NAMES}
+    known = rng.random((students, len(SKILLS))) < p["p_init"]
+    everyone = np.arange(students)
+
+    drawn = rng.integers(0, len(pool), (per_student, students))
+    answered_from = np.empty((per_student, students), np.int64)
+    correct = np.empty((per_student, students), np.uint8)
+    for t in range(per_student):
+        mask = pool_masks[drawn[t]]
+        skill = nth_skill[mask, (rng.random(students) * skill_counts[mask]).astype(np.int64)]
+        mastered = known[everyone, skill]
+        chance = np.where(mastered, 1 - p["p_slip"][skill], p["p_guess"][skill])
+        correct[t] = rng.random(students) < chance
+        known[everyone, skill] |= rng.random(students) < p["p_transit"][skill]
+        answered_from[t] = skill
+
+    users = np.tile(everyone, per_student)[:attempts]
+    seqs = np.repeat(np.arange(1, per_student + 1), students)[:attempts]
+    skill_masks = (np.uint8(1) << answered_from.reshape(-1)[:attempts].astype(np.uint8)).astype(np.uint8)
+    drawn = drawn.reshape(-1)[:attempts]
+    return (users, seqs, skill_masks, correct.reshape(-1)[:attempts]), question_ids[drawn]
+
+
+def recovery_errors(fitted, truth, tolerance):
+    """(skill, parameter, fitted, simulated) for every parameter off by more than ``tolerance``."""
+    return [(skill, name, values[name], truth[skill][name])
+            for skill, values in fitted.items() for name in PARAM_NAMES
+            if abs(values[name] - truth[skill][name]) > tolerance]
+
+
+def write_attempt_log(path, columns, question_ids):
+    """Save synthetic attempts in the attempt log's table layout."""
+    from services.attempt_log import AttemptLog
+    AttemptLog(path).close()
+    users, seqs, _, correct = columns
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO attempts VALUES (?, ?, 0, 'rounding', '', ?, ?, '', '', 0, NULL)",
+            zip(map(str, users.tolist()), seqs.tolist(), question_ids.tolist(), correct.tolist())
+        )
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="*", help="attempt log .sqlite3 files or .jsonl/.csv exports")
+    parser.add_argument("-o", "--output", help="parameter file to write (for BKT_PARAMS_PATH)")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--restarts", type=int, default=3, help="EM starting points per skill")
+    parser.add_argument("--max-length", type=int, default=200, help="attempts used per student and skill")
+    parser.add_argument("--max-iterations", type=int, default=100)
+    parser.add_argument("--tolerance", type=float, default=1e-7, help="stop when the relative gain is below this")
+    parser.add_argument("--min-attempts", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--synthetic", type=int, help="fit this many simulated attempts instead of inputs")
+    parser.add_argument("--per-student", type=int, default=40, help="attempts per simulated student")
+    parser.add_argument("--write-synthetic", help="also save the simulated attempts as an attempt log")
+    parser.add_argument("--recovery-tolerance", type=float, default=0.05,
+                        help="largest error allowed in a parameter recovered from --synthetic data")
+    args = parser.parse_args()
+    if not args.inputs and not args.synthetic:
+        parser.error("give attempt logs to read or --synthetic N")
+
+    start = time.perf_counter()
+    truth = None
+    if args.synthetic:
+        truth = BKT_PARAMS
+        columns, question_ids = synthetic_attempts(args.synthetic, args.per_student, truth, args.seed)
+        if args.write_synthetic:
+            write_attempt_log(args.write_synthetic, columns, question_ids)
+        source = f"{len(columns[0])} simulated attempts"
+    else:
+        reader = AttemptColumns()
+        for path in args.inputs:
+            read_export(path, reader)
+        columns = reader.columns()
+        source = (f"{len(columns[0])} attempts by {len(reader.user_index)} students "
+                  f"({reader.skipped} without rounding skills skipped)")
+    loaded = time.perf_counter()
+    print(f"{source}, loaded in {loaded - start:.1f}s")
+
+    fitted, sizes = fit(columns, args.processes, args.restarts, args.max_length, args.max_iterations,
+                        args.tolerance, args.min_attempts, args.seed)
+    print(f"fitted in {time.perf_counter() - loaded:.1f}s with {args.processes} processes")
+
+    print(f"{'skill':<14}{'attempts':>11}{'students':>10}" + "".join(f"{name:>11}" for name in PARAM_NAMES)
+          + f"{'iters':>7}")
+    for skill in SKILLS:
+        attempts, students = sizes[skill]
+        if skill not in fitted:
+            print(f"{skill:<14}{attempts:>11}{students:>10}  too few attempts, keeps config.BKT_PARAMS")
+            continue
+        values = fitted[skill]
+        row = f"{skill:<14}{attempts:>11}{students:>10}"
+        row += "".join(f"{values[name]:>11.3f}" for name in PARAM_NAMES) + f"{values['iterations']:>7}"
+        print(row)
+        if truth is not None:
+            print(f"{'  simulated':<35}" + "".join(f"{truth[skill][name]:>11.3f}" for name in PARAM_NAMES))
+
+    if args.output:
+        document = {
+            "fitted_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "source": source,
+            "skills": fitted,
+        }
+        directory = os.path.dirname(args.output)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(document, f, indent=2)
+        print(f"wrote {args.output}")
+
+    if truth is not None:
+        errors = recovery_errors(fitted, truth, args.recovery_tolerance)
+        for skill, name, value, simulated in errors:
+            print(f"not recovered: {skill}.{name} fitted {value:.3f}, simulated {simulated:.3f}")
+        if errors:
+            sys.exit(1)
+        print(f"every parameter recovered within {args.recovery_tolerance}")
+
+
+if __name__ == "__main__":
+    main()
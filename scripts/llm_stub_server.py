@@ -0,0 +1,69 @@
+"""Local stand-in for the LLM messages API, used by benchmarks and load tests."""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_REPLY = (
+    "You kept the rounding digit the same, but the digit after the cut off line "
+    "is 5 or more, so you need to round up. Add 1 to the rounding digit."
+)
+
+
+class StubLLMHandler(BaseHTTPRequestHandler):
+    """Answers every POST with an Anthropic-shaped messages response."""
+
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(length)
+
+        server = self.server
+        if server.latency:
+            time.sleep(random.uniform(server.latency * 0.5, server.latency * 1.5))
+
+        if server.error_rate and random.random() < server.error_rate:
+            status, body = 529, json.dumps({"error": {"type": "overloaded_error"}}).encode()
+        else:
+            status, body = 200, json.dumps({"content": [{"type": "text", "text": server.reply}]}).encode()
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(latency=0.0, error_rate=0.0, reply=STUB_REPLY, port=0):
+    """Start the stub on a background thread; returns (server, url)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), StubLLMHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.error_rate = error_rate
+    server.reply = reply
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1/messages"
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="mean response delay in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with 529")
+    args = parser.parse_args()
+
+    stub, url = start_stub_server(args.latency, args.error_rate, port=args.port)
+    print(f"Stub LLM API listening on {url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stub.shutdown()
@@ -0,0 +1,399 @@
+"""Drive the rounding lesson with a classroom of simulated students.
+
+Each virtual student walks the same flow as the browser: the intro and
+example pages, the decimal 1 and decimal 2 example endpoints,
+/api/next-step, the practice question endpoints and /api/verify-answer. They
+pick the correct choice with the probability given by their accuracy
+profile, otherwise a random wrong one. The LLM is replaced by the local stub
+from scripts/llm_stub_server.py with tunable latency and error rate.
+
+Requests go through Flask's test client by default, or over HTTP to a local
+threaded WSGI server with --wsgi. Reports throughput, p50/p95/p99 latency
+per endpoint, error rates and session bytes written to the session store.
+
+Usage:
+    python scripts/load_test.py [--students 60] [--concurrency 20]
+        [--profiles strong=0.95,average=0.75,struggling=0.45]
+        [--llm-latency 0.3] [--llm-error-rate 0.0] [--poll-feedback] [--wsgi]
+        [--json results.json]
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from scripts.llm_stub_server import start_stub_server
+
+LETTERS = ("A", "B", "C", "D")
+PRACTICE_QUESTION_APIS = {
+    "/rounding/practice": "/api/decimal1/practice/question",
+    "/rounding/decimal1/practice": "/api/decimal1/practice/question",
+    "/rounding/decimal2/practice": "/api/decimal2/practice/question",
+    "/rounding/decimal23/practice": "/api/decimal23/practice/question",
+}
+_TICKET_PATH = re.compile(r"^/api/feedback/[^/]+$")
+
+
+def parse_profiles(text):
+    """Parse ``name=accuracy,...`` into a list of (name, accuracy)."""
+    profiles = []
+    for part in text.split(","):
+        name, _, accuracy = part.partition("=")
+        profiles.append((name.strip(), float(accuracy)))
+    return profiles
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(fraction * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class Recorder:
+    """Thread-safe per-endpoint latency and error counts."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, seconds, failed):
+        with self._lock:
+            self.latencies[endpoint].append(seconds)
+            if failed:
+                self.errors[endpoint] += 1
+
+    def summary(self):
+        rows = {}
+        for endpoint, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            rows[endpoint] = {
+                "requests": len(values),
+                "errors": self.errors[endpoint],
+                "error_rate": self.errors[endpoint] / len(values),
+                "mean_ms": sum(values) / len(values) * 1000,
+                "p50_ms": percentile(values, 0.50) * 1000,
+                "p95_ms": percentile(values, 0.95) * 1000,
+                "p99_ms": percentile(values, 0.99) * 1000,
+            }
+        return rows
+
+
+class SessionSizeRecorder:
+    """Wraps a session store to record how many bytes each write stores."""
+
+    def __init__(self, store):
+        self.store = store
+        self.sizes = {}
+        self.writes = 0
+        self.bytes_written = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def set(self, key, payload):
+        with self._lock:
+            self.sizes[key] = len(payload)
+            self.writes += 1
+            self.bytes_written += len(payload)
+        self.store.set(key, payload)
+
+    def delete(self, key):
+        self.store.delete(key)
+
+    def __getattr__(self, name):
+        return getattr(self.store, name)
+
+
+class TestClientTransport:
+    """Sends requests through Flask's test client (no sockets)."""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, payload=None):
+        response = self.client.open(path, method=method, json=payload)
+        cookie = response.headers.get("Set-Cookie", "")
+        return response.status_code, response.get_json(silent=True), cookie
+
+
+class HTTPTransport:
+    """Sends requests over HTTP with a keep-alive requests.Session."""
+
+    def __init__(self, base_url):
+        import requests
+        self.base_url = base_url
+        self.session = requests.Session()
+
+    def request(self, method, path, payload=None):
+        response = self.session.request(method, self.base_url + path, json=payload, timeout=30)
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+        return response.status_code, body, response.headers.get("Set-Cookie", "")
+
+
+class VirtualStudent:
+    """One simulated student working through the lesson."""
+
+    def __init__(self, transport, recorder, accuracy, rng, max_steps, poll_feedback, think_time):
+        self.transport = transport
+        self.recorder = recorder
+        self.accuracy = accuracy
+        self.rng = rng
+        self.max_steps = max_steps
+        self.poll_feedback = poll_feedback
+        self.think_time = think_time
+        self.answers = 0
+        self.correct = 0
+        self.tickets = 0
+        self.cookie_bytes = 0
+        self.finished_at = None
+
+    def call(self, method, path, payload=None):
+        endpoint = "/api/feedback/<ticket>" if _TICKET_PATH.match(path) else path
+        start = time.perf_counter()
+        try:
+            status, body, cookie = self.transport.request(method, path, payload)
+            failed = status >= 400 or (isinstance(body, dict) and "error" in body)
+        except Exception:
+            status, body, cookie, failed = 0, None, "", True
+        self.recorder.record(endpoint, time.perf_counter() - start, failed)
+        if cookie:
+            self.cookie_bytes = max(self.cookie_bytes, len(cookie))
+        if self.think_time:
+            time.sleep(self.rng.uniform(0, 2 * self.think_time))
+        return body if isinstance(body, dict) else {}
+
+    def run(self):
+        self.call("GET", "/rounding/intro")
+        self.call("GET", "/rounding/examples")
+        self.decimal1_examples()
+
+        for _ in range(self.max_steps):
+            step = self.call("GET", "/api/next-step")
+            if step.get("step_type") == "complete":
+                self.finished_at = "complete"
+                return self
+            redirect = step.get("redirect")
+            if redirect is None:
+                if "question" not in step:
+                    return self
+                self.answer(step["question"])
+            elif redirect == "/rounding/examples":
+                self.decimal1_examples()
+            elif redirect == "/rounding/decimal2/examples":
+                self.decimal2_examples()
+            elif redirect in PRACTICE_QUESTION_APIS:
+                practice = self.call("GET", PRACTICE_QUESTION_APIS[redirect])
+                if practice.get("lesson_complete") or "question" not in practice:
+                    self.finished_at = "complete"
+                    return self
+                self.answer(practice["question"])
+            else:
+                # The stretch and completion pages have no further API flow
+                self.finished_at = redirect
+                return self
+        return self
+
+    def decimal1_examples(self):
+        self.call("GET", "/api/decimal1/examples/first")
+        self.call("POST", "/api/next-example")
+        self.call("GET", "/api/decimal1/examples/second")
+        self.call("POST", "/api/decimal1/examples/complete")
+
+    def decimal2_examples(self):
+        self.call("GET", "/api/decimal2/examples/first")
+        self.call("POST", "/api/next-example")
+        self.call("GET", "/api/decimal2/examples/second")
+        self.call("POST", "/api/decimal2/examples/complete")
+
+    def answer(self, question):
+        correct_letter = question.get("correct_letter")
+        if self.rng.random() < self.accuracy:
+            letter = correct_letter
+        else:
+            letter = self.rng.choice([choice for choice in LETTERS if choice != correct_letter])
+        payload = {"answer": letter}
+        if question.get("question_token"):
+            payload["question_token"] = question["question_token"]
+
+        result = self.call("POST", "/api/verify-answer", payload)
+        self.answers += 1
+        self.correct += bool(result.get("is_correct"))
+        ticket = result.get("feedback_ticket")
+        if ticket:
+            self.tickets += 1
+            if self.poll_feedback:
+                self.wait_for_feedback(ticket)
+
+    def wait_for_feedback(self, ticket, interval=0.1, timeout=10.0):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.call("GET", f"/api/feedback/{ticket}").get("status") != "pending":
+                return
+            time.sleep(interval)
+
+
+def silence_app_output():
+    """
+    Send the app's prints and log output to /dev/null for the rest of the run.
+
+    The formatting cost stays in the measurement; only the terminal I/O goes.
+    Background feedback threads keep logging after the students finish, so
+    this is not undone. The report is written to sys.__stdout__.
+    """
+    devnull = sys.stdout if sys.stdout is not sys.__stdout__ else open(os.devnull, "w")
+    sys.stdout = devnull
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, logging.StreamHandler):
+            handler.setStream(devnull)
+    # Once the app has configured logging, records are written by its queue listener
+    from helpers.logging_setup import set_stream
+    set_stream(devnull)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=60)
+    parser.add_argument("--concurrency", type=int, default=20, help="students active at once")
+    parser.add_argument("--profiles", default="strong=0.95,average=0.75,struggling=0.45",
+                        help="comma separated name=accuracy; students are assigned round-robin")
+    parser.add_argument("--max-steps", type=int, default=80, help="next-step calls per student")
+    parser.add_argument("--think-time", type=float, default=0.0, help="mean pause after each request (s)")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="mean stub LLM latency (s)")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--no-llm", action="store_true", help="leave LLM_API_KEY unset (template feedback only)")
+    parser.add_argument("--poll-feedback", action="store_true", help="poll /api/feedback/<ticket> after wrong answers")
+    parser.add_argument("--wsgi", action="store_true", help="go over HTTP to a local WSGI server")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--show-app-output", action="store_true", help="let app prints and logs through")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    stub = None
+    if not args.no_llm:
+        stub, url = start_stub_server(latency=args.llm_latency, error_rate=args.llm_error_rate)
+        os.environ["LLM_API_KEY"] = "load-test"
+        os.environ["LLM_API_URL"] = url
+    else:
+        os.environ.pop("LLM_API_KEY", None)
+
+    if not args.show_app_output:
+        silence_app_output()
+    from app import app
+    if not args.show_app_output:
+        # app.py installs its log handler on import
+        silence_app_output()
+    out = sys.__stdout__
+
+    interface = app.session_interface
+    size_recorder = None
+    if hasattr(interface, "store"):
+        size_recorder = interface.store = SessionSizeRecorder(interface.store)
+
+    server = None
+    if args.wsgi:
+        from werkzeug.serving import make_server
+        server = make_server("127.0.0.1", 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f"http://127.0.0.1:{server.server_port}"
+
+    profiles = parse_profiles(args.profiles)
+    recorder = Recorder()
+
+    def run_student(index):
+        name, accuracy = profiles[index % len(profiles)]
+        transport = HTTPTransport(base_url) if args.wsgi else TestClientTransport(app)
+        student = VirtualStudent(transport, recorder, accuracy, random.Random(args.seed * 100003 + index),
+                                 args.max_steps, args.poll_feedback, args.think_time)
+        return name, student.run()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        students = list(pool.map(run_student, range(args.students)))
+    elapsed = time.perf_counter() - start
+
+    if server is not None:
+        server.shutdown()
+    if stub is not None:
+        stub.shutdown()
+
+    endpoints = recorder.summary()
+    total_requests = sum(row["requests"] for row in endpoints.values())
+    total_errors = sum(row["errors"] for row in endpoints.values())
+    by_profile = defaultdict(lambda: {"students": 0, "answers": 0, "correct": 0, "finished": 0})
+    for name, student in students:
+        row = by_profile[name]
+        row["students"] += 1
+        row["answers"] += student.answers
+        row["correct"] += student.correct
+        row["finished"] += student.finished_at is not None
+
+    results = {
+        "students": args.students,
+        "concurrency": args.concurrency,
+        "transport": "wsgi" if args.wsgi else "test_client",
+        "elapsed_s": elapsed,
+        "requests": total_requests,
+        "throughput_rps": total_requests / elapsed if elapsed else 0.0,
+        "error_rate": total_errors / total_requests if total_requests else 0.0,
+        "endpoints": endpoints,
+        "profiles": dict(by_profile),
+        "feedback_tickets": sum(student.tickets for _, student in students),
+        "max_cookie_bytes": max((student.cookie_bytes for _, student in students), default=0),
+    }
+    if size_recorder is not None and size_recorder.sizes:
+        sizes = sorted(size_recorder.sizes.values())
+        results["session_store"] = {
+            "sessions": len(sizes),
+            "writes": size_recorder.writes,
+            "writes_per_request": size_recorder.writes / total_requests if total_requests else 0.0,
+            "mean_bytes": sum(sizes) / len(sizes),
+            "p95_bytes": percentile(sizes, 0.95),
+            "max_bytes": sizes[-1],
+            "bytes_written": size_recorder.bytes_written,
+        }
+
+    def emit(line):
+        out.write(line + "\n")
+
+    emit(f"{args.students} students, concurrency {args.concurrency}, {results['transport']}: "
+          f"{total_requests} requests in {elapsed:.2f}s = {results['throughput_rps']:.1f} req/s, "
+          f"error rate {results['error_rate']:.2%}")
+    emit(f"{'endpoint':<38}{'reqs':>7}{'err%':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for endpoint, row in endpoints.items():
+        emit(f"{endpoint:<38}{row['requests']:>7}{row['error_rate'] * 100:>7.1f}"
+              f"{row['p50_ms']:>9.2f}{row['p95_ms']:>9.2f}{row['p99_ms']:>9.2f}")
+    for name, row in results["profiles"].items():
+        accuracy = row["correct"] / row["answers"] if row["answers"] else 0.0
+        emit(f"profile {name:<12} students {row['students']:>4}  answers {row['answers']:>5}  "
+              f"accuracy {accuracy:.2f}  finished {row['finished']}")
+    if "session_store" in results:
+        store = results["session_store"]
+        emit(f"session store: {store['sessions']} sessions, mean {store['mean_bytes']:.0f} B, "
+              f"p95 {store['p95_bytes']} B, max {store['max_bytes']} B, "
+              f"{store['writes_per_request']:.2f} writes/request")
+    else:
+        emit(f"session cookie: max {results['max_cookie_bytes']} B")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,12 @@ File: services/ai_feedback_service.py
 
 from services.llm_service import LLMService
 from services.ai_context_builder import AIContextBuilder
+from services.conversation_memory import get_conversation_memory
+from services.feedback_cache import (
+    get_feedback_cache, build_fingerprint, to_template, render_template, is_cacheable
+)
 from helpers.session_helper import get_student_profile
+from typing import Optional
 import logging
 
 logger = logging.getLogger(__name__)
@@ -16,7 +21,8 @@ class AIFeedbackService:
     def __init__(self):
         self.llm_service = LLMService()
         self.context_builder = AIContextBuilder()
-        self.conversation_history = {}  # Session-based memory: {session_id: [messages]}
+        self.conversation_memory = get_conversation_memory()
+        self.response_cache = get_feedback_cache()
         
     def generate_feedback(self, question_data: dict, verification_steps: dict, 
                      misconception_data: dict, student_context: dict, 
@@ -35,6 +41,20 @@ class AIFeedbackService:
             AI-generated feedback string
         """
         
+        prompt = self.build_prompt(question_data, verification_steps, misconception_data, attempt_number)
+        ai_response = self.complete_prompt(prompt, misconception_data, session_id)
+        if ai_response is None:
+            return self._generate_fallback_feedback(misconception_data, verification_steps)
+        return ai_response
+
+    def build_prompt(self, question_data: dict, verification_steps: dict,
+                     misconception_data: dict, attempt_number: int = 1) -> dict:
+        """
+        Build the system and user prompts for a feedback request
+
+        Reads the student profile from the session, so it must run on the request thread.
+        """
+        
         # Build comprehensive context
         full_context = self.context_builder.build_feedback_context(
             question_data, 
@@ -43,22 +63,50 @@ class AIFeedbackService:
             misconception_data
         )
         
-        # Create the system prompt
-        system_prompt = self._build_system_prompt()
-        
-        # Create the user prompt with all context
-        user_prompt = self._build_user_prompt(full_context, misconception_data, attempt_number)
+        question_context = full_context["question_context"]
+        student_value = question_data.get("choices", {}).get(question_context["student_choice"], "")
+        is_struggling = full_context["learning_context"]["is_struggling"]
+
+        return {
+            "system": self._build_system_prompt(),
+            "user": self._build_user_prompt(full_context, misconception_data, attempt_number),
+            "cache_key": build_fingerprint(
+                misconception_data, verification_steps, student_value, is_struggling, attempt_number
+            ),
+            # Concrete numbers swapped for placeholders when a response is cached
+            "substitutions": {
+                "number": str(question_context["original_number"]),
+                "correct": str(verification_steps.get("correct_answer", "")),
+                "student": str(student_value)
+            },
+            # Numbers the fingerprint fixes; any other number keeps a response out of the cache
+            "pinned": [str(verification_steps.get(key, "")) for key in ("decimal_places", "target_digit", "right_digit")]
+        }
+
+    def complete_prompt(self, prompt: dict, misconception_data: dict, session_id: str) -> Optional[str]:
+        """
+        Send a prepared prompt to the LLM and record the exchange
+
+        Safe to call from a background thread. Returns None when the LLM call
+        fails or the response does not pass verification.
+        """
+        system_prompt = prompt["system"]
+        user_prompt = prompt["user"]
         
-        # Get or create conversation history for this session
-        if session_id not in self.conversation_history:
-            self.conversation_history[session_id] = []
+        cache_key = prompt.get("cache_key")
+        substitutions = prompt.get("substitutions", {})
+        if cache_key:
+            template = self.response_cache.get(cache_key)
+            if template is not None:
+                ai_response = render_template(template, substitutions)
+                # Re-check the rendered text, and let the LLM vary an explanation this student has already seen
+                if (self._verify_response(ai_response, misconception_data)
+                        and not self._already_given(session_id, ai_response)):
+                    self._record_exchange(session_id, user_prompt, ai_response)
+                    return ai_response
         
-        # Add current exchange to history
-        conversation = self.conversation_history[session_id].copy()
-        conversation.append({
-            "role": "user",
-            "content": user_prompt
-        })
+        # Earlier turns (older ones summarized) followed by the current prompt
+        conversation = self.conversation_memory.build_messages(session_id, user_prompt)
         
         # Get AI response
         try:
@@ -72,28 +120,31 @@ class AIFeedbackService:
             
             # Verify the response meets requirements
             if self._verify_response(ai_response, misconception_data):
-                # Add to conversation history for future context
-                self.conversation_history[session_id].append({
-                    "role": "user", 
-                    "content": user_prompt
-                })
-                self.conversation_history[session_id].append({
-                    "role": "assistant",
-                    "content": ai_response
-                })
-                
-                # Limit history to last 10 exchanges to prevent token overflow
-                if len(self.conversation_history[session_id]) > 20:
-                    self.conversation_history[session_id] = self.conversation_history[session_id][-20:]
+                self._record_exchange(session_id, user_prompt, ai_response)
+
+                # Only verified responses are shared with other students
+                if cache_key and is_cacheable(ai_response):
+                    template = to_template(ai_response, substitutions, prompt.get("pinned", ()))
+                    if template is not None:
+                        self.response_cache.put(cache_key, template)
                 
                 return ai_response
             else:
                 logger.warning("AI response failed verification, using fallback")
-                return self._generate_fallback_feedback(misconception_data, verification_steps)
+                return None
                 
         except Exception as e:
-            logger.error(f"AI feedback generation failed: {e}")
-            return self._generate_fallback_feedback(misconception_data, verification_steps)
+            logger.error("AI feedback generation failed: %s", e)
+            return None
+    
+    def _already_given(self, session_id: str, ai_response: str) -> bool:
+        """Whether this exact response is already in the student's conversation"""
+        messages = self.conversation_memory.get_history(session_id)["messages"]
+        return any(msg["role"] == "assistant" and msg["content"] == ai_response for msg in messages)
+
+    def _record_exchange(self, session_id: str, user_prompt: str, ai_response: str):
+        """Add an exchange to the conversation history for future context"""
+        self.conversation_memory.append_exchange(session_id, user_prompt, ai_response)
     
     def _build_system_prompt(self) -> str:
         """Build the system prompt that defines AI behavior"""
@@ -213,7 +264,7 @@ Your response should be ONLY the feedback text - no preamble, no meta-commentary
         # Check word count (roughly)
         word_count = len(response.split())
         if word_count > 120:  # Slightly over 100 to allow some flexibility
-            logger.warning(f"Response too long: {word_count} words")
+            logger.warning("Response too long: %d words", word_count)
             return False
         
         # Check for prohibited phrases
@@ -221,7 +272,7 @@ Your response should be ONLY the feedback text - no preamble, no meta-commentary
         response_lower = response.lower()
         for phrase in prohibited:
             if phrase in response_lower:
-                logger.warning(f"Response contains prohibited phrase: {phrase}")
+                logger.warning("Response contains prohibited phrase: %s", phrase)
                 return False
         
         # Verify it references the specific misconception type
@@ -236,7 +287,7 @@ Your response should be ONLY the feedback text - no preamble, no meta-commentary
         if misconception_type in key_terms:
             has_relevant_term = any(term in response_lower for term in key_terms[misconception_type])
             if not has_relevant_term:
-                logger.warning(f"Response doesn't address misconception type: {misconception_type}")
+                logger.warning("Response doesn't address misconception type: %s", misconception_type)
                 return False
         
         return True
@@ -268,22 +319,20 @@ Your response should be ONLY the feedback text - no preamble, no meta-commentary
     
     def clear_session_history(self, session_id: str):
         """Clear conversation history for a session"""
-        if session_id in self.conversation_history:
-            del self.conversation_history[session_id]
+        self.conversation_memory.clear(session_id)
     
     def get_session_history_summary(self, session_id: str) -> dict:
         """Get summary of conversation history for debugging"""
-        if session_id not in self.conversation_history:
-            return {"exchanges": 0, "history": []}
-        
-        history = self.conversation_history[session_id]
+        history = self.conversation_memory.get_history(session_id)
+        messages = history["messages"]
         return {
-            "exchanges": len(history) // 2,
+            "exchanges": len(messages) // 2 + len(history["summary"]),
+            "summary": history["summary"],
             "history": [
                 {
                     "role": msg["role"],
                     "preview": msg["content"][:100] + "..." if len(msg["content"]) > 100 else msg["content"]
                 }
-                for msg in history
+                for msg in messages
             ]
-        }
\ No newline at end of file
+        }
@@ -0,0 +1,314 @@
+"""
+Attempt Log - Append-only storage for every answered question
+File: services/attempt_log.py
+
+The session only carries the student profile's counters, so the per-question
+history lives here instead. Each QuestionResult becomes one row keyed by
+(user_id, seq), where seq is the profile's total_questions after the answer;
+the table is clustered on that key so reading a user's latest attempts is a
+single index range scan.
+
+Appends go into an in-memory tail (a bounded deque per user) straight away
+and are written to SQLite by a background thread in batches, so the request
+only pays for a deque append. Recent-window queries read the tail and never
+touch the file unless the tail is missing or behind the session's counters
+(the user was last served by another worker process).
+"""
+
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import List, Optional
+
+from config import (
+    ATTEMPT_LOG_PATH, ATTEMPT_LOG_TAIL_SIZE, ATTEMPT_LOG_MAX_USERS,
+    ATTEMPT_LOG_BATCH_SIZE, ATTEMPT_LOG_FLUSH_INTERVAL
+)
+from models.student_profile import QuestionResult
+
+_COLUMNS = ("user_id, seq, ts, topic, stage, question_id, is_correct, "
+            "student_answer, correct_answer, response_time, misconception")
+
+
+def _to_row(user_id: str, seq: int, result: QuestionResult) -> tuple:
+    return (
+        user_id, seq, result.timestamp.timestamp(), result.topic, result.stage, result.question_id,
+        1 if result.is_correct else 0, result.student_answer, result.correct_answer,
+        result.response_time_seconds, result.misconception_type
+    )
+
+
+def _from_row(row) -> QuestionResult:
+    _, _, ts, topic, stage, question_id, is_correct, student_answer, correct_answer, response_time, misconception = row
+    return QuestionResult(
+        question_id=question_id,
+        stage=stage,
+        topic=topic,
+        is_correct=bool(is_correct),
+        student_answer=student_answer,
+        correct_answer=correct_answer,
+        response_time_seconds=response_time,
+        misconception_type=misconception,
+        timestamp=datetime.fromtimestamp(ts)
+    )
+
+
+class _Tail:
+    """The most recent attempts for one user"""
+
+    __slots__ = ("results", "seq", "unflushed")
+
+    def __init__(self, results, seq):
+        self.results = results
+        self.seq = seq          # seq of the newest attempt seen by this process
+        self.unflushed = 0      # appended here but not yet committed to the file
+
+
+class AttemptLog:
+    """Append-only attempt store with batched background writes and per-user tails"""
+
+    def __init__(self, sqlite_path: Optional[str] = None, tail_size: int = 50, max_users: int = 10000,
+                 batch_size: int = 256, flush_interval: float = 0.5):
+        self.path = sqlite_path
+        self.tail_size = tail_size
+        self.max_users = max_users
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._tails = OrderedDict()  # user_id -> _Tail, least recently used first
+        self._lock = threading.Lock()
+        self._buffer = []            # (user_id, row) waiting for the writer
+        self._wake = threading.Condition(self._lock)
+        self._flushed = threading.Condition(self._lock)
+        self._writer = None
+        self._closed = False
+        self._local = threading.local()
+
+        self.appended = 0
+        self.written = 0
+        self.batches = 0
+        self.hydrations = 0
+        self.write_errors = 0
+
+        if self.path:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._connect().execute(
+                "CREATE TABLE IF NOT EXISTS attempts ("
+                "user_id TEXT NOT NULL, seq INTEGER NOT NULL, ts REAL NOT NULL, "
+                "topic TEXT NOT NULL, stage TEXT NOT NULL, question_id TEXT NOT NULL, "
+                "is_correct INTEGER NOT NULL, student_answer TEXT NOT NULL, correct_answer TEXT NOT NULL, "
+                "response_time REAL NOT NULL, misconception TEXT, "
+                "PRIMARY KEY (user_id, seq)) WITHOUT ROWID"
+            )
+
+    def append(self, user_id: str, seq: int, result: QuestionResult):
+        """
+        Record one attempt
+
+        Args:
+            user_id: Session user id
+            seq: The profile's total_questions including this attempt
+            result: The attempt itself
+        """
+        with self._lock:
+            tail = self._tails.get(user_id)
+            if tail is None:
+                tail = self._tails[user_id] = _Tail(deque(maxlen=self.tail_size), 0)
+            else:
+                self._tails.move_to_end(user_id)
+            tail.results.append(result)
+            tail.seq = seq
+            self.appended += 1
+
+            if self.path:
+                tail.unflushed += 1
+                self._buffer.append((user_id, _to_row(user_id, seq, result)))
+                self._start_writer()
+                if len(self._buffer) == 1 or len(self._buffer) >= self.batch_size:
+                    self._wake.notify()
+            self._enforce_limits()
+
+    def recent(self, user_id: str, expected_seq: Optional[int] = None) -> List[QuestionResult]:
+        """
+        Return up to ``tail_size`` of the user's latest attempts, oldest first
+
+        ``expected_seq`` is the attempt count the caller's session reports. A
+        tail that is missing or behind it is reloaded from the file.
+        """
+        with self._lock:
+            tail = self._tails.get(user_id)
+            if tail is not None and (expected_seq is None or tail.seq >= expected_seq):
+                self._tails.move_to_end(user_id)
+                return list(tail.results)
+        if not expected_seq or not self.path:
+            return list(tail.results) if tail is not None else []
+
+        # Another worker wrote these attempts; make sure our own are on disk before reading
+        if tail is not None and tail.unflushed:
+            self.flush()
+        rows = self._connect().execute(
+            f"SELECT {_COLUMNS} FROM attempts WHERE user_id = ? ORDER BY seq DESC LIMIT ?",
+            (user_id, self.tail_size)
+        ).fetchall()
+        results = deque((_from_row(row) for row in reversed(rows)), maxlen=self.tail_size)
+        seq = rows[0][1] if rows else 0
+
+        with self._lock:
+            self.hydrations += 1
+            current = self._tails.get(user_id)
+            if current is not None and current.seq > seq:
+                # An append landed while we were reading; keep the newer tail
+                return list(current.results)
+            unflushed = current.unflushed if current is not None else 0
+            tail = self._tails[user_id] = _Tail(results, seq)
+            tail.unflushed = unflushed
+            self._tails.move_to_end(user_id)
+            self._enforce_limits()
+            return list(results)
+
+    def history(self, user_id: str, limit: Optional[int] = None) -> List[QuestionResult]:
+        """Read a user's full history (or the last ``limit`` attempts) from the file"""
+        if not self.path:
+            return self.recent(user_id)[-limit:] if limit else self.recent(user_id)
+        self.flush()
+        query = f"SELECT {_COLUMNS} FROM attempts WHERE user_id = ? ORDER BY seq DESC"
+        params = (user_id,)
+        if limit:
+            query += " LIMIT ?"
+            params += (limit,)
+        rows = self._connect().execute(query, params).fetchall()
+        return [_from_row(row) for row in reversed(rows)]
+
+    def forget(self, user_id: str):
+        """Drop the in-memory tail for a user; the file keeps their attempts"""
+        with self._lock:
+            tail = self._tails.get(user_id)
+            if tail is not None and not tail.unflushed:
+                del self._tails[user_id]
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Block until everything appended so far is committed; returns False on timeout"""
+        if not self.path:
+            return True
+        deadline = time.time() + timeout
+        with self._lock:
+            target = self.appended
+            self._wake.notify()
+            while self.written + self.write_errors < target and not self._closed:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self._flushed.wait(remaining)
+        return True
+
+    def close(self):
+        """Flush pending attempts and stop the writer thread"""
+        self.flush()
+        with self._lock:
+            self._closed = True
+            self._wake.notify()
+        if self._writer is not None:
+            self._writer.join(timeout=5)
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "users": len(self._tails),
+                "tail_records": sum(len(tail.results) for tail in self._tails.values()),
+                "pending": len(self._buffer),
+                "appended": self.appended,
+                "written": self.written,
+                "batches": self.batches,
+                "hydrations": self.hydrations,
+                "write_errors": self.write_errors
+            }
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _start_writer(self):
+        # Caller holds the lock
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_loop, name="attempt-log-writer", daemon=True)
+            self._writer.start()
+            atexit.register(self.close)
+
+    def _write_loop(self):
+        conn = self._connect()
+        while True:
+            with self._lock:
+                while not self._buffer and not self._closed:
+                    self._wake.wait()
+                if not self._buffer and self._closed:
+                    return
+                if len(self._buffer) < self.batch_size and not self._closed:
+                    # Let a batch build up, but never hold attempts back longer than flush_interval
+                    self._wake.wait(self.flush_interval)
+                batch, self._buffer = self._buffer, []
+
+            try:
+                conn.execute("BEGIN")
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO attempts ({_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [row for _, row in batch]
+                )
+                conn.execute("COMMIT")
+                failed = False
+            except sqlite3.Error:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                failed = True
+
+            with self._lock:
+                if failed:
+                    self.write_errors += len(batch)
+                else:
+                    self.written += len(batch)
+                    self.batches += 1
+                for user_id, _ in batch:
+                    tail = self._tails.get(user_id)
+                    if tail is not None and tail.unflushed:
+                        tail.unflushed -= 1
+                self._enforce_limits()
+                self._flushed.notify_all()
+
+    def _enforce_limits(self):
+        # Caller holds the lock. Tails with unwritten attempts stay so a reload cannot miss them.
+        if len(self._tails) <= self.max_users:
+            return
+        for user_id in list(self._tails):
+            if len(self._tails) <= self.max_users:
+                break
+            if not self._tails[user_id].unflushed:
+                del self._tails[user_id]
+
+
+_attempt_log = None
+_attempt_log_lock = threading.Lock()
+
+
+def get_attempt_log() -> AttemptLog:
+    """Return the process-wide attempt log"""
+    global _attempt_log
+    with _attempt_log_lock:
+        if _attempt_log is None:
+            _attempt_log = AttemptLog(
+                sqlite_path=ATTEMPT_LOG_PATH or None,
+                tail_size=ATTEMPT_LOG_TAIL_SIZE,
+                max_users=ATTEMPT_LOG_MAX_USERS,
+                batch_size=ATTEMPT_LOG_BATCH_SIZE,
+                flush_interval=ATTEMPT_LOG_FLUSH_INTERVAL
+            )
+        return _attempt_log
@@ -1,9 +1,17 @@
 """Provides explanations and feedback for rounding questions with integrated motivational messaging."""
 
+import logging
+
 from services.motivational_service import MotivationalService
 from services.ai_feedback_service import AIFeedbackService  # NEW LINE
+from services.deferred_feedback import get_feedback_dispatcher
+from config import AI_FEEDBACK_MODE
+from helpers.instrumentation import span, timed
+from models.rounding_kernel import analyze_text, compare, parse
 import os  # NEW LINE
 
+logger = logging.getLogger(__name__)
+
 class ContentService:
     """Handles generation of explanations and feedback for rounding questions."""
     
@@ -65,15 +73,38 @@ class ContentService:
 
     def get_feedback(self, question, verification_steps, is_correct, misconception_data=None, student_context=None, session_id=None):
         """Gets feedback for a student's answer with enhanced formatting and motivational messaging."""
+        feedback, _ = self._build_feedback(
+            question, verification_steps, is_correct, misconception_data, student_context, session_id, defer_ai=False
+        )
+        return feedback
+
+    def get_feedback_deferred(self, question, verification_steps, is_correct, misconception_data=None, student_context=None, session_id=None):
+        """
+        Gets feedback without waiting for the LLM.
+
+        Returns (feedback, ticket). When AI feedback is warranted the template
+        feedback is returned at once and the AI explanation is queued; ticket is
+        then the id to poll, otherwise (or when the queue is full) None. Falls
+        back to the synchronous path when AI_FEEDBACK_MODE is "sync".
+        """
+        return self._build_feedback(
+            question, verification_steps, is_correct, misconception_data, student_context, session_id,
+            defer_ai=AI_FEEDBACK_MODE == "async"
+        )
+
+    def _build_feedback(self, question, verification_steps, is_correct, misconception_data, student_context, session_id, defer_ai):
+        """Shared implementation of get_feedback and get_feedback_deferred."""
         
         # CRITICAL FIX: Ensure feedback uses the correct question data
         expected_number = question["original_question"]["number"]
         if verification_steps["original_number"] != expected_number:
-            print(f"ERROR: Feedback using wrong number - expected {expected_number}, got {verification_steps['original_number']}")
+            logger.error("Feedback using wrong number - expected %s, got %s",
+                         expected_number, verification_steps["original_number"])
             # Fix the mismatch
             verification_steps["original_number"] = expected_number
         
         student_answer = question.get("student_answer", "")
+        deferred_prompt = None
         
         if is_correct:
             # Generate positive mathematical feedback - CONCISE
@@ -94,49 +125,75 @@ class ContentService:
                 attempt_number >= 2):  # NEW CONDITION
                 
                 try:
-                    print(f"DEBUG: Using AI feedback (attempt #{attempt_number} for {misconception_type})")
-                    mathematical_feedback = self.ai_feedback_service.generate_feedback(
-                        question_data=question,
-                        verification_steps=verification_steps,
-                        misconception_data=misconception_data,
-                        student_context=student_context or {},
-                        session_id=session_id
-                    )
+                    if defer_ai:
+                        logger.debug("Deferring AI feedback (attempt #%d for %s)", attempt_number, misconception_type)
+                        # Build the prompt now - it needs the request's session
+                        deferred_prompt = self.ai_feedback_service.build_prompt(
+                            question, verification_steps, misconception_data, attempt_number
+                        )
+                        mathematical_feedback = self._generate_template_feedback(
+                            question, verification_steps, misconception_data
+                        )
+                    else:
+                        logger.debug("Using AI feedback (attempt #%d for %s)", attempt_number, misconception_type)
+                        mathematical_feedback = self.ai_feedback_service.generate_feedback(
+                            question_data=question,
+                            verification_steps=verification_steps,
+                            misconception_data=misconception_data,
+                            student_context=student_context or {},
+                            session_id=session_id,
+                            attempt_number=attempt_number
+                        )
                 except Exception as e:
-                    print(f"AI feedback failed, using fallback: {e}")
+                    logger.warning("AI feedback failed, using fallback: %s", e)
+                    deferred_prompt = None
                     mathematical_feedback = self._generate_template_feedback(
                         question, verification_steps, misconception_data
                     )
             else:
                 # First attempt or AI disabled - use template
                 if attempt_number == 1:
-                    print(f"DEBUG: Using template feedback (first attempt)")
+                    logger.debug("Using template feedback (first attempt)")
                 else:
-                    print(f"DEBUG: Using template feedback (AI disabled)")
+                    logger.debug("Using template feedback (AI disabled)")
                 mathematical_feedback = self._generate_template_feedback(
                     question, verification_steps, misconception_data
                 )
 
         # Add motivational messaging if student context is provided
+        motivational_template = "{mathematical_feedback}"
         if student_context:
             # Get misconception type for targeted support
             misconception_type = misconception_data.get('type') if misconception_data else None
             
             # Get motivational template from the motivational service
-            motivational_template = self.motivational_service.get_motivational_context(
-                is_correct, student_context, misconception_type
-            )
-            
-            # Combine mathematical feedback with motivational messaging
-            enhanced_feedback = motivational_template.format(
-                mathematical_feedback=mathematical_feedback
-            )
-            
-            return enhanced_feedback.strip()
-        else:
-            # Fallback to plain mathematical feedback if no student context
-            return mathematical_feedback.strip()
+            with span("motivational_templating"):
+                motivational_template = self.motivational_service.get_motivational_context(
+                    is_correct, student_context, misconception_type
+                )
+        
+        # Combine mathematical feedback with motivational messaging
+        feedback = motivational_template.format(mathematical_feedback=mathematical_feedback).strip()
+        
+        ticket = None
+        if deferred_prompt is not None:
+            ticket = self._queue_ai_feedback(deferred_prompt, misconception_data, session_id, motivational_template)
+        
+        return feedback, ticket
 
+    def _queue_ai_feedback(self, prompt, misconception_data, session_id, motivational_template):
+        """Run the LLM call in the background; the result keeps the same motivational wrapper."""
+        ai_feedback_service = self.ai_feedback_service
+        
+        def job():
+            ai_response = ai_feedback_service.complete_prompt(prompt, misconception_data, session_id)
+            if ai_response is None:
+                return None
+            return motivational_template.format(mathematical_feedback=ai_response).strip()
+        
+        return get_feedback_dispatcher().submit(session_id, job)
+
+    @timed("template_feedback")
     def _generate_template_feedback(self, question, verification_steps, misconception_data):
         """Generate template-based feedback (existing logic)"""
         if misconception_data and isinstance(misconception_data, dict):
@@ -174,19 +231,18 @@ class ContentService:
         elif len(student_choice.split('.')[-1]) == decimal_places:
             # Student has right number of decimal places but wrong value - likely direction error
             try:
-                student_num = float(student_choice)
-                correct_num = float(correct_answer)
+                direction = compare(parse(student_choice), parse(correct_answer))
                 
-                if student_num > correct_num:
+                if direction > 0:
                     # Student rounded up when should round down
                     feedback = f"""You correctly identified the {decimal_places}{self._get_ordinal_suffix(decimal_places)} decimal place digit ({target_digit}), but when the next digit is {next_digit} (which is less than 5), you should keep the digit the same. The correct answer is {correct_answer}."""
-                elif student_num < correct_num:
+                elif direction < 0:
                     # Student rounded down when should round up
-                    feedback = f"""You correctly identified the {decimal_places}{self._get_ordinal_suffix(decimal_places)} decimal place digit ({target_digit}), but when the next digit is {next_digit} (which is 5 or greater), you should round up. The {target_digit} becomes {int(target_digit) + 1}. The correct answer is {correct_answer}."""
+                    feedback = f"""You correctly identified the {decimal_places}{self._get_ordinal_suffix(decimal_places)} decimal place digit ({target_digit}), but when the next digit is {next_digit} (which is 5 or greater), you should round up. {self._describe_round_up(original_number, decimal_places)} The correct answer is {correct_answer}."""
                 else:
                     # Same value but different representation? Shouldn't happen but fallback
                     feedback = self._generate_generic_feedback(question, verification_steps)
-            except:
+            except ValueError:
                 feedback = self._generate_generic_feedback(question, verification_steps)
                 
         # Check for wrong number of decimal places
@@ -225,10 +281,26 @@ class ContentService:
         ordinal = self._get_ordinal_suffix(decimal_places)
         
         # Mathematically accurate generic feedback
-        feedback = f"""To round {original_number} to {decimal_places} decimal place{'s' if decimal_places > 1 else ''}: identify the {decimal_places}{ordinal} decimal place digit ({target_digit}), then look at the next digit ({next_digit}). Since {next_digit} is {'5 or greater' if should_round_up else 'less than 5'}, you {'round the {target_digit} up to {int(target_digit) + 1}' if should_round_up else 'keep the {target_digit} the same'}. The correct answer is {correct_answer}."""
+        action = f"round up. {self._describe_round_up(original_number, decimal_places)}" if should_round_up else f"keep the {target_digit} the same."
+        feedback = f"""To round {original_number} to {decimal_places} decimal place{'s' if decimal_places > 1 else ''}: identify the {decimal_places}{ordinal} decimal place digit ({target_digit}), then look at the next digit ({next_digit}). Since {next_digit} is {'5 or greater' if should_round_up else 'less than 5'}, you {action} The correct answer is {correct_answer}."""
         
         return feedback
 
+    def _describe_round_up(self, original_number, decimal_places):
+        """Describe what happens to the rounding digit, including carrying through nines."""
+        facts = analyze_text(original_number, decimal_places)
+        carry = facts.carry_digits
+        if not carry:
+            return f"The {facts.target_digit} becomes {facts.target_digit + 1}."
+
+        nines = "The 9 becomes 0" if carry == 1 else f"Each of the {carry} nines becomes 0"
+        # Digits kept up to the rounding position, as written (0.996 has the leading 0)
+        written_digits = len(original_number.partition('.')[0].lstrip('-')) + decimal_places
+        if carry >= written_digits:
+            return f"{nines} and the 1 carried to the left becomes a new digit in front."
+        left_digit = facts.truncated // 10 ** carry % 10
+        return f"{nines} and 1 is carried to the next digit on the left, so the {left_digit} becomes {left_digit + 1}."
+
     def _get_ordinal_suffix(self, n):
         """Return the ordinal suffix for a number."""
         if n == 1:
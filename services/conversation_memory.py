@@ -0,0 +1,234 @@
+"""
+Conversation Memory - Bounded per-session history for AI feedback prompts
+File: services/conversation_memory.py
+
+Keeps the most recent exchanges verbatim and folds older ones into a single
+summary so prompt size stays bounded. Sessions are evicted after an idle
+timeout or when the global session/byte limits are reached. An optional
+SQLite file lets every worker process share the same histories and keeps
+them across restarts.
+"""
+
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Optional
+
+from config import (
+    CONVERSATION_MEMORY_MAX_SESSIONS, CONVERSATION_MEMORY_MAX_BYTES,
+    CONVERSATION_MEMORY_IDLE_TTL, CONVERSATION_MEMORY_MAX_MESSAGES, CONVERSATION_MEMORY_PATH
+)
+from helpers.session_store import SQLiteSessionStore
+
+SUMMARY_HEADER = "Summary of earlier feedback in this session:"
+MAX_SUMMARY_LINES = 6
+_SECTION = re.compile(r"WHAT WENT WRONG:\s*\n(.+)")
+_QUESTION = re.compile(r"QUESTION:\s*(.+)")
+
+
+def _clip(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit - 3].rstrip() + "..."
+
+
+def summarize_exchange(user_content: str, assistant_content: str) -> str:
+    """Condense one prompt/response pair into a single summary line"""
+    question = _QUESTION.search(user_content)
+    mistake = _SECTION.search(user_content)
+    if question or mistake:
+        asked = _clip(question.group(1), 80) if question else ""
+        did = _clip(mistake.group(1), 100) if mistake else ""
+        prompt_part = f"{asked} - {did}" if asked and did else asked or did
+    else:
+        prompt_part = _clip(user_content, 120)
+
+    # The first sentence of the explanation is enough to know which approach was tried
+    explanation = re.split(r"(?<=[.!])\s", assistant_content.strip(), maxsplit=1)[0]
+    return f"- {prompt_part} | explained: {_clip(explanation, 140)}"
+
+
+class _Conversation:
+    """History for one session"""
+
+    __slots__ = ("summary", "messages", "last_access", "size")
+
+    def __init__(self, summary=None, messages=None, last_access=None):
+        self.summary = summary or []
+        self.messages = messages or []
+        self.last_access = last_access or time.time()
+        self.size = 0
+        self.measure()
+
+    def measure(self):
+        self.size = (sum(len(line.encode("utf-8")) for line in self.summary) +
+                     sum(len(msg["content"].encode("utf-8")) for msg in self.messages))
+        return self.size
+
+    def to_bytes(self) -> bytes:
+        return json.dumps({
+            "summary": self.summary, "messages": self.messages, "last_access": self.last_access
+        }).encode("utf-8")
+
+    @classmethod
+    def from_bytes(cls, payload: bytes):
+        data = json.loads(payload)
+        return cls(data.get("summary"), data.get("messages"), data.get("last_access"))
+
+
+class ConversationMemory:
+    """Per-session conversation history with summarization and eviction"""
+
+    def __init__(self, max_sessions: int = 2000, max_bytes: int = 16 * 1024 * 1024,
+                 idle_ttl_seconds: int = 3600, max_messages: int = 8,
+                 sqlite_path: Optional[str] = None):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.idle_ttl_seconds = idle_ttl_seconds
+        # Always keep at least one full exchange verbatim
+        self.max_messages = max(2, max_messages - max_messages % 2)
+        self.store = SQLiteSessionStore(sqlite_path) if sqlite_path else None
+
+        self._sessions = OrderedDict()  # session_id -> _Conversation, least recently used first
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def build_messages(self, session_id: str, user_prompt: str) -> List[dict]:
+        """
+        Return the messages to send for a new prompt
+
+        The summary of older turns is merged into the first user message so
+        roles keep alternating user/assistant as the messages API requires.
+        """
+        with self._lock:
+            conversation = self._load(session_id)
+            summary = list(conversation.summary) if conversation else []
+            messages = [dict(msg) for msg in conversation.messages] if conversation else []
+
+        messages.append({"role": "user", "content": user_prompt})
+        if summary:
+            messages[0]["content"] = "\n".join([SUMMARY_HEADER] + summary) + "\n\n" + messages[0]["content"]
+        return messages
+
+    def append_exchange(self, session_id: str, user_content: str, assistant_content: str):
+        """Record a prompt/response pair, summarizing turns beyond the verbatim window"""
+        with self._lock:
+            conversation = self._load(session_id)
+            if conversation is None:
+                conversation = _Conversation()
+                self._sessions[session_id] = conversation
+            else:
+                self._bytes -= conversation.size
+
+            conversation.messages.append({"role": "user", "content": user_content})
+            conversation.messages.append({"role": "assistant", "content": assistant_content})
+            while len(conversation.messages) > self.max_messages:
+                old_user, old_assistant = conversation.messages[:2]
+                del conversation.messages[:2]
+                conversation.summary.append(summarize_exchange(old_user["content"], old_assistant["content"]))
+            del conversation.summary[:-MAX_SUMMARY_LINES]
+
+            conversation.last_access = time.time()
+            self._bytes += conversation.measure()
+            self._enforce_limits()
+            payload = conversation.to_bytes() if self.store else None
+            self._writes += 1
+            purge = self.store is not None and self._writes % 500 == 0
+
+        if payload is not None:
+            self.store.set(session_id, payload)
+            if purge:
+                self.store.purge_older_than(self.idle_ttl_seconds)
+
+    def clear(self, session_id: str):
+        """Forget a session's history"""
+        with self._lock:
+            conversation = self._sessions.pop(session_id, None)
+            if conversation is not None:
+                self._bytes -= conversation.size
+        if self.store:
+            self.store.delete(session_id)
+
+    def get_history(self, session_id: str) -> dict:
+        """Return the summary lines and verbatim messages for a session"""
+        with self._lock:
+            conversation = self._load(session_id)
+            if conversation is None:
+                return {"summary": [], "messages": []}
+            return {"summary": list(conversation.summary), "messages": list(conversation.messages)}
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "bytes": self._bytes,
+                "evictions": self.evictions,
+                "expirations": self.expirations
+            }
+
+    def _load(self, session_id: str) -> Optional[_Conversation]:
+        """Fetch a live conversation, expiring idle ones (caller holds the lock)"""
+        now = time.time()
+        self._expire_idle(now)
+
+        conversation = self._sessions.get(session_id)
+        if self.store:
+            # The shared file is authoritative; another worker may have appended since
+            payload = self.store.get(session_id)
+            if conversation is not None:
+                del self._sessions[session_id]
+                self._bytes -= conversation.size
+                conversation = None
+            if payload is not None:
+                conversation = _Conversation.from_bytes(payload)
+                if now - conversation.last_access > self.idle_ttl_seconds:
+                    return None
+                self._sessions[session_id] = conversation
+                self._bytes += conversation.size
+                self._enforce_limits()
+        if conversation is None:
+            return None
+
+        self._sessions.move_to_end(session_id)
+        conversation.last_access = now
+        return conversation
+
+    def _expire_idle(self, now: float):
+        # Least recently used sessions sit at the front, so stop at the first live one
+        while self._sessions:
+            session_id, conversation = next(iter(self._sessions.items()))
+            if now - conversation.last_access <= self.idle_ttl_seconds:
+                break
+            del self._sessions[session_id]
+            self._bytes -= conversation.size
+            self.expirations += 1
+
+    def _enforce_limits(self):
+        while len(self._sessions) > 1 and (
+                len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes):
+            _, conversation = self._sessions.popitem(last=False)
+            self._bytes -= conversation.size
+            self.evictions += 1
+
+
+_memory = None
+_memory_lock = threading.Lock()
+
+
+def get_conversation_memory() -> ConversationMemory:
+    """Return the process-wide conversation memory"""
+    global _memory
+    with _memory_lock:
+        if _memory is None:
+            _memory = ConversationMemory(
+                max_sessions=CONVERSATION_MEMORY_MAX_SESSIONS,
+                max_bytes=CONVERSATION_MEMORY_MAX_BYTES,
+                idle_ttl_seconds=CONVERSATION_MEMORY_IDLE_TTL,
+                max_messages=CONVERSATION_MEMORY_MAX_MESSAGES,
+                sqlite_path=CONVERSATION_MEMORY_PATH or None
+            )
+        return _memory
@@ -0,0 +1,170 @@
+"""
+Deferred Feedback - Runs slow AI feedback requests off the request thread
+File: services/deferred_feedback.py
+
+/api/verify-answer returns template feedback straight away together with a
+ticket id. The LLM call runs on a background thread pool and the upgraded text
+is stored against the ticket, where the client picks it up by polling
+/api/feedback/<ticket>.
+
+The poll may reach a different worker process than the answer did, so tickets
+live in a store shared by the workers on the host: SQLite for the sqlite and
+cookie session backends, a dbm file for kv. The memory backend keeps them in
+the process, like its sessions, which limits it to a single worker.
+"""
+
+import json
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+from config import (
+    AI_FEEDBACK_MAX_PENDING, AI_FEEDBACK_TICKET_TTL_SECONDS, AI_FEEDBACK_WORKERS,
+    SESSION_BACKEND, SESSION_STORE_PATH, SESSION_STORE_MAX_ENTRIES
+)
+from helpers.instrumentation import bind_trace
+from helpers.session_store import create_session_store
+
+logger = logging.getLogger(__name__)
+
+TICKET_PENDING = "pending"
+TICKET_READY = "ready"
+TICKET_UNCHANGED = "unchanged"  # AI failed or was rejected; the template feedback stands
+TICKET_UNKNOWN = "unknown"
+
+
+class DeferredFeedbackDispatcher:
+    """Thread pool plus ticket records for asynchronous AI feedback"""
+
+    # Expired tickets are purged from the store every this many submissions
+    PURGE_EVERY = 200
+
+    def __init__(self, store, max_workers: int = 4, ticket_ttl_seconds: int = 600, max_pending: int = 32):
+        self.store = store
+        self.ticket_ttl_seconds = ticket_ttl_seconds
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ai-feedback")
+        # The executor's own queue is unbounded; this caps queued plus running jobs
+        self._pending = threading.BoundedSemaphore(max(max_workers, max_pending))
+        self._submissions = 0
+        self._submissions_lock = threading.Lock()
+
+    def submit(self, owner: str, job: Callable[[], Optional[str]]) -> Optional[str]:
+        """
+        Queue ``job`` and return a ticket id.
+
+        Args:
+            owner: User id allowed to collect the result
+            job: Callable returning the upgraded feedback text, or None to keep the template
+
+        Returns:
+            Ticket id to hand to the client, or None when the queue is full
+        """
+        if not self._pending.acquire(blocking=False):
+            logger.warning("Deferred AI feedback queue is full; keeping template feedback")
+            return None
+        try:
+            ticket_id = uuid.uuid4().hex
+            self._write(ticket_id, {"owner": owner, "status": TICKET_PENDING, "created": time.time()})
+            # Carry the request's trace so timing spans in the job report under its endpoint
+            self.executor.submit(bind_trace(self._run), ticket_id, owner, job)
+        except BaseException:
+            self._pending.release()
+            raise
+
+        with self._submissions_lock:
+            self._submissions += 1
+            purge = self._submissions % self.PURGE_EVERY == 0
+        if purge:
+            self.purge_expired()
+        return ticket_id
+
+    def poll(self, ticket_id: str, owner: str) -> Dict[str, Optional[str]]:
+        """Return the ticket status and, once ready, the upgraded feedback"""
+        record = self._read(ticket_id)
+        if record is None or record.get("owner") != owner:
+            return {"status": TICKET_UNKNOWN, "feedback": None}
+        if self._expired(record):
+            self.store.delete(self._key(ticket_id))
+            return {"status": TICKET_UNKNOWN, "feedback": None}
+
+        if record["status"] != TICKET_PENDING:
+            # Results are delivered once
+            self.store.delete(self._key(ticket_id))
+        return {"status": record["status"], "feedback": record.get("feedback")}
+
+    def purge_expired(self) -> int:
+        """Drop tickets older than the TTL, whether or not they were collected"""
+        purge_older_than = getattr(self.store, "purge_older_than", None)
+        if purge_older_than is not None:
+            # A record is rewritten after it is created, so this never drops a live ticket
+            return purge_older_than(self.ticket_ttl_seconds)
+
+        removed = 0
+        for key in self.store.keys():
+            payload = self.store.get(key)
+            if payload is not None and self._expired(json.loads(payload)):
+                self.store.delete(key)
+                removed += 1
+        return removed
+
+    def _expired(self, record: dict) -> bool:
+        return time.time() - record.get("created", 0) > self.ticket_ttl_seconds
+
+    def _run(self, ticket_id: str, owner: str, job: Callable[[], Optional[str]]):
+        try:
+            record = self._read(ticket_id) or {"owner": owner, "created": time.time()}
+            try:
+                feedback = job()
+            except Exception as e:
+                logger.error("Deferred AI feedback failed: %s", e)
+                feedback = None
+
+            if self._expired(record):
+                # Nobody can collect it any more
+                self.store.delete(self._key(ticket_id))
+                return
+            record["status"] = TICKET_READY if feedback else TICKET_UNCHANGED
+            record["feedback"] = feedback
+            self._write(ticket_id, record)
+        finally:
+            self._pending.release()
+
+    def _key(self, ticket_id: str) -> str:
+        return f"feedback:{ticket_id}"
+
+    def _read(self, ticket_id: str) -> Optional[dict]:
+        payload = self.store.get(self._key(ticket_id))
+        return json.loads(payload) if payload is not None else None
+
+    def _write(self, ticket_id: str, record: dict):
+        self.store.set(self._key(ticket_id), json.dumps(record).encode("utf-8"))
+
+    def shutdown(self, wait: bool = True):
+        self.executor.shutdown(wait=wait)
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_feedback_dispatcher() -> DeferredFeedbackDispatcher:
+    """Return the process-wide dispatcher (ticket records sit beside the session store)"""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            # Cookie sessions have no server-side store, but tickets still need one the workers share
+            backend = "sqlite" if SESSION_BACKEND == "cookie" else SESSION_BACKEND
+            if backend == "memory":
+                logger.info("Feedback tickets are kept in this process; run a single worker with the memory backend")
+            # Tickets get their own file: a dbm file cannot be opened twice in one
+            # process, and purging expired tickets must not touch sessions
+            _dispatcher = DeferredFeedbackDispatcher(
+                create_session_store(backend, SESSION_STORE_PATH + ".feedback", SESSION_STORE_MAX_ENTRIES),
+                max_workers=AI_FEEDBACK_WORKERS,
+                ticket_ttl_seconds=AI_FEEDBACK_TICKET_TTL_SECONDS,
+                max_pending=AI_FEEDBACK_MAX_PENDING
+            )
+        return _dispatcher
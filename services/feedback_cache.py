@@ -0,0 +1,218 @@
+"""
+Feedback Cache - Reuses verified LLM feedback across students with the same misconception
+File: services/feedback_cache.py
+
+Prompts for one misconception type, stage and number pattern differ only in the
+student's concrete numbers. Responses are stored with those numbers replaced by
+placeholders, keyed on a fingerprint of everything else that shapes the answer,
+and re-rendered with the next student's numbers on a hit. A response with any
+other number in it (an intermediate like 12.65, the whole part) is not cached,
+since that number would be wrong for the next student.
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+from config import FEEDBACK_CACHE_MAX_ENTRIES, FEEDBACK_CACHE_TTL_SECONDS, FEEDBACK_CACHE_PATH
+
+# Responses naming a choice letter depend on the shuffle and are never cached
+_CHOICE_LETTER = re.compile(r"\b(?:choice|option)\s+[A-D]\b", re.IGNORECASE)
+_NUMBER = re.compile(r"(?<![\d.])\d+(?:\.\d+)?")
+# Numbers in the rounding rule itself ("5 or more", "4 or less") are the same for every student
+RULE_NUMBERS = frozenset(("4", "5"))
+
+
+def _attempt_bucket(attempt_number: int) -> str:
+    return str(attempt_number) if attempt_number < 3 else "3+"
+
+
+def _shape(value: str) -> str:
+    """Digit-count shape of a number, e.g. '12.64' -> '2.2'."""
+    whole, _, fraction = str(value).partition(".")
+    return f"{len(whole)}.{len(fraction)}" if "." in str(value) else str(len(whole))
+
+
+def build_fingerprint(misconception_data: dict, verification_steps: dict, student_value: str,
+                      is_struggling: bool, attempt_number: int) -> str:
+    """
+    Build the cache key for a feedback prompt
+
+    Covers the misconception type, the student action, the target decimal
+    places, the digit pattern (rounding digit, next digit and the shape of the
+    original number and the chosen answer), the struggling flag and the
+    attempt bucket.
+    """
+    choice_analysis = misconception_data.get("choice_analysis", {})
+    parts = (
+        misconception_data.get("type", ""),
+        choice_analysis.get("student_action", misconception_data.get("student_action", "")),
+        str(verification_steps.get("decimal_places", "")),
+        str(verification_steps.get("target_digit", "")),
+        str(verification_steps.get("right_digit", "")),
+        _shape(verification_steps.get("original_number", "")),
+        _shape(student_value),
+        "struggling" if is_struggling else "steady",
+        _attempt_bucket(attempt_number)
+    )
+    return hashlib.sha1("|".join(parts).encode("utf-8")).hexdigest()
+
+
+def _number_pattern(value: str):
+    return re.compile(r"(?<![\d.])" + re.escape(value) + r"(?![\d])")
+
+
+def to_template(response: str, substitutions: Dict[str, str], pinned: Iterable[str] = ()) -> Optional[str]:
+    """
+    Replace the student's concrete numbers with placeholders
+
+    ``pinned`` are numbers fixed by the fingerprint (decimal places, target and
+    next digit), so they are the same for every student sharing the entry.
+    Returns None when any other number is left, as the response cannot be reused.
+    """
+    template = response.replace("{", "{{").replace("}", "}}")
+    # Longest first so 12.64 is replaced before 12.6
+    for name, value in sorted(substitutions.items(), key=lambda item: -len(item[1])):
+        if value:
+            template = _number_pattern(value).sub("{" + name + "}", template)
+    allowed = RULE_NUMBERS.union(str(value) for value in pinned)
+    if any(number not in allowed for number in _NUMBER.findall(template)):
+        return None
+    return template
+
+
+def render_template(template: str, substitutions: Dict[str, str]) -> str:
+    """Fill a cached template with the current student's numbers."""
+    return template.format(**substitutions)
+
+
+class FeedbackResponseCache:
+    """LRU + TTL cache of feedback templates with an optional SQLite tier"""
+
+    def __init__(self, max_entries: int = 5000, ttl_seconds: int = 86400,
+                 max_bytes: int = 8 * 1024 * 1024, sqlite_path: Optional[str] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (expires_at, template)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        self.sqlite_path = sqlite_path
+        self._local = threading.local()
+        if sqlite_path:
+            directory = os.path.dirname(sqlite_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._connect().execute(
+                "CREATE TABLE IF NOT EXISTS feedback_cache ("
+                "key TEXT PRIMARY KEY, template TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.sqlite_path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached template for ``key`` or None"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                self._remove(key)
+                self.expirations += 1
+
+        if self.sqlite_path:
+            row = self._connect().execute(
+                "SELECT template, expires_at FROM feedback_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row and row[1] > now:
+                with self._lock:
+                    self.disk_hits += 1
+                    self._insert(key, row[0], row[1])
+                return row[0]
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, template: str):
+        """Store a template that has already passed response verification"""
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._insert(key, template, expires_at)
+        if self.sqlite_path:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO feedback_cache (key, template, expires_at) VALUES (?, ?, ?)",
+                (key, template, expires_at)
+            )
+
+    def _insert(self, key, template, expires_at):
+        self._entries[key] = (expires_at, template)
+        self._bytes += len(template.encode("utf-8"))
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key):
+        _, template = self._entries.pop(key)
+        self._bytes -= len(template.encode("utf-8"))
+
+    def get_stats(self) -> dict:
+        """Hit-rate metrics for monitoring"""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 3) if lookups else 0.0
+            }
+
+
+def is_cacheable(response: str) -> bool:
+    """Responses that refer to a choice letter only make sense for one shuffle"""
+    return not _CHOICE_LETTER.search(response)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_feedback_cache() -> FeedbackResponseCache:
+    """Return the process-wide feedback cache"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = FeedbackResponseCache(
+                max_entries=FEEDBACK_CACHE_MAX_ENTRIES,
+                ttl_seconds=FEEDBACK_CACHE_TTL_SECONDS,
+                sqlite_path=FEEDBACK_CACHE_PATH or None
+            )
+        return _cache
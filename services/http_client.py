@@ -0,0 +1,215 @@
+"""Connection-pooled HTTP client used for outbound LLM API calls."""
+
+import os
+import random
+import threading
+import time
+import logging
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import EmptyPoolError
+
+logger = logging.getLogger(__name__)
+
+
+class ClientStats:
+    """Thread-safe counters for pool reuse and request latency."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.pool_timeouts = 0
+        self.connections_opened = 0
+        self.connection_checkouts = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def record_latency(self, seconds):
+        with self._lock:
+            self.requests += 1
+            self.latency_total += seconds
+            if seconds > self.latency_max:
+                self.latency_max = seconds
+
+    def increment(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def snapshot(self):
+        """Return the counters as a plain dict."""
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "retries": self.retries,
+                "failures": self.failures,
+                "pool_timeouts": self.pool_timeouts,
+                "connections_opened": self.connections_opened,
+                "pool_hits": max(0, self.connection_checkouts - self.connections_opened),
+                "latency_avg_ms": round(self.latency_total / self.requests * 1000, 2) if self.requests else 0.0,
+                "latency_max_ms": round(self.latency_max * 1000, 2)
+            }
+
+
+def _counting_pool(base, stats, pool_timeout):
+    """Subclass a urllib3 pool so checkouts are counted and wait at most ``pool_timeout``.
+
+    requests never passes a pool timeout, so with a blocking pool a caller
+    would otherwise wait forever for a free connection.
+    """
+
+    class CountingPool(base):
+        def _new_conn(self):
+            stats.increment("connections_opened")
+            return super()._new_conn()
+
+        def _get_conn(self, timeout=None):
+            stats.increment("connection_checkouts")
+            try:
+                return super()._get_conn(timeout=pool_timeout if timeout is None else timeout)
+            except EmptyPoolError:
+                stats.increment("pool_timeouts")
+                raise
+
+    return CountingPool
+
+
+class PooledHTTPAdapter(HTTPAdapter):
+    """HTTPAdapter whose connection pools report into a ClientStats."""
+
+    def __init__(self, stats, pool_timeout, **kwargs):
+        self.stats = stats
+        self.pool_timeout = pool_timeout
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _counting_pool(HTTPConnectionPool, self.stats, self.pool_timeout),
+            "https": _counting_pool(HTTPSConnectionPool, self.stats, self.pool_timeout)
+        }
+
+
+class PooledHTTPClient:
+    """Keep-alive HTTP client with bounded pools, split timeouts and jittered retries.
+
+    A call never takes longer than ``deadline`` seconds in total: each attempt's
+    timeouts and backoff sleeps are cut to the time left. Requests that may have
+    reached the server (a read timeout) are only retried for idempotent methods.
+    """
+
+    RETRY_STATUSES = frozenset({429, 500, 502, 503, 504, 529})
+    IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+    # Attempts with less time than this left are not started
+    MIN_ATTEMPT_SECONDS = 0.5
+
+    def __init__(self, pool_size=10, max_hosts=4, connect_timeout=3.05, read_timeout=10,
+                 max_retries=2, backoff_base=0.25, backoff_max=4.0, pool_timeout=2.0, deadline=15.0):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.stats = ClientStats()
+
+        # pool_maxsize is the per-host connection limit; pool_block makes it a hard cap,
+        # and a caller waits at most pool_timeout for a free connection
+        adapter = PooledHTTPAdapter(
+            self.stats,
+            pool_timeout,
+            pool_connections=max_hosts,
+            pool_maxsize=pool_size,
+            pool_block=True,
+            max_retries=0
+        )
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers["Connection"] = "keep-alive"
+
+    @classmethod
+    def from_env(cls):
+        """Build a client from the LLM_HTTP_* environment variables."""
+        return cls(
+            pool_size=int(os.environ.get("LLM_HTTP_POOL_SIZE", "10")),
+            max_hosts=int(os.environ.get("LLM_HTTP_MAX_HOSTS", "4")),
+            connect_timeout=float(os.environ.get("LLM_HTTP_CONNECT_TIMEOUT", "3.05")),
+            read_timeout=float(os.environ.get("LLM_HTTP_READ_TIMEOUT", "10")),
+            max_retries=int(os.environ.get("LLM_HTTP_MAX_RETRIES", "2")),
+            backoff_base=float(os.environ.get("LLM_HTTP_BACKOFF_BASE", "0.25")),
+            pool_timeout=float(os.environ.get("LLM_HTTP_POOL_TIMEOUT", "2.0")),
+            deadline=float(os.environ.get("LLM_HTTP_DEADLINE", "15"))
+        )
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def request(self, method, url, **kwargs):
+        """Send a request, retrying connection errors, pool timeouts and 429/5xx responses."""
+        connect_timeout, read_timeout = kwargs.pop("timeout", (self.connect_timeout, self.read_timeout))
+        give_up_at = time.monotonic() + self.deadline
+        resendable = method.upper() in self.IDEMPOTENT_METHODS
+
+        for attempt in range(self.max_retries + 1):
+            remaining = give_up_at - time.monotonic()
+            kwargs["timeout"] = (min(connect_timeout, remaining), min(read_timeout, remaining))
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout, EmptyPoolError) as e:
+                self.stats.record_latency(time.perf_counter() - start)
+                # A read timeout means the server may have acted on the request
+                sent = isinstance(e, requests.exceptions.ReadTimeout)
+                delay = self._backoff_delay(attempt)
+                if attempt >= self.max_retries or (sent and not resendable) or not self._time_for(delay, give_up_at):
+                    self.stats.increment("failures")
+                    raise
+                self.stats.increment("retries")
+                time.sleep(delay)
+                continue
+
+            self.stats.record_latency(time.perf_counter() - start)
+            if response.status_code in self.RETRY_STATUSES and attempt < self.max_retries:
+                delay = self._backoff_delay(attempt, response.headers.get("Retry-After"))
+                if self._time_for(delay, give_up_at):
+                    self.stats.increment("retries")
+                    logger.warning("LLM API returned %s, retrying in %.2fs", response.status_code, delay)
+                    response.close()
+                    time.sleep(delay)
+                    continue
+            if response.status_code >= 400:
+                self.stats.increment("failures")
+            return response
+
+    def _time_for(self, delay, give_up_at):
+        """Whether sleeping ``delay`` still leaves time for a useful attempt before the deadline."""
+        return give_up_at - time.monotonic() - delay >= self.MIN_ATTEMPT_SECONDS
+
+    def _backoff_delay(self, attempt, retry_after=None):
+        """Full-jitter exponential backoff, honouring a numeric Retry-After header."""
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def close(self):
+        self.session.close()
+
+
+_shared_client = None
+_shared_client_lock = threading.Lock()
+
+
+def get_shared_client():
+    """Return the process-wide client so every LLMService shares one pool."""
+    global _shared_client
+    with _shared_client_lock:
+        if _shared_client is None:
+            _shared_client = PooledHTTPClient.from_env()
+        return _shared_client
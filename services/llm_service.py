@@ -5,6 +5,9 @@ import requests
 import json
 import logging
 
+from helpers.instrumentation import timed
+from services.http_client import get_shared_client
+
 logger = logging.getLogger(__name__)
 
 class LLMService:
@@ -14,10 +17,12 @@ class LLMService:
         self.api_key = api_key or os.environ.get("LLM_API_KEY")
         self.api_url = os.environ.get("LLM_API_URL")
         self.model = os.environ.get("LLM_MODEL", "claude-3-haiku-20240307")
+        self.http_client = get_shared_client()
         
         if not self.api_key or not self.api_url:
             logger.warning("LLM API key or URL not set. AI companion will use fallback messages only.")
         
+    @timed("llm_call")
     def get_completion(self, prompt, conversation_history=None):
         """Gets a completion from the LLM API."""
         if not self.api_key or not self.api_url:
@@ -53,17 +58,17 @@ class LLMService:
         }
         
         try:
-            logger.debug(f"Sending request to LLM API: {json.dumps(data)[:200]}...")
-            response = requests.post(
+            # %.200r is rendered by the log writer, and only when DEBUG is enabled
+            logger.debug("Sending request to LLM API: %.200r...", data)
+            response = self.http_client.post(
                 self.api_url,
                 headers=headers,
-                data=json.dumps(data),
-                timeout=10
+                data=json.dumps(data)
             )
             response.raise_for_status()
             
             result = response.json()
-            logger.debug(f"Received response from LLM API: {json.dumps(result)[:200]}...")
+            logger.debug("Received response from LLM API: %.200r...", result)
             
             # Extract and clean the content
             if "content" in result:
@@ -81,21 +86,21 @@ class LLMService:
                 return result["choices"][0]["message"]["content"].strip()
             else:
                 logger.warning("Unexpected response format from LLM API")
-                logger.warning(f"Full response: {json.dumps(result)}")
+                logger.warning("Full response: %s", result)
                 return self._get_fallback_message(prompt)
                 
         except requests.exceptions.RequestException as e:
-            logger.error(f"HTTP error getting LLM completion: {e}")
+            logger.error("HTTP error getting LLM completion: %s", e)
             if hasattr(e, 'response') and e.response is not None:
-                logger.error(f"Response status: {e.response.status_code}")
-                logger.error(f"Response headers: {dict(e.response.headers)}")
-                logger.error(f"Response body: {e.response.text}")
+                logger.error("Response status: %s", e.response.status_code)
+                logger.error("Response headers: %s", e.response.headers)
+                logger.error("Response body: %s", e.response.text)
             return self._get_fallback_message(prompt)
         except json.JSONDecodeError as e:
-            logger.error(f"JSON decode error from LLM API: {e}")
+            logger.error("JSON decode error from LLM API: %s", e)
             return self._get_fallback_message(prompt)
         except Exception as e:
-            logger.error(f"Unexpected error getting LLM completion: {e}")
+            logger.error("Unexpected error getting LLM completion: %s", e)
             return self._get_fallback_message(prompt)
 
     
@@ -139,10 +144,10 @@ class LLMService:
                 logger.info("LLM API connection successful")
                 return True
             else:
-                logger.warning(f"LLM API connected but unexpected response: {response_text}")
+                logger.warning("LLM API connected but unexpected response: %s", response_text)
                 return False
         except Exception as e:
-            logger.error(f"LLM API connection failed: {e}")
+            logger.error("LLM API connection failed: %s", e)
             return False
 
     def get_api_status(self):
@@ -151,7 +156,8 @@ class LLMService:
             "api_key_configured": bool(self.api_key),
             "api_url_configured": bool(self.api_url),
             "model": self.model,
-            "ready": bool(self.api_key and self.api_url)
+            "ready": bool(self.api_key and self.api_url),
+            "http_client": self.http_client.stats.snapshot()
         }
 
     def validate_api_key_format(self):
@@ -784,7 +784,8 @@ class RedesignedPracticePage {
             method: 'POST',
             body: JSON.stringify({
                 answer: this.selectedAnswer,
-                response_time: responseTime
+                response_time: responseTime,
+                question_token: this.currentQuestion ? this.currentQuestion.question_token : undefined
             })
         })
 
@@ -812,6 +813,7 @@ class RedesignedPracticePage {
             
             // NEW: Display feedback in tutor panel
             this.displayFeedbackInTutor(data.feedback, data.is_correct);
+            this.pollDeferredFeedback(data);
             
             this.highlightAnswers(data.is_correct);
             this.updateProgressDisplays();
@@ -953,6 +955,33 @@ class RedesignedPracticePage {
         });
     }
 
+    // Poll for AI feedback queued by the server and swap it in when ready
+    pollDeferredFeedback(data, attempt = 0) {
+        this.pendingFeedbackTicket = data.feedback_ticket || null;
+        if (!data.feedback_ticket) return;
+
+        const poll = (attemptNumber) => {
+            if (attemptNumber >= 15) return;
+            setTimeout(async () => {
+                // Stop if the student has moved on to another answer
+                if (this.pendingFeedbackTicket !== data.feedback_ticket) return;
+                try {
+                    const response = await fetch(`/api/feedback/${data.feedback_ticket}`);
+                    const result = await response.json();
+                    if (this.pendingFeedbackTicket !== data.feedback_ticket) return;
+                    if (result.status === 'ready') {
+                        this.displayFeedbackInTutor(result.feedback, data.is_correct);
+                    } else if (result.status === 'pending') {
+                        poll(attemptNumber + 1);
+                    }
+                } catch (error) {
+                    console.error('Error fetching AI feedback:', error);
+                }
+            }, 1000);
+        };
+        poll(attempt);
+    }
+
     displayFeedbackInTutor(feedback, isCorrect) {
         const tutorText = document.getElementById('tutor-text');
         if (!tutorText) return;
@@ -980,6 +1009,8 @@ class RedesignedPracticePage {
     }
 
     nextQuestion() {
+        this.pendingFeedbackTicket = null;
+
         // CRITICAL: Reset continue button back to disabled state for next question
         const continueButton = document.getElementById('continue-practice');
         if (continueButton) {
@@ -166,7 +166,8 @@ class PracticePage {
                 'Content-Type': 'application/json',
             },
             body: JSON.stringify({
-                answer: this.state.selectedAnswer
+                answer: this.state.selectedAnswer,
+                question_token: this.state.currentQuestion ? this.state.currentQuestion.question_token : undefined
             }),
         })
         .then(response => response.json())
@@ -205,6 +206,7 @@ class PracticePage {
 
             // Show feedback
             this.displayFeedback(data);
+            this.pollDeferredFeedback(data);
 
             // Highlight correct/incorrect answers
             this.highlightAnswers(data.is_correct);
@@ -354,6 +356,28 @@ class PracticePage {
         return "inconsistent application of rounding rules";
     }
 
+    // Poll for AI feedback queued by the server and swap it in when ready
+    pollDeferredFeedback(data, attempt = 0) {
+        if (!data.feedback_ticket || attempt >= 15) return;
+
+        setTimeout(() => {
+            // Stop if the student has moved on to another answer
+            if (this.lastResponseData !== data) return;
+
+            fetch(`/api/feedback/${data.feedback_ticket}`)
+                .then(response => response.json())
+                .then(result => {
+                    if (this.lastResponseData !== data) return;
+                    if (result.status === 'ready') {
+                        this.displayFeedback({ ...data, feedback: result.feedback });
+                    } else if (result.status === 'pending') {
+                        this.pollDeferredFeedback(data, attempt + 1);
+                    }
+                })
+                .catch(error => console.error('Error fetching AI feedback:', error));
+        }, 1000);
+    }
+
     // Display feedback
     displayFeedback(data) {
         const feedbackClass = data.is_correct ? 
@@ -415,6 +439,9 @@ class PracticePage {
             return;
         }
 
+        // Drop the answered question so a late AI feedback poll for it is ignored
+        this.lastResponseData = null;
+
         // Hide next button
         if (this.elements.nextButton) {
             this.elements.nextButton.classList.add('hidden');